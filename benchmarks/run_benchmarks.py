@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+AirLife Pipeline Benchmarks
+
+Times each pipeline stage on synthetic OpenSky snapshots of several sizes:
+- json_parse: json.loads of the raw payload + states_to_dataframe
+- clean_airports: cleaning a world-sized airport list
+- clean_flights, combine_data: the transform stages
+- parallel_transform_<n>w: both transform stages through ParallelTransformer
+  with n worker processes (--transform-workers, 1 is in-process), to see
+  how the transform scales with cores
+- load: the COPY load path against PostgreSQL (--database), or by default
+  the in-process part of it (schema alignment + CSV serialization)
+
+Results are written as JSON and compared against a stored baseline: the
+fastest of --repeat runs on both sides, with the spread between the runs
+widening the regression threshold on noisy machines.
+
+Run with: python -m benchmarks.run_benchmarks --sizes 1000 10000
+Save a new baseline: python -m benchmarks.run_benchmarks --save-baseline
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import generate_airports, generate_states
+from src.extract_data import states_to_dataframe
+from src.transform_data import clean_airports, clean_flights, combine_data
+from src.load_data import dataframe_to_csv_buffer, load_to_database, prepare_for_copy
+from src.spatial_index import get_airport_index
+from src.parallel_transform import ParallelTransformer
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+DEFAULT_OUTPUT = 'bench_results.json'
+
+# Slowdowns smaller than this are timer and scheduler noise, whatever the ratio
+NOISE_FLOOR_SECONDS = 0.005
+
+# Declared column types of the flights table (see database_setup.sql), used
+# by the in-process stand-in for the database load
+FLIGHTS_TABLE_COLUMNS = {
+    'icao24': 'character varying', 'callsign': 'character varying',
+    'origin_country': 'character varying', 'time_position': 'bigint',
+    'last_contact': 'bigint', 'longitude': 'numeric', 'latitude': 'numeric',
+    'altitude': 'numeric', 'on_ground': 'boolean', 'velocity': 'numeric',
+    'true_track': 'numeric', 'vertical_rate': 'numeric',
+    'nearest_airport_iata': 'character varying',
+    'nearest_airport_distance_km': 'numeric', 'nearest_airport_bearing_deg': 'numeric',
+}
+
+
+def time_call(function, repeat):
+    """
+    Run a function several times with its prints silenced
+
+    Returns:
+        tuple: (best wall time in seconds, slowest/fastest ratio, result of
+            the last call)
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            started = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - started)
+    return min(timings), max(timings) / max(min(timings), 1e-9), result
+
+
+def in_process_load(flights_df):
+    """Everything the COPY path does before bytes go to the server"""
+    return dataframe_to_csv_buffer(prepare_for_copy(flights_df, FLIGHTS_TABLE_COLUMNS))
+
+
+def run(sizes, repeat, use_database, transform_workers=()):
+    """
+    Benchmark every stage for every size
+
+    Args:
+        sizes (list): Snapshot sizes
+        repeat (int): Runs per measurement
+        use_database (bool): Time the load against PostgreSQL
+        transform_workers (list): Worker counts to time the parallel
+            transform with (none to skip it)
+
+    Returns:
+        tuple: (stage -> {rows: seconds}, stage -> {rows: slowest/fastest ratio})
+    """
+    stages = ['json_parse', 'clean_airports', 'clean_flights', 'combine_data', 'load']
+    stages += [f'parallel_transform_{workers}w' for workers in transform_workers]
+    results = {stage: {} for stage in stages}
+    spread = {stage: {} for stage in stages}
+
+    def measure(stage, rows, function):
+        seconds, ratio, result = time_call(function, repeat)
+        results[stage][str(rows)] = seconds
+        spread[stage][str(rows)] = round(ratio, 3)
+        return result
+
+    raw_airports = generate_airports()
+    airports = measure('clean_airports', len(raw_airports), lambda: clean_airports(raw_airports))
+    print(f"clean_airports ({len(raw_airports)} rows): {results['clean_airports'][str(len(raw_airports))]:.4f}s")
+    # The pipeline gets a prebuilt index from the reference cache, so keep
+    # its construction out of the combine_data timings
+    get_airport_index(airports)
+
+    # Worker pools are started once, outside the timings, as in the daemon
+    transformers = {workers: ParallelTransformer(airports, workers, min_rows=0) for workers in transform_workers}
+    with contextlib.redirect_stdout(io.StringIO()):
+        warm_up = states_to_dataframe(generate_states(1_000)['states'])
+        for transformer in transformers.values():
+            transformer.transform(warm_up)
+
+    for size in sizes:
+        payload = json.dumps(generate_states(size))
+
+        raw_flights = measure('json_parse', size, lambda: states_to_dataframe(json.loads(payload)['states']))
+        flights = measure('clean_flights', size, lambda: clean_flights(raw_flights))
+        _, combined = measure('combine_data', size, lambda: combine_data(airports, flights))
+        if use_database:
+            measure('load', size, lambda: load_to_database(pd.DataFrame(), combined))
+        else:
+            measure('load', size, lambda: in_process_load(combined))
+
+        print(f"{size:>9} rows: " + ", ".join(
+            f"{stage} {results[stage][str(size)]:.4f}s"
+            for stage in ['json_parse', 'clean_flights', 'combine_data', 'load']
+        ))
+
+        for workers, transformer in transformers.items():
+            measure(f'parallel_transform_{workers}w', size, lambda: transformer.transform(raw_flights))
+        if transformers:
+            single = results[f'parallel_transform_{min(transformers)}w'][str(size)]
+            print(f"{'':>9}       transform: " + ", ".join(
+                f"{workers} worker(s) {results[f'parallel_transform_{workers}w'][str(size)]:.4f}s "
+                f"({single / results[f'parallel_transform_{workers}w'][str(size)]:.2f}x)"
+                for workers in transformers
+            ))
+
+    for transformer in transformers.values():
+        transformer.close()
+    return results, spread
+
+
+def compare(results, baseline, threshold, spread=None, baseline_spread=None):
+    """
+    Print current/baseline ratios and return the regressions
+
+    A timing is a regression when it is slower than the baseline by more
+    than the threshold, by more than the run-to-run spread measured on
+    either side, and by more than NOISE_FLOOR_SECONDS.
+
+    Args:
+        results (dict): stage -> {rows: seconds}
+        baseline (dict): Same shape, from a previous run
+        threshold (float): Ratio above which a timing counts as a regression
+        spread (dict): stage -> {rows: slowest/fastest ratio} of this run
+        baseline_spread (dict): Same for the baseline (older baselines
+            have none)
+
+    Returns:
+        list: (stage, rows, ratio) for every regression
+    """
+    spread, baseline_spread = spread or {}, baseline_spread or {}
+    regressions = []
+    print(f"\nComparison against baseline (regression if > {threshold:.2f}x, or the run-to-run spread if wider):")
+    for stage, timings in results.items():
+        for rows, seconds in timings.items():
+            previous = baseline.get(stage, {}).get(rows)
+            if not previous:
+                continue
+            ratio = seconds / previous
+            limit = max(threshold, spread.get(stage, {}).get(rows, 1.0),
+                        baseline_spread.get(stage, {}).get(rows, 1.0))
+            regressed = ratio > limit and seconds - previous > NOISE_FLOOR_SECONDS
+            flag = "❌" if regressed else "✅"
+            print(f"   {flag} {stage:<15} {rows:>9} rows: {ratio:.2f}x "
+                  f"({previous:.4f}s -> {seconds:.4f}s, limit {limit:.2f}x)")
+            if regressed:
+                regressions.append((stage, rows, ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AirLife pipeline benchmarks")
+    parser.add_argument('--sizes', nargs='+', type=int, default=DEFAULT_SIZES,
+                        help="snapshot sizes to benchmark")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="runs per measurement, the fastest is kept")
+    parser.add_argument('--database', action='store_true',
+                        help="time the load against PostgreSQL instead of the in-process stand-in")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT,
+                        help="where to write the JSON results")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE,
+                        help="baseline results to compare against")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store these results as the new baseline")
+    parser.add_argument('--transform-workers', nargs='+', type=int, default=[],
+                        help="also time the parallel transform with these worker counts, e.g. 1 2 4")
+    parser.add_argument('--threshold', type=float, default=1.25,
+                        help="slowdown ratio reported as a regression")
+    args = parser.parse_args()
+
+    print("⏱️  Running AirLife benchmarks...")
+    print("=" * 50)
+    results, spread = run(args.sizes, args.repeat, args.database, args.transform_workers)
+
+    report = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'load_target': 'postgresql' if args.database else 'in-process',
+            'repeat': args.repeat,
+            'cpus': os.cpu_count(),
+        },
+        'results': results,
+        'spread': spread,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\n📄 Results written to {args.output}")
+
+    regressions = []
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline['results'], args.threshold, spread, baseline.get('spread'))
+    else:
+        print(f"\nNo baseline at {args.baseline}, run with --save-baseline to create one")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
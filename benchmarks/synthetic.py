@@ -0,0 +1,166 @@
+"""
+Synthetic OpenSky Data
+
+Generates payloads shaped like the /states/all response, for benchmarks:
+- Aircraft cluster around busy areas, with some spread across the globe
+- Null rates, 8-character space-padded callsigns and on-ground aircraft
+  without barometric altitude, like the real feed
+- A small share of rows with invalid coordinates for the cleaning rules
+Also generates an airport list of realistic size.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Approximate traffic hot spots (lat, lon, spread in degrees, weight)
+HOT_SPOTS = [
+    (50.0, 8.0, 6.0, 0.30),     # Europe
+    (39.0, -95.0, 10.0, 0.35),  # North America
+    (30.0, 115.0, 8.0, 0.15),   # East Asia
+    (25.0, 55.0, 5.0, 0.05),    # Middle East
+]
+UNIFORM_SHARE = 0.15
+
+COUNTRIES = ['United States', 'Germany', 'United Kingdom', 'France', 'China',
+             'Ireland', 'Spain', 'Netherlands', 'Turkey', 'United Arab Emirates',
+             'Canada', 'Italy', 'Switzerland', 'Japan', 'Brazil']
+AIRLINES = ['AFR', 'BAW', 'DLH', 'RYR', 'EZY', 'UAL', 'DAL', 'AAL', 'UAE', 'THY',
+            'KLM', 'SWR', 'CCA', 'CES', 'SWA']
+
+# Share of rows with each kind of missing or bad value
+NULL_RATES = {
+    'callsign': 0.04,
+    'time_position': 0.03,
+    'position': 0.02,
+    'velocity': 0.02,
+    'vertical_rate': 0.05,
+}
+INVALID_COORDINATE_RATE = 0.005
+ON_GROUND_RATE = 0.12
+
+
+def _positions(rng, n):
+    """Latitudes and longitudes clustered around the hot spots"""
+    weights = np.array([w for *_, w in HOT_SPOTS] + [UNIFORM_SHARE])
+    cluster = rng.choice(len(weights), size=n, p=weights / weights.sum())
+
+    lat = np.degrees(np.arcsin(rng.uniform(-1, 1, n)))
+    lon = rng.uniform(-180, 180, n)
+    for i, (center_lat, center_lon, spread, _) in enumerate(HOT_SPOTS):
+        members = cluster == i
+        count = int(members.sum())
+        lat[members] = rng.normal(center_lat, spread, count)
+        lon[members] = rng.normal(center_lon, spread * 1.5, count)
+
+    lat = np.clip(lat, -89.9, 89.9)
+    lon = (lon + 180.0) % 360.0 - 180.0
+    return lat, lon
+
+
+def generate_states(n, seed=0, snapshot_time=1_700_000_000):
+    """
+    Generate an OpenSky-shaped /states/all payload
+
+    Args:
+        n (int): Number of state vectors
+        seed (int): Random seed, the same seed gives the same payload
+        snapshot_time (int): Unix time of the snapshot
+
+    Returns:
+        dict: {'time': ..., 'states': list of 17-element lists}
+    """
+    rng = np.random.default_rng(seed)
+
+    icao24 = [f"{x:06x}" for x in rng.choice(2 ** 24, size=n, replace=False)]
+    flight_numbers = rng.integers(1, 9999, n)
+    airlines = rng.choice(AIRLINES, n)
+    callsigns = [f"{a}{f}".ljust(8) for a, f in zip(airlines, flight_numbers)]
+    countries = rng.choice(COUNTRIES, n)
+
+    lat, lon = _positions(rng, n)
+    on_ground = rng.random(n) < ON_GROUND_RATE
+    altitude = np.where(on_ground, np.nan, rng.uniform(300, 12500, n).round(2))
+    velocity = np.where(on_ground, rng.uniform(0, 15, n), rng.uniform(100, 280, n)).round(2)
+    true_track = rng.uniform(0, 360, n).round(2)
+    vertical_rate = np.where(on_ground, 0.0, rng.normal(0, 5, n)).round(2)
+
+    last_contact = snapshot_time - rng.integers(0, 15, n)
+    time_position = last_contact - rng.integers(0, 5, n)
+
+    # Missing values at roughly the rates seen in the real feed
+    no_callsign = rng.random(n) < NULL_RATES['callsign']
+    no_time = rng.random(n) < NULL_RATES['time_position']
+    no_position = rng.random(n) < NULL_RATES['position']
+    no_velocity = rng.random(n) < NULL_RATES['velocity']
+    no_vertical = rng.random(n) < NULL_RATES['vertical_rate']
+
+    # Out-of-range coordinates for the cleaning rules to reject
+    invalid = rng.random(n) < INVALID_COORDINATE_RATE
+    lat[invalid] = rng.choice([-1, 1], int(invalid.sum())) * rng.uniform(90.5, 200, int(invalid.sum()))
+
+    squawk = rng.integers(0, 7777, n)
+    no_squawk = rng.random(n) < 0.3
+
+    def with_nulls(values, missing):
+        """Python list with None where missing is set (what json.loads gives)"""
+        values = np.asarray(values, dtype=object)
+        values[missing] = None
+        return values.tolist()
+
+    no_altitude = np.isnan(altitude)
+    columns = [
+        icao24,
+        with_nulls(callsigns, no_callsign),
+        countries.tolist(),
+        with_nulls(time_position.tolist(), no_time),
+        last_contact.tolist(),
+        with_nulls(lon.tolist(), no_position),
+        with_nulls(lat.tolist(), no_position),
+        with_nulls(altitude.tolist(), no_altitude),
+        on_ground.tolist(),
+        with_nulls(velocity.tolist(), no_velocity),
+        with_nulls(true_track.tolist(), no_velocity),
+        with_nulls(vertical_rate.tolist(), no_vertical),
+        [None] * n,
+        with_nulls((altitude + 30.0).tolist(), no_altitude),
+        with_nulls([f"{x:04d}" for x in squawk], no_squawk),
+        [False] * n,
+        [0] * n,
+    ]
+    states = [list(row) for row in zip(*columns)]
+
+    return {'time': snapshot_time, 'states': states}
+
+
+def generate_airports(n=75_000, seed=0):
+    """
+    Generate an airport table shaped like data/airports.csv
+
+    Args:
+        n (int): Number of airports (the full world list is about 75k)
+        seed (int): Random seed
+
+    Returns:
+        pandas.DataFrame: Raw airports, including a few invalid rows
+    """
+    rng = np.random.default_rng(seed)
+    lat, lon = _positions(rng, n)
+    invalid = rng.random(n) < INVALID_COORDINATE_RATE
+    lat[invalid] = 999.0
+
+    letters = np.array(list('ABCDEFGHIJKLMNOPQRSTUVWXYZ'))
+    codes = rng.choice(letters, size=(n, 4))
+    iata = np.array([''.join(c[:3]) for c in codes], dtype=object)
+    iata[rng.random(n) < 0.6] = '\\N'   # most small airfields have no IATA code
+
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'name': [f"Airport {i}" for i in range(n)],
+        'city': [f"City {i % 20000}" for i in range(n)],
+        'country': rng.choice(COUNTRIES, n),
+        'iata_code': iata,
+        'icao_code': [''.join(c) for c in codes],
+        'latitude': lat,
+        'longitude': lon,
+        'altitude': rng.integers(0, 4000, n),
+    })
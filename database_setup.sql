@@ -3,7 +3,13 @@
 
 -- Drop tables if they exist (for clean restart)
 DROP TABLE IF EXISTS flights;
+DROP TABLE IF EXISTS flights_latest;
 DROP TABLE IF EXISTS airports;
+DROP TABLE IF EXISTS flights_rollup_hourly;
+DROP TABLE IF EXISTS airports_by_country;
+DROP TABLE IF EXISTS flight_tracks;
+DROP TABLE IF EXISTS airport_events;
+DROP TABLE IF EXISTS flights_quarantine;
 
 -- Airports table - stores airport information from CSV data
 CREATE TABLE airports (
@@ -34,6 +40,111 @@ CREATE TABLE flights (
     velocity DECIMAL(8,2),
     true_track DECIMAL(6,2),
     vertical_rate DECIMAL(8,2),
+    nearest_airport_iata VARCHAR(3),
+    nearest_airport_distance_km DECIMAL(8,2),
+    nearest_airport_bearing_deg DECIMAL(6,2),
+    snapshot_ts TIMESTAMPTZ, -- set by the loader in append mode
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Latest known state per aircraft, maintained by the loader in append mode
+CREATE TABLE flights_latest (
+    icao24 VARCHAR(6) PRIMARY KEY,
+    callsign VARCHAR(10),
+    origin_country VARCHAR(50),
+    time_position BIGINT,
+    last_contact BIGINT,
+    longitude DECIMAL(10,6),
+    latitude DECIMAL(10,6),
+    altitude DECIMAL(8,2),
+    on_ground BOOLEAN,
+    velocity DECIMAL(8,2),
+    true_track DECIMAL(6,2),
+    vertical_rate DECIMAL(8,2),
+    nearest_airport_iata VARCHAR(3),
+    nearest_airport_distance_km DECIMAL(8,2),
+    nearest_airport_bearing_deg DECIMAL(6,2),
+    snapshot_ts TIMESTAMPTZ,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Rollups maintained by the loader, read by the reporting queries
+-- (sums and counts are kept instead of averages so buckets can be combined)
+CREATE TABLE flights_rollup_hourly (
+    bucket TIMESTAMPTZ NOT NULL, -- snapshot_ts truncated to the hour
+    origin_country VARCHAR(50) NOT NULL,
+    flights BIGINT NOT NULL,
+    altitude_count BIGINT NOT NULL,
+    altitude_sum NUMERIC NOT NULL,
+    altitude_min DECIMAL(8,2),
+    altitude_max DECIMAL(8,2),
+    velocity_count BIGINT NOT NULL,
+    velocity_sum NUMERIC NOT NULL,
+    velocity_min DECIMAL(8,2),
+    velocity_max DECIMAL(8,2),
+    PRIMARY KEY (bucket, origin_country)
+);
+
+CREATE TABLE airports_by_country (
+    country VARCHAR(100) PRIMARY KEY,
+    airport_count INTEGER NOT NULL
+);
+
+-- Flight paths: one row per track segment, points delta-encoded in one
+-- blob (see src/trajectories.py)
+CREATE TABLE flight_tracks (
+    id BIGSERIAL PRIMARY KEY,
+    icao24 VARCHAR(6) NOT NULL,
+    callsign VARCHAR(10),
+    start_time BIGINT NOT NULL, -- unix seconds of the first point
+    end_time BIGINT NOT NULL,   -- unix seconds of the last point
+    points INTEGER NOT NULL,
+    on_ground BOOLEAN,
+    min_latitude DECIMAL(10,6),
+    max_latitude DECIMAL(10,6),
+    min_longitude DECIMAL(10,6),
+    max_longitude DECIMAL(10,6),
+    track BYTEA NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Arrivals and departures detected by the geofence engine (src/geofence.py)
+CREATE TABLE airport_events (
+    id BIGSERIAL PRIMARY KEY,
+    event_type VARCHAR(9) NOT NULL CHECK (event_type IN ('arrival', 'departure')),
+    icao24 VARCHAR(6) NOT NULL,
+    callsign VARCHAR(10),
+    airport_iata VARCHAR(3),
+    airport_icao VARCHAR(4),
+    event_time BIGINT NOT NULL, -- last_contact of the sighting
+    latitude DECIMAL(10,6),
+    longitude DECIMAL(10,6),
+    altitude DECIMAL(8,2),
+    on_ground BOOLEAN,
+    snapshot_ts TIMESTAMPTZ NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Raw flight rows that failed a data-quality rule (src/quality.py), with
+-- the names of the rules. Rejected rows were not loaded; flagged ones were.
+CREATE TABLE flights_quarantine (
+    id BIGSERIAL PRIMARY KEY,
+    snapshot_ts TIMESTAMPTZ NOT NULL,
+    reason_mask BIGINT NOT NULL, -- bit i set: rule i of FLIGHT_RULES failed
+    reasons TEXT[] NOT NULL,
+    rejected BOOLEAN NOT NULL,
+    icao24 TEXT,
+    callsign TEXT,
+    origin_country TEXT,
+    time_position BIGINT,
+    last_contact BIGINT,
+    longitude DOUBLE PRECISION,
+    latitude DOUBLE PRECISION,
+    baro_altitude DOUBLE PRECISION, -- raw, in meters
+    on_ground BOOLEAN,
+    velocity DOUBLE PRECISION,
+    true_track DOUBLE PRECISION,
+    vertical_rate DOUBLE PRECISION,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
@@ -41,7 +152,11 @@ CREATE TABLE flights (
 CREATE INDEX idx_airports_iata ON airports(iata_code);
 CREATE INDEX idx_airports_country ON airports(country);
 CREATE INDEX idx_flights_icao24 ON flights(icao24);
+CREATE INDEX idx_flight_tracks_icao24 ON flight_tracks(icao24, start_time);
+CREATE INDEX idx_airport_events_airport ON airport_events(airport_iata, snapshot_ts);
+CREATE INDEX idx_flights_quarantine_snapshot_ts ON flights_quarantine(snapshot_ts);
 CREATE INDEX idx_flights_country ON flights(origin_country);
+CREATE INDEX idx_flights_snapshot_ts ON flights(snapshot_ts);
 
 -- Verify tables were created
 \dt
@@ -8,24 +8,359 @@ This script runs the complete ETL pipeline:
 3. Load the data into PostgreSQL database
 
 Run with: python main.py
+Keep flight history instead of replacing it: python main.py --load-mode append
+Poll continuously: python main.py --daemon --interval 10 --load-mode append
+Record raw snapshots: python main.py --capture archive/
+Replay them offline: python main.py --replay archive/ --replay-speed 0
+Partitioned history with 30 days of retention (database_setup_partitioned.sql):
+    python main.py --daemon --load-mode append --retention-days 30
+Only write aircraft whose state changed: python main.py --daemon --load-mode append --delta
+Spread the transform of large replays over 8 processes: python main.py --replay archive/ --transform-workers 8
+Record arrivals and departures in airport_events: python main.py --daemon --geofence
+Hold back and record rows failing data-quality rules: python main.py --quarantine
+Store flight paths in flight_tracks: python main.py --daemon --load-mode append --tracks
+Keep polling through database outages (snapshots wait on disk):
+    python main.py --daemon --load-mode append --spool spool/ --spool-max-mb 2048
+Also write flights to a Parquet dataset: python main.py --daemon --load-mode append --sink postgres --sink parquet --dataset dataset/
+Serve live aircraft positions as JSON: python main.py --daemon --live-port 8080
+    curl 'localhost:8080/aircraft?bbox=45,0,50,10'
+Import archived state vector dumps (resumable): python main.py --backfill dumps/ --backfill-workers 8
+Per-stage metrics: python main.py --metrics-log metrics.jsonl --metrics-file airlife.prom
 """
 
-from src.extract_data import extract_airports, extract_flights
-from src.transform_data import clean_airports, clean_flights, combine_data
-from src.load_data import load_to_database, verify_data
+import argparse
+import time
+from datetime import datetime, timezone
 
-def main():
+import pandas as pd
+
+from src.extract_data import extract_flights, extract_flights_tiled, get_default_client
+from src.transform_data import clean_flights, combine_data
+from src.reference_cache import load_reference_airports
+from src.load_data import (dispose_engine, enforce_retention, ensure_flight_partitions, load_airport_events,
+                           load_flight_batch, load_flight_history, load_quarantine, load_to_database,
+                           load_tracks, verify_data)
+from src.daemon import PipelineDaemon
+from src.snapshot_archive import SnapshotArchive, replay_snapshots
+from src.instrumentation import PipelineMetrics
+from src.delta import DeltaFilter
+from src.trajectories import TrackBuilder
+from src.parallel_transform import ParallelTransformer
+from src.geofence import GeofenceEngine
+from src.quality import report_quality, validate_flights
+from src.spool import SnapshotSpool, SpoolDrainer
+from src.sinks import ParquetSink, PostgresSink
+from src.live_state import DEFAULT_EXPIRE_AFTER, LiveStateServer, LiveStateStore
+from src.backfill import DEFAULT_CHUNK_ROWS, DEFAULT_WORKERS, run_backfill
+
+# Expired partitions are looked for at most this often (seconds)
+RETENTION_CHECK_INTERVAL = 3600
+_last_retention_check = None
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="AirLife ETL Pipeline")
+    parser.add_argument('--load-mode', choices=['replace', 'append'], default='replace',
+                        help="replace the flights table, or append snapshots to its history")
+    parser.add_argument('--bbox', nargs=4, type=float, metavar=('LAMIN', 'LOMIN', 'LAMAX', 'LOMAX'),
+                        help="area to fetch flights for (default: part of Europe)")
+    parser.add_argument('--tile-size', type=float, metavar='DEG',
+                        help="fetch the area as concurrent tiles of at most DEG degrees")
+    parser.add_argument('--workers', type=int, default=4,
+                        help="maximum number of tiles fetched at once")
+    parser.add_argument('--daemon', action='store_true',
+                        help="keep running and take a snapshot every --interval seconds")
+    parser.add_argument('--interval', type=float, default=10.0,
+                        help="seconds between snapshots in daemon mode")
+    parser.add_argument('--capture', metavar='DIR',
+                        help="also store every raw API payload in this archive directory")
+    parser.add_argument('--replay', metavar='DIR',
+                        help="load archived snapshots from this directory instead of the API")
+    parser.add_argument('--replay-speed', type=float, default=1.0,
+                        help="replay speed relative to recording time (0 = as fast as possible)")
+    parser.add_argument('--compact', action='store_true',
+                        help="keep transformed flights in the compact in-memory schema")
+    parser.add_argument('--delta', action='store_true',
+                        help="only pass on aircraft whose state changed (append mode, daemon or replay)")
+    parser.add_argument('--delta-heartbeat', type=float, default=300,
+                        help="seconds after which an unchanged aircraft is written anyway")
+    parser.add_argument('--transform-workers', type=int, default=1, metavar='N',
+                        help='With --daemon or --replay, transform large snapshots on N processes')
+    parser.add_argument('--quarantine', action='store_true',
+                        help='Check flights against the data-quality rules, drop rejected rows and record failures in flights_quarantine')
+    parser.add_argument('--geofence', action='store_true',
+                        help='With --daemon or --replay, record airport arrivals and departures in airport_events')
+    parser.add_argument('--tracks', action='store_true',
+                        help='With --daemon or --replay, stitch snapshots into per-aircraft tracks stored in flight_tracks')
+    parser.add_argument('--spool', metavar='DIR',
+                        help='With --daemon or --replay, write snapshots to a disk spool in DIR and load them in the background')
+    parser.add_argument('--spool-max-mb', type=float, default=1024,
+                        help='maximum size of the spool on disk')
+    parser.add_argument('--spool-policy', choices=['backpressure', 'evict'], default='backpressure',
+                        help='when the spool is full, wait for the database (backpressure) or drop the oldest snapshots (evict)')
+    parser.add_argument('--sink', action='append', choices=['postgres', 'parquet'],
+                        help='where flights are written (repeat for several, default: postgres)')
+    parser.add_argument('--dataset', metavar='DIR', default='dataset',
+                        help='directory of the Parquet dataset written by --sink parquet')
+    parser.add_argument('--live-port', type=int, metavar='PORT',
+                        help='With --daemon or --replay, serve the latest aircraft states as JSON on this port')
+    parser.add_argument('--live-host', default='127.0.0.1',
+                        help='address the live state API listens on')
+    parser.add_argument('--backfill', nargs='+', metavar='PATH',
+                        help='import archived state vector CSV dumps (files or directories) into the flights history')
+    parser.add_argument('--backfill-chunk-rows', type=int, default=DEFAULT_CHUNK_ROWS,
+                        help='rows read, cleaned and loaded at a time')
+    parser.add_argument('--backfill-workers', type=int, default=DEFAULT_WORKERS,
+                        help='chunks cleaned and loaded at once, each on its own connection')
+    parser.add_argument('--backfill-checkpoint', default='backfill_checkpoint.json', metavar='FILE',
+                        help='progress file used to resume an interrupted backfill')
+    parser.add_argument('--retention-days', type=float,
+                        help="drop flight history partitions older than this many days")
+    parser.add_argument('--metrics-log', metavar='FILE',
+                        help="append one JSON line per stage run to FILE ('-' for stderr)")
+    parser.add_argument('--metrics-file', metavar='FILE',
+                        help="keep per-stage totals in FILE in Prometheus text format")
+    args = parser.parse_args()
+    if args.delta and args.load_mode != 'append':
+        parser.error("--delta only makes sense with --load-mode append")
+    args.sink = args.sink or ['postgres']
+    if 'postgres' not in args.sink:
+        stored = [option for option, on in [('--geofence', args.geofence), ('--tracks', args.tracks),
+                                             ('--quarantine', args.quarantine)] if on]
+        if stored:
+            parser.error(f"the results of {', '.join(stored)} are stored in PostgreSQL: add --sink postgres")
+    return args
+
+def extract_flight_snapshot(args, metrics):
+    """Fetch one flight snapshot using the area and tiling options"""
+    bbox = dict(zip(['lamin', 'lomin', 'lamax', 'lomax'], args.bbox)) if args.bbox else None
+    archive = SnapshotArchive(args.capture) if args.capture else None
+    client = get_default_client()
+    bytes_before = client.stats['bytes']
+    
+    with metrics.stage('extract') as record:
+        if args.tile_size:
+            flights = extract_flights_tiled(bbox, tile_size_deg=args.tile_size, max_workers=args.workers,
+                                            client=client, archive=archive)
+        else:
+            flights = extract_flights(bbox, client=client, archive=archive)
+        record['rows_out'] = len(flights)
+        record['bytes'] = client.stats['bytes'] - bytes_before
+    return flights
+
+def check_quality(args, metrics, flights, snapshot_ts=None):
+    """Quarantine the flights failing data-quality rules (with --quarantine), stamped with their snapshot time"""
+    if not args.quarantine:
+        return flights
+    with metrics.stage('quality', rows_in=len(flights)) as record:
+        checked, quarantine = validate_flights(flights)
+        report_quality(quarantine, len(flights))
+        record['quarantined'] = load_quarantine(quarantine, snapshot_ts)
+        record['rows_out'] = len(checked)
+    return checked
+
+def transform_flights(args, metrics, airports, flights, snapshot_ts=None, delta=None, transformer=None):
+    """
+    Check quality, drop unchanged aircraft (if a delta filter is given), clean them and attach nearest airports
+    
+    Returns:
+        tuple: (transformed flights, raw changed rows to pass to load_flights
+            for the delta filter to commit, or None without a filter)
+    """
+    flights = check_quality(args, metrics, flights, snapshot_ts)
+    changes = None
+    if delta is not None:
+        with metrics.stage('delta', rows_in=len(flights)) as record:
+            flights = changes = delta.filter(flights)
+            record['rows_out'] = len(flights)
+    
+    with metrics.stage('transform', rows_in=len(flights)) as record:
+        if transformer is not None:
+            final_flights = transformer.transform(flights, compact=args.compact)
+        else:
+            _, final_flights = combine_data(airports, clean_flights(flights), compact=args.compact)
+        record['rows_out'] = len(final_flights)
+    return final_flights, changes
+
+def open_sinks(args, spool=None, give_up=None):
+    """Create the flight sinks selected with --sink"""
+    sinks = []
+    if 'postgres' in args.sink:
+        sinks.append(PostgresSink(args.load_mode, spool, give_up))
+    if 'parquet' in args.sink:
+        sinks.append(ParquetSink(args.dataset))
+    return sinks
+
+def close_sinks(sinks):
+    """Close every sink (the Parquet sink compacts the hours it completed)"""
+    for sink in sinks:
+        sink.close()
+
+def load_flights(args, metrics, flights, snapshot_ts=None, tracks=None, geofence=None, sinks=(), live=None,
+                 delta=None, changes=None):
+    """
+    Write one transformed flight snapshot to every sink, with the tracks and airport events it completed (if enabled)
+    
+    Sink failures are raised, so the daemon counts them as load errors; only
+    the one-shot main() goes through load_to_database and its checklist.
+    The delta filter commits the snapshot's changes once every sink wrote
+    them, so a failed write is emitted again with the next snapshot.
+    """
+    if live is not None:
+        # First, so live maps do not wait for the database
+        with metrics.stage('live', rows_in=len(flights)) as record:
+            live.update(flights)
+            record['rows_out'] = len(live)
+    for sink in sinks:
+        with metrics.stage(sink.name, rows_in=len(flights)) as record:
+            record['rows_out'] = sink.write(flights, snapshot_ts)
+    if delta is not None:
+        delta.commit(changes)
+    if geofence is not None:
+        with metrics.stage('geofence', rows_in=len(flights)) as record:
+            record['rows_out'] = load_airport_events(geofence.update(flights), snapshot_ts)
+    if tracks is not None:
+        with metrics.stage('tracks', rows_in=len(flights)) as record:
+            tracks.ingest(flights)
+            record['rows_out'] = save_tracks(tracks, tracks.pop_closed())
+    apply_retention(args)
+
+def save_tracks(tracks, closed):
+    """Write closed track segments, handing them back to the builder if the write fails"""
+    try:
+        return load_tracks(closed)
+    except Exception:
+        tracks.requeue(closed)
+        raise
+
+def flush_tracks(metrics, tracks):
+    """Store the segments still open at shutdown"""
+    if tracks is None:
+        return
+    with metrics.stage('tracks') as record:
+        closed = tracks.flush()
+        try:
+            record['rows_out'] = load_tracks(closed)
+        except Exception as e:
+            print(f"❌ Could not save {len(closed)} track segment(s) at shutdown: {e}")
+
+def start_spool(args, metrics):
+    """Open the spool and start loading it in the background (with --spool)"""
+    if not args.spool:
+        return None, None
+    spool = SnapshotSpool(args.spool, max_bytes=int(args.spool_max_mb * 1024 * 1024), policy=args.spool_policy)
+    
+    def load_batch(snapshots):
+        with metrics.stage('drain', rows_in=sum(len(flights) for _, flights in snapshots)) as record:
+            record['rows_out'] = load_flight_batch(snapshots, mode=args.load_mode)
+        apply_retention(args)
+    
+    print(f"📦 Spooling snapshots to {args.spool} ({spool.backlog()} bytes waiting from earlier runs)")
+    return spool, SpoolDrainer(spool, load_batch).start()
+
+def stop_spool(spool, drainer):
+    """Load what is left in the spool, then close it"""
+    if spool is None:
+        return
+    print("📦 Draining the spool...")
+    drainer.stop()
+    drainer.report()
+    spool.close()
+
+def start_live_state(args):
+    """
+    Create the live state store and serve it over HTTP (with --live-port)
+    
+    With --delta, parked aircraft are only passed on once per heartbeat, so
+    they must outlive it by a couple of polls to stay on the map.
+    """
+    if args.live_port is None:
+        return None, None
+    expire_after = DEFAULT_EXPIRE_AFTER
+    if args.delta:
+        expire_after = max(expire_after, args.delta_heartbeat + max(60, 2 * args.interval))
+    live = LiveStateStore(expire_after=expire_after)
+    return live, LiveStateServer(live, args.live_host, args.live_port).start()
+
+def stop_live_state(live, server):
+    """Stop the live state API"""
+    if server is None:
+        return
+    server.stop()
+    live.report()
+
+def apply_retention(args):
+    """Drop expired history partitions, at most once per RETENTION_CHECK_INTERVAL"""
+    global _last_retention_check
+    if args.retention_days is None:
+        return
+    now = time.monotonic()
+    if _last_retention_check is not None and now - _last_retention_check < RETENTION_CHECK_INTERVAL:
+        return
+    _last_retention_check = now
+    enforce_retention(args.retention_days)
+
+def run_daemon(args):
+    """Run the pipeline continuously with overlapped extract/transform/load stages"""
+    print("🛫 Starting AirLife ETL daemon...")
+    print("=" * 50)
+    
+    metrics = PipelineMetrics(args.metrics_log, args.metrics_file)
+    
+    # Airports are reference data: prepare and load them once
+    final_airports = load_reference_airports()
+    if 'postgres' in args.sink:
+        load_to_database(final_airports, pd.DataFrame(), mode=args.load_mode)
+    
+    delta = DeltaFilter(heartbeat=args.delta_heartbeat) if args.delta else None
+    tracks = TrackBuilder() if args.tracks else None
+    geofence = GeofenceEngine(final_airports) if args.geofence else None
+    transformer = ParallelTransformer(final_airports, args.transform_workers) if args.transform_workers > 1 else None
+    spool, drainer = start_spool(args, metrics)
+    live, live_server = start_live_state(args)
+    
+    daemon = PipelineDaemon(
+        lambda: extract_flight_snapshot(args, metrics),
+        lambda flights, snapshot_ts: transform_flights(args, metrics, final_airports, flights, snapshot_ts,
+                                                       delta, transformer),
+        lambda transformed, snapshot_ts: load_flights(args, metrics, transformed[0], snapshot_ts, tracks, geofence,
+                                                      sinks, live, delta, transformed[1]),
+        interval=args.interval
+    )
+    # A full spool makes the load stage wait, but not past a stop request
+    sinks = open_sinks(args, spool, give_up=daemon.stop_event)
+    daemon.run()
+    if transformer is not None:
+        transformer.close()
+    close_sinks(sinks)
+    stop_spool(spool, drainer)
+    stop_live_state(live, live_server)
+    flush_tracks(metrics, tracks)
+    dispose_engine()
+    metrics.summary()
+    if delta is not None:
+        delta.report()
+    if geofence is not None:
+        geofence.report()
+    
+    print("\n👋 AirLife ETL daemon stopped")
+    print("=" * 50)
+
+def main(args):
     """Run the complete ETL pipeline"""
     print("🛫 Starting AirLife ETL Pipeline...")
     print("=" * 50)
+    metrics = PipelineMetrics(args.metrics_log, args.metrics_file)
     
     # Step 1: Extract data
     print("\n=== EXTRACTION ===")
     print("📥 Extracting data from sources...")
     
     # TODO: Call the extraction functions
-    airports = extract_airports()
-    flights = extract_flights()
+    # Airports are read from the CSV and cleaned only when the file changed
+    airports = load_reference_airports()
+    flights = extract_flight_snapshot(args, metrics)
+    snapshot_ts = datetime.now(timezone.utc)
 
     print(flights.head())
     
@@ -36,26 +371,112 @@ def main():
     print("🔄 Cleaning and transforming data...")
     
     # TODO: Call the transformation functions
-    clean_airports_data = clean_airports(airports)
-    clean_flights_data = clean_flights(flights)
-    final_airports, final_flights = combine_data(clean_airports_data, clean_flights_data)
+    flights = check_quality(args, metrics, flights, snapshot_ts)
+    with metrics.stage('transform', rows_in=len(flights)) as record:
+        clean_flights_data = clean_flights(flights)
+        final_airports, final_flights = combine_data(airports, clean_flights_data, compact=args.compact)
+        record['rows_out'] = len(final_flights)
     
     # Step 3: Load data
     print("\n=== LOADING ===")
     print("💾 Loading data to database...")
     
     # TODO: Call the loading function
-    load_to_database(final_airports, final_flights)
+    if 'parquet' in args.sink:
+        sink = ParquetSink(args.dataset)
+        with metrics.stage(sink.name, rows_in=len(final_flights)) as record:
+            record['rows_out'] = sink.write(final_flights, snapshot_ts)
+        sink.close()
+    if 'postgres' in args.sink:
+        with metrics.stage('load', rows_in=len(final_airports) + len(final_flights)):
+            load_to_database(final_airports, final_flights, mode=args.load_mode, snapshot_ts=snapshot_ts)
+        apply_retention(args)
+        
+        # Step 4: Verify everything worked
+        print("\n=== VERIFICATION ===")
+        print("✅ Verifying data was loaded correctly...")
+        
+        # TODO: Call the verification function
+        with metrics.stage('verify'):
+            verify_data()
+    
+    print("\n🎉 ETL Pipeline completed!")
+    metrics.summary()
+    print("=" * 50)
+
+def run_replay(args):
+    """Feed archived snapshots through the transform and load stages"""
+    print("🛫 Replaying archived snapshots...")
+    print("=" * 50)
+    metrics = PipelineMetrics(args.metrics_log, args.metrics_file)
     
-    # Step 4: Verify everything worked
-    print("\n=== VERIFICATION ===")
-    print("✅ Verifying data was loaded correctly...")
+    final_airports = load_reference_airports()
+    if 'postgres' in args.sink:
+        load_to_database(final_airports, pd.DataFrame(), mode=args.load_mode)
     
-    # TODO: Call the verification function
-    verify_data()
+    delta = DeltaFilter(heartbeat=args.delta_heartbeat) if args.delta else None
+    tracks = TrackBuilder() if args.tracks else None
+    geofence = GeofenceEngine(final_airports) if args.geofence else None
+    transformer = ParallelTransformer(final_airports, args.transform_workers) if args.transform_workers > 1 else None
+    spool, drainer = start_spool(args, metrics)
+    sinks = open_sinks(args, spool)
+    live, live_server = start_live_state(args)
+    started = time.perf_counter()
+    snapshots = rows = 0
+    for snapshot_ts, flights in replay_snapshots(SnapshotArchive(args.replay),
+                                                 speed=args.replay_speed or None):
+        final_flights, changes = transform_flights(args, metrics, final_airports, flights, snapshot_ts, delta,
+                                                   transformer)
+        load_flights(args, metrics, final_flights, snapshot_ts, tracks, geofence, sinks, live, delta, changes)
+        snapshots += 1
+        rows += len(flights)
+    if transformer is not None:
+        transformer.close()
+    close_sinks(sinks)
+    stop_spool(spool, drainer)
+    stop_live_state(live, live_server)
+    flush_tracks(metrics, tracks)
     
-    print("\n🎉 ETL Pipeline completed!")
+    elapsed = time.perf_counter() - started
+    print(f"\n🎉 Replayed {snapshots} snapshots ({rows} rows) in {elapsed:.2f}s")
+    if elapsed > 0:
+        print(f"   Throughput: {rows / elapsed:.0f} rows/s")
+    metrics.summary()
+    if delta is not None:
+        delta.report()
+    if geofence is not None:
+        geofence.report()
+    print("=" * 50)
+
+def run_backfill_import(args):
+    """Import archived state vector dumps into the flights history"""
+    print("🛫 Backfilling flight history...")
+    print("=" * 50)
+    metrics = PipelineMetrics(args.metrics_log, args.metrics_file)
+    
+    final_airports = load_reference_airports()
+    load_to_database(final_airports, pd.DataFrame(), mode='append')
+    
+    def load_chunk(flights):
+        with metrics.stage('backfill', rows_in=len(flights)) as record:
+            record['rows_out'] = load_flight_history(flights)
+        return record['rows_out']
+    
+    run_backfill(args.backfill, final_airports, load_chunk, args.backfill_checkpoint,
+                 chunk_rows=args.backfill_chunk_rows, workers=args.backfill_workers,
+                 prepare_partitions=ensure_flight_partitions)
+    apply_retention(args)
+    dispose_engine()
+    metrics.summary()
     print("=" * 50)
 
 if __name__ == "__main__":
-    main()
+    args = parse_args()
+    if args.backfill:
+        run_backfill_import(args)
+    elif args.replay:
+        run_replay(args)
+    elif args.daemon:
+        run_daemon(args)
+    else:
+        main(args)
@@ -0,0 +1,366 @@
+"""
+Backfill Module
+
+This module imports archived state vectors (the OpenSky historical dumps,
+one CSV per hour, optionally gzip/bz2/xz/zstd compressed) into the flights
+history:
+- Files are streamed in fixed-size chunks, so memory stays bounded
+  whatever the file size
+- Each chunk is mapped to the extraction columns and goes through the same
+  cleaning (clean_flights) and nearest-airport matching as live snapshots
+- Chunks are prepared and bulk-loaded by a pool of worker threads, each on
+  its own database connection, with a bounded number of chunks in flight
+- A JSON checkpoint records, per file, which chunks were committed, so an
+  interrupted backfill resumes where it stopped without loading anything
+  twice
+- Progress and throughput are reported as chunks complete
+"""
+
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import pandas as pd
+
+from src.extract_data import KEEP_COLUMNS
+from src.spatial_index import get_airport_index, nearest_airports
+from src.transform_data import clean_flights
+
+# Columns of the state vector dumps, as named in their CSV header
+DUMP_COLUMNS = ['time', 'icao24', 'lat', 'lon', 'velocity', 'heading', 'vertrate', 'callsign',
+                'onground', 'alert', 'spi', 'squawk', 'baroaltitude', 'geoaltitude',
+                'lastposupdate', 'lastcontact']
+
+DUMP_DTYPES = {
+    'time': np.float64, 'icao24': object, 'callsign': object, 'lat': np.float64, 'lon': np.float64,
+    'velocity': np.float32, 'heading': np.float32, 'vertrate': np.float32, 'onground': object,
+    'baroaltitude': np.float32, 'lastposupdate': np.float64, 'lastcontact': np.float64,
+}
+
+DEFAULT_CHUNK_ROWS = 500_000
+DEFAULT_WORKERS = 4
+
+DUMP_SUFFIXES = ('.csv', '.csv.gz', '.csv.bz2', '.csv.xz', '.csv.zst')
+
+
+def find_dump_files(paths):
+    """
+    Expand files and directories into the sorted list of dump files
+
+    Args:
+        paths (list): Files or directories (searched recursively)
+
+    Returns:
+        list: Paths of the CSV files found
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, _, names in os.walk(path):
+                files.extend(os.path.join(directory, name) for name in names if name.endswith(DUMP_SUFFIXES))
+        else:
+            files.append(path)
+    return sorted(files)
+
+
+def read_dump_chunks(path, chunk_rows, skip_chunks=0):
+    """
+    Stream a dump file as DataFrames of at most chunk_rows rows
+
+    Args:
+        path (str): CSV file, compression inferred from the extension
+        chunk_rows (int): Rows per chunk
+        skip_chunks (int): Leading chunks not to parse (already loaded),
+            skipped by row number so no set of skipped rows is built
+
+    Yields:
+        tuple: (chunk number, DataFrame of dump columns)
+    """
+    skipped = skip_chunks * chunk_rows
+    reader = pd.read_csv(path, usecols=list(DUMP_DTYPES), dtype=DUMP_DTYPES, chunksize=chunk_rows,
+                         skiprows=lambda i: 0 < i <= skipped, compression='infer')
+    with reader:
+        for number, chunk in enumerate(reader, start=skip_chunks):
+            yield number, chunk
+
+
+def _optional_seconds(values):
+    """Unix seconds with fractions to nullable whole seconds"""
+    values = np.floor(values.to_numpy(dtype=np.float64, na_value=np.nan))
+    missing = np.isnan(values)
+    return pd.arrays.IntegerArray(np.where(missing, 0, values).astype(np.int64), missing)
+
+
+def dump_to_states(chunk):
+    """
+    Map a dump chunk to the raw extraction schema (KEEP_COLUMNS order)
+
+    lastposupdate, lastcontact, heading and vertrate become time_position,
+    last_contact, true_track and vertical_rate; origin_country is not in the
+    dumps. Rows without an icao24 cannot be stored and are dropped here.
+
+    Returns:
+        tuple: (raw states DataFrame, snapshot_ts Series)
+    """
+    if chunk['icao24'].isna().any():
+        chunk = chunk[chunk['icao24'].notna()]
+
+    on_ground = chunk['onground'].astype(str).str.lower().isin(['true', 't', '1']).to_numpy()
+    data = {
+        'icao24': chunk['icao24'].astype(str).str.lower().to_numpy(dtype=object),
+        'callsign': chunk['callsign'].to_numpy(dtype=object),
+        'origin_country': np.full(len(chunk), None, dtype=object),
+        'time_position': _optional_seconds(chunk['lastposupdate']),
+        'last_contact': _optional_seconds(chunk['lastcontact']),
+        'longitude': chunk['lon'].to_numpy(),
+        'latitude': chunk['lat'].to_numpy(),
+        'baro_altitude': chunk['baroaltitude'].to_numpy(),
+        'on_ground': on_ground,
+        'velocity': chunk['velocity'].to_numpy(),
+        'true_track': chunk['heading'].to_numpy(),
+        'vertical_rate': chunk['vertrate'].to_numpy(),
+    }
+    states = pd.DataFrame(data, columns=KEEP_COLUMNS)
+    snapshot_ts = pd.to_datetime(chunk['time'].to_numpy(), unit='s', utc=True)
+    return states, pd.Series(snapshot_ts, index=states.index)
+
+
+def prepare_chunk(chunk, airports_df):
+    """
+    Clean one dump chunk like a live snapshot and attach nearest airports
+
+    Args:
+        chunk (pandas.DataFrame): Rows from read_dump_chunks()
+        airports_df (pandas.DataFrame): Cleaned airports
+
+    Returns:
+        tuple: (flights ready for load_flight_history, rows read, rows
+        rejected by the cleaning rules)
+    """
+    states, snapshot_ts = dump_to_states(chunk)
+    flights = clean_flights(states, verbose=False)
+    if flights.empty:
+        return flights, len(chunk), len(chunk)
+
+    flights = flights.assign(snapshot_ts=snapshot_ts.loc[flights.index].to_numpy())
+    if not airports_df.empty:
+        nearest = nearest_airports(airports_df, flights['latitude'].to_numpy(dtype=np.float64),
+                                   flights['longitude'].to_numpy(dtype=np.float64))
+        flights = flights.assign(**{column: nearest[column].to_numpy() for column in nearest.columns})
+    return flights, len(chunk), len(chunk) - len(flights)
+
+
+class BackfillCheckpoint:
+    """
+    Per-file record of the committed chunks, kept in a JSON file
+
+    For every file: the chunk size it is read with, the number of leading
+    chunks all committed, the chunks committed beyond them (workers finish
+    out of order) and whether the file is done.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.files = json.load(f)
+        except FileNotFoundError:
+            self.files = {}
+
+    def state(self, file_path, chunk_rows):
+        """Checkpoint entry of a file, created if new"""
+        key = os.path.abspath(file_path)
+        with self._lock:
+            return self.files.setdefault(key, {'chunk_rows': chunk_rows, 'next_chunk': 0,
+                                               'committed': [], 'rows': 0, 'done': False})
+
+    def commit(self, file_path, chunk, rows):
+        """Record a committed chunk and save the checkpoint"""
+        with self._lock:
+            entry = self.files[os.path.abspath(file_path)]
+            committed = set(entry['committed']) | {chunk}
+            while entry['next_chunk'] in committed:
+                committed.remove(entry['next_chunk'])
+                entry['next_chunk'] += 1
+            entry['committed'] = sorted(committed)
+            entry['rows'] += rows
+            self._save()
+
+    def finish(self, file_path):
+        with self._lock:
+            self.files[os.path.abspath(file_path)]['done'] = True
+            self._save()
+
+    def _save(self):
+        """Atomically replace the checkpoint file (lock held)"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.files, f, indent=1)
+        os.replace(temp_path, self.path)
+
+
+def _load_chunk(chunk, airports_df, load):
+    """Worker: prepare and load one chunk"""
+    flights, rows_read, rejected = prepare_chunk(chunk, airports_df)
+    loaded = load(flights) if not flights.empty else 0
+    return rows_read, rejected, loaded
+
+
+def run_backfill(paths, airports_df, load, checkpoint_path, chunk_rows=DEFAULT_CHUNK_ROWS,
+                 workers=DEFAULT_WORKERS, report_every=10.0, prepare_partitions=None):
+    """
+    Import dump files into the flights history
+
+    Args:
+        paths (list): Dump files or directories
+        airports_df (pandas.DataFrame): Cleaned airports
+        load (callable): Takes cleaned flights with snapshot_ts and loads
+            them in one transaction (e.g. load_data.load_flight_history)
+        checkpoint_path (str): JSON checkpoint, read to resume and updated
+            after every committed chunk
+        chunk_rows (int): Rows per chunk (files already started keep the
+            chunk size they were started with)
+        workers (int): Chunks prepared and loaded at once
+        report_every (float): Seconds between progress lines
+        prepare_partitions (callable): Takes (start, end) timestamps and
+            creates the partitions they need in its own transaction; called
+            before each chunk is dispatched so workers never create them
+
+    Returns:
+        dict: Totals (files, chunks, rows_read, rejected, loaded, seconds)
+    """
+    checkpoint = BackfillCheckpoint(checkpoint_path)
+    files = find_dump_files(paths)
+    totals = {'files': 0, 'chunks': 0, 'rows_read': 0, 'rejected': 0, 'loaded': 0}
+    # Build the airport index before the workers share it
+    if not airports_df.empty:
+        get_airport_index(airports_df)
+
+    print(f"📚 Backfilling {len(files)} file(s) with {workers} worker(s)")
+    started = last_report = time.perf_counter()
+    with ThreadPoolExecutor(workers) as pool:
+        for file_path in files:
+            entry = checkpoint.state(file_path, chunk_rows)
+            if entry['done']:
+                print(f"⏭️  {file_path} already loaded")
+                continue
+
+            pending = {}
+            skip = set(entry['committed'])
+            for number, chunk in read_dump_chunks(file_path, entry['chunk_rows'], entry['next_chunk']):
+                if number in skip:
+                    continue
+                # Bounded memory: at most two chunks per worker read ahead
+                while len(pending) >= workers * 2:
+                    _collect(pending, wait(pending, return_when=FIRST_COMPLETED).done,
+                             checkpoint, totals)
+                if prepare_partitions is not None and not chunk.empty:
+                    prepare_partitions(pd.to_datetime(chunk['time'].min(), unit='s', utc=True),
+                                       pd.to_datetime(chunk['time'].max(), unit='s', utc=True))
+                pending[pool.submit(_load_chunk, chunk, airports_df, load)] = (file_path, number)
+
+                if time.perf_counter() - last_report >= report_every:
+                    last_report = time.perf_counter()
+                    _report_progress(totals, last_report - started)
+
+            _collect(pending, wait(pending).done, checkpoint, totals)
+            checkpoint.finish(file_path)
+            totals['files'] += 1
+            print(f"✅ {os.path.basename(file_path)} done")
+
+    totals['seconds'] = time.perf_counter() - started
+    _report_progress(totals, totals['seconds'])
+    return totals
+
+
+def _collect(pending, done, checkpoint, totals):
+    """
+    Record finished chunks
+
+    After a failure the chunks still running are waited for and recorded
+    too, so none of them is loaded again on resume, then the first error
+    is raised.
+    """
+    error = None
+    for future in done:
+        file_path, number = pending.pop(future)
+        try:
+            rows_read, rejected, loaded = future.result()
+        except Exception as e:
+            error = error or e
+            continue
+        checkpoint.commit(file_path, number, loaded)
+        totals['chunks'] += 1
+        totals['rows_read'] += rows_read
+        totals['rejected'] += rejected
+        totals['loaded'] += loaded
+    if error is not None:
+        if pending:
+            try:
+                _collect(pending, wait(pending).done, checkpoint, totals)
+            except Exception:
+                pass
+        raise error
+
+
+def _report_progress(totals, elapsed):
+    rate = totals['rows_read'] / elapsed if elapsed > 0 else 0
+    print(f"📈 {totals['files']} file(s), {totals['chunks']} chunk(s): {totals['rows_read']} rows read, "
+          f"{totals['loaded']} loaded, {totals['rejected']} rejected in {elapsed:.1f}s ({rate:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    """Backfill a synthetic gzip dump into an in-memory sink, interrupted once"""
+    import shutil
+
+    print("Testing backfill importer...\n")
+
+    rng = np.random.default_rng(0)
+    n = 60_000
+    dump = pd.DataFrame({
+        'time': 1_700_000_000 + 10 * (np.arange(n) // 1000),
+        'icao24': [f"{x:06x}" for x in rng.integers(0, 2 ** 24, n)],
+        'lat': rng.uniform(-95, 95, n), 'lon': rng.uniform(-180, 180, n),
+        'velocity': rng.uniform(0, 250, n), 'heading': rng.uniform(0, 360, n),
+        'vertrate': rng.uniform(-10, 10, n), 'callsign': [f"AFR{x:<5d}" for x in range(n)],
+        'onground': np.where(rng.random(n) < 0.1, 'True', 'False'), 'alert': 'False', 'spi': 'False',
+        'squawk': 7000, 'baroaltitude': rng.uniform(0, 12_000, n), 'geoaltitude': rng.uniform(0, 12_000, n),
+        'lastposupdate': 1_699_999_999.5 + 10 * (np.arange(n) // 1000),
+        'lastcontact': 1_700_000_000.2 + 10 * (np.arange(n) // 1000),
+    }, columns=DUMP_COLUMNS)
+    dump.loc[::500, 'lastposupdate'] = np.nan
+    expected = int((dump['lat'].abs() <= 90).sum())
+
+    directory = tempfile.mkdtemp()
+    try:
+        dump.to_csv(os.path.join(directory, 'states_2023-11-14-22.csv.gz'), index=False)
+        airports = pd.DataFrame({'latitude': [49.0097, 51.4700], 'longitude': [2.5479, -0.4543],
+                                 'iata_code': ['CDG', 'LHR']})
+        checkpoint_path = os.path.join(directory, 'checkpoint.json')
+        loaded = []
+
+        def failing_load(flights):
+            if len(loaded) == 3:
+                raise ConnectionError("database went away")
+            loaded.append(flights)
+            return len(flights)
+
+        try:
+            run_backfill([directory], airports, failing_load, checkpoint_path, chunk_rows=5_000, workers=2)
+        except ConnectionError as e:
+            print(f"Interrupted: {e}")
+
+        totals = run_backfill([directory], airports, lambda flights: loaded.append(flights) or len(flights),
+                              checkpoint_path, chunk_rows=5_000, workers=2)
+        result = pd.concat(loaded)
+        print(f"Loaded {len(result)} rows, expected {expected}, no duplicates: "
+              f"{not result.duplicated(['icao24', 'callsign', 'snapshot_ts']).any()}")
+        print(f"Columns: {list(result.columns)}")
+    finally:
+        shutil.rmtree(directory)
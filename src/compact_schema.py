@@ -0,0 +1,246 @@
+"""
+Compact Schema Module
+
+This module shrinks cleaned flight frames so many snapshots fit in memory:
+- icao24 (6 hex characters) becomes the uint32 it encodes
+- callsign (at most 8 ASCII characters) becomes its 8 bytes packed in a uint64
+- origin_country and nearest_airport_iata become categoricals
+- timestamps become nullable uint32 epoch seconds (valid until 2106)
+- coordinates become int32 counts of 1e-5 degree (about 1 m)
+- telemetry and airport distance/bearing columns become float32
+
+expand_flights turns a compact frame back into the regular string schema,
+which the loader does before writing to the database. Coordinates with at
+most 5 decimals (OpenSky sends 4) come back exactly.
+
+Frames are compacted once the airport columns are attached. A 100k-row
+enriched snapshot shrinks about 5x against object strings and float64
+columns, but only about 2x against what pandas 3 and extract_data already
+produce (Arrow strings, float32 telemetry); the rest would need lossy
+rounding.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Telemetry where float32 (about 7 significant digits) is more than enough
+FLOAT32_COLUMNS = [
+    'altitude', 'velocity', 'true_track', 'vertical_rate',
+    'nearest_airport_distance_km', 'nearest_airport_bearing_deg'
+]
+
+CATEGORY_COLUMNS = ['origin_country', 'nearest_airport_iata']
+
+TIMESTAMP_COLUMNS = ['time_position', 'last_contact']
+
+# Coordinates are stored as integer counts of 1/COORDINATE_SCALE degree
+COORDINATE_COLUMNS = ['latitude', 'longitude']
+COORDINATE_SCALE = 100_000
+
+_HEX_DIGITS = np.frombuffer(b'0123456789abcdef', dtype=np.uint8)
+_HEX_VALUES = np.full(256, 255, dtype=np.uint8)
+_HEX_VALUES[_HEX_DIGITS] = np.arange(16)
+_HEX_VALUES[np.frombuffer(b'ABCDEF', dtype=np.uint8)] = np.arange(10, 16)
+_HEX_SHIFTS = np.arange(20, -1, -4, dtype=np.uint32)
+
+
+def icao24_to_uint32(icao24):
+    """
+    Decode 6-character hex addresses into uint32
+
+    Args:
+        icao24 (array-like): Hex strings, e.g. '3c6444'
+
+    Returns:
+        numpy.ndarray: uint32 addresses, or None if any value is not
+        exactly 6 hex characters
+    """
+    values = pd.Series(icao24, copy=False)
+    if values.isna().any() or not (values.str.len() == 6).all():
+        return None
+
+    digits = _HEX_VALUES[np.array(values.to_numpy(dtype=object), dtype='S6')
+                         .view(np.uint8).reshape(-1, 6)]
+    if (digits == 255).any():
+        return None
+    return (digits.astype(np.uint32) << _HEX_SHIFTS).sum(axis=1, dtype=np.uint32)
+
+
+def uint32_to_icao24(addresses):
+    """Encode uint32 addresses back into lowercase 6-character hex strings"""
+    addresses = np.asarray(addresses, dtype=np.uint32)
+    digits = (addresses[:, None] >> _HEX_SHIFTS) & 0xF
+    chars = np.ascontiguousarray(_HEX_DIGITS[digits]).view('S6').reshape(-1)
+    return np.char.decode(chars, 'ascii').astype(object)
+
+
+def callsign_to_uint64(callsigns):
+    """
+    Pack callsigns of at most 8 ASCII characters into uint64
+
+    Missing and empty callsigns both become 0.
+
+    Args:
+        callsigns (array-like): Callsign strings or None
+
+    Returns:
+        numpy.ndarray: Big-endian packed callsigns as uint64, or None if a
+        callsign is longer than 8 characters or not ASCII
+    """
+    values = pd.Series(callsigns, copy=False).fillna('')
+    if not (values.str.len() <= 8).all():
+        return None
+    try:
+        packed = np.array(values.to_numpy(dtype=object), dtype='S8')
+    except UnicodeEncodeError:
+        return None
+    return packed.view('>u8').astype(np.uint64)
+
+
+def uint64_to_callsign(packed):
+    """Unpack uint64 callsigns, returning None for empty ones"""
+    raw = np.asarray(packed, dtype=np.uint64).astype('>u8').view('S8')
+    callsigns = np.char.decode(raw, 'ascii').astype(object)
+    callsigns[callsigns == ''] = None
+    return callsigns
+
+
+def is_compact(flights_df):
+    """True if any column of the frame uses a compact type"""
+    return any(
+        (column == 'icao24' and flights_df[column].dtype == np.uint32)
+        or (column == 'callsign' and flights_df[column].dtype == np.uint64)
+        or (column in CATEGORY_COLUMNS and isinstance(flights_df[column].dtype, pd.CategoricalDtype))
+        or (column in TIMESTAMP_COLUMNS and flights_df[column].dtype == 'UInt32')
+        or (column in COORDINATE_COLUMNS and flights_df[column].dtype == np.int32)
+        for column in flights_df.columns
+    )
+
+
+def compact_flights(flights_df):
+    """
+    Convert cleaned flights to the compact schema
+
+    Columns that cannot be packed losslessly (e.g. a malformed icao24) are
+    left as they are. Call it on enriched flights (combine_data does with
+    compact=True), so the airport columns are packed as well.
+
+    Args:
+        flights_df (pandas.DataFrame): Cleaned flight data
+
+    Returns:
+        pandas.DataFrame: Same rows and columns in compact types
+    """
+    if flights_df.empty:
+        return flights_df
+
+    columns = {}
+    if 'icao24' in flights_df.columns:
+        addresses = icao24_to_uint32(flights_df['icao24'])
+        if addresses is not None:
+            columns['icao24'] = addresses
+        else:
+            print("⚠️  icao24 values are not all 6 hex characters, keeping them as strings")
+
+    if 'callsign' in flights_df.columns:
+        packed = callsign_to_uint64(flights_df['callsign'])
+        if packed is not None:
+            columns['callsign'] = packed
+        else:
+            print("⚠️  Some callsigns do not fit in 8 ASCII bytes, keeping them as strings")
+
+    for column in CATEGORY_COLUMNS:
+        if column in flights_df.columns:
+            columns[column] = flights_df[column].astype('category')
+
+    for column in TIMESTAMP_COLUMNS:
+        if column in flights_df.columns:
+            seconds = pd.array(flights_df[column], dtype='Int64')
+            if ((seconds >= 0) & (seconds <= np.iinfo(np.uint32).max)).all(skipna=True):
+                columns[column] = seconds.astype('UInt32')
+
+    for column in COORDINATE_COLUMNS:
+        if column in flights_df.columns:
+            degrees = flights_df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            if np.isfinite(degrees).all():
+                columns[column] = np.round(degrees * COORDINATE_SCALE).astype(np.int32)
+
+    for column in FLOAT32_COLUMNS:
+        if column in flights_df.columns:
+            columns[column] = flights_df[column].astype(np.float32)
+
+    return flights_df.assign(**columns)
+
+
+def expand_flights(flights_df):
+    """
+    Convert a compact frame back to the regular string schema
+
+    Args:
+        flights_df (pandas.DataFrame): Output of compact_flights
+
+    Returns:
+        pandas.DataFrame: Frame with string icao24/callsign/country columns
+    """
+    if not is_compact(flights_df):
+        return flights_df
+
+    columns = {}
+    if 'icao24' in flights_df.columns and flights_df['icao24'].dtype == np.uint32:
+        columns['icao24'] = uint32_to_icao24(flights_df['icao24'].to_numpy())
+    if 'callsign' in flights_df.columns and flights_df['callsign'].dtype == np.uint64:
+        columns['callsign'] = uint64_to_callsign(flights_df['callsign'].to_numpy())
+    for column in CATEGORY_COLUMNS:
+        if column in flights_df.columns:
+            columns[column] = flights_df[column].astype(object)
+    for column in TIMESTAMP_COLUMNS:
+        if column in flights_df.columns and flights_df[column].dtype == 'UInt32':
+            columns[column] = flights_df[column].astype('Int64')
+    for column in COORDINATE_COLUMNS:
+        if column in flights_df.columns and flights_df[column].dtype == np.int32:
+            columns[column] = flights_df[column].to_numpy() / COORDINATE_SCALE
+
+    return flights_df.assign(**columns)
+
+
+if __name__ == "__main__":
+    """Measure the footprint of a compact frame and check the round trip"""
+    print("Testing compact schema...\n")
+
+    rng = np.random.default_rng(0)
+    n = 100_000
+    seen = rng.integers(1_700_000_000, 1_700_000_100, n)
+    flights = pd.DataFrame({
+        'icao24': [f"{x:06x}" for x in rng.integers(0, 2 ** 24, n)],
+        'callsign': rng.choice(['AFR123', 'BAW45', 'DLH9KX', None], n),
+        'origin_country': rng.choice(['France', 'Germany', 'United Kingdom', 'Spain'], n),
+        'time_position': pd.array(np.where(rng.random(n) < 0.05, None, seen), dtype='Int64'),
+        'last_contact': pd.array(seen, dtype='Int64'),
+        'longitude': rng.uniform(-180, 180, n).round(4),
+        'latitude': rng.uniform(-90, 90, n).round(4),
+        'altitude': rng.uniform(0, 45000, n).astype(np.float32),
+        'on_ground': rng.random(n) < 0.1,
+        'velocity': rng.uniform(0, 300, n).round(2).astype(np.float32),
+        'true_track': rng.uniform(0, 360, n).round(2).astype(np.float32),
+        'vertical_rate': rng.uniform(-20, 20, n).round(2).astype(np.float32),
+        'nearest_airport_iata': rng.choice(['CDG', 'FRA', 'LHR', 'MAD', 'AMS'], n),
+        'nearest_airport_distance_km': rng.uniform(0, 300, n),
+        'nearest_airport_bearing_deg': rng.uniform(0, 360, n),
+    })
+    # The same frame with object strings and float64 numbers throughout
+    wide = flights.astype({column: object for column in ['icao24', 'callsign', 'origin_country', 'nearest_airport_iata']})
+    wide = wide.astype({column: np.float64 for column in wide.columns if wide[column].dtype == np.float32})
+
+    compact = compact_flights(flights)
+    after = compact.memory_usage(deep=True).sum()
+    for name, frame in [('Object strings, float64', wide), ('As extracted (pandas 3)', flights)]:
+        before = frame.memory_usage(deep=True).sum()
+        print(f"{name}: {before / 1e6:.1f} MB, compact: {after / 1e6:.1f} MB ({before / after:.1f}x smaller)")
+
+    restored = expand_flights(compact)
+    for column in ['icao24', 'callsign', 'origin_country', 'nearest_airport_iata',
+                   'time_position', 'last_contact', 'latitude', 'longitude', 'altitude']:
+        same = restored[column].astype(object).equals(flights[column].astype(object))
+        print(f"   {column} round trip: {'✅' if same else '❌'}")
+    error = (restored['nearest_airport_distance_km'] - flights['nearest_airport_distance_km']).abs().max()
+    print(f"   distance max float32 error: {error * 1000:.2f} m")
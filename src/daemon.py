@@ -0,0 +1,215 @@
+"""
+Polling Daemon Module
+
+This module runs the pipeline continuously on a fixed cadence:
+- Snapshots are scheduled at start + k * interval, so timing never drifts
+- Extract, transform and load run in their own threads connected by
+  bounded queues, so snapshot N+1 is fetched while snapshot N is loaded
+- Ticks missed because a cycle overran are skipped and counted
+- SIGINT/SIGTERM stop the schedule and drain the queues before exiting
+"""
+
+import queue
+import signal
+import threading
+import time
+from datetime import datetime, timezone
+
+# Put on a queue to tell the next stage that no more snapshots are coming
+_STOP = object()
+
+
+class PipelineDaemon:
+    """
+    Long-running pipeline with overlapped stages
+
+    The three stage callables are:
+    - extract(): returns a raw snapshot (e.g. a flights DataFrame)
+    - transform(raw, snapshot_ts): returns the transformed snapshot
+    - load(transformed, snapshot_ts): writes it somewhere
+
+    Stages report failures by raising: the snapshot is dropped and counted
+    in stats['errors'], and the daemon carries on with the next one. A stage
+    that prints its errors and returns normally is counted as a success.
+    """
+
+    def __init__(self, extract, transform, load, interval=10.0, queue_size=2):
+        """
+        Create the daemon
+
+        Args:
+            extract (callable): Extraction stage
+            transform (callable): Transformation stage
+            load (callable): Loading stage
+            interval (float): Seconds between scheduled snapshots
+            queue_size (int): Snapshots that may wait between two stages.
+                When the queues are full, extraction waits instead of
+                piling up memory.
+        """
+        self.extract = extract
+        self.transform = transform
+        self.load = load
+        self.interval = interval
+
+        self.transform_queue = queue.Queue(maxsize=queue_size)
+        self.load_queue = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+
+        self._lock = threading.Lock()
+        self.stats = {
+            'ticks': 0,
+            'skipped_ticks': 0,
+            'extracted': 0,
+            'transformed': 0,
+            'loaded': 0,
+            'errors': {'extract': 0, 'transform': 0, 'load': 0},
+        }
+
+    def stop(self, *_):
+        """Stop scheduling new snapshots; queued ones are still processed"""
+        if not self.stop_event.is_set():
+            print("\n🛑 Stopping: finishing queued snapshots...")
+        self.stop_event.set()
+
+    def run(self, max_ticks=None):
+        """
+        Run until stopped (or until max_ticks snapshots were scheduled)
+
+        Args:
+            max_ticks (int): Optional limit on the number of snapshots
+
+        Returns:
+            dict: Final statistics
+        """
+        if threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGINT, self.stop)
+            signal.signal(signal.SIGTERM, self.stop)
+
+        print(f"🔁 Polling every {self.interval}s (Ctrl+C to stop)")
+        workers = [
+            threading.Thread(target=self._transform_loop, name='transform'),
+            threading.Thread(target=self._load_loop, name='load'),
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            self._extract_loop(max_ticks)
+        finally:
+            self._put(self.transform_queue, _STOP, wait_forever=True)
+            for worker in workers:
+                worker.join()
+
+        print(f"📊 Daemon stats: {self.stats}")
+        return self.stats
+
+    def _extract_loop(self, max_ticks):
+        """Schedule snapshots on a fixed grid and run the extraction stage"""
+        start = time.monotonic()
+        tick = 0
+
+        while not self.stop_event.is_set():
+            if max_ticks is not None and self.stats['ticks'] >= max_ticks:
+                break
+
+            # Wait for the next tick of the grid, waking up early on stop
+            delay = start + tick * self.interval - time.monotonic()
+            if delay > 0 and self.stop_event.wait(delay):
+                break
+
+            snapshot_ts = datetime.now(timezone.utc)
+            self._count('ticks')
+            try:
+                raw = self.extract()
+                self._count('extracted')
+                self._put(self.transform_queue, (snapshot_ts, raw))
+            except Exception as e:
+                self._count_error('extract', e)
+
+            # If the cycle overran, skip the ticks that are already in the past
+            next_tick = int((time.monotonic() - start) // self.interval) + 1
+            skipped = next_tick - tick - 1
+            if skipped > 0:
+                with self._lock:
+                    self.stats['skipped_ticks'] += skipped
+                print(f"⏭️  Cycle overran the interval, skipped {skipped} tick(s)")
+            tick = max(next_tick, tick + 1)
+
+    def _transform_loop(self):
+        """Transformation stage: runs until the extract stage sends _STOP"""
+        while True:
+            item = self.transform_queue.get()
+            if item is _STOP:
+                self._put(self.load_queue, _STOP, wait_forever=True)
+                return
+            snapshot_ts, raw = item
+            try:
+                transformed = self.transform(raw, snapshot_ts)
+                self._count('transformed')
+                self._put(self.load_queue, (snapshot_ts, transformed), wait_forever=True)
+            except Exception as e:
+                self._count_error('transform', e)
+
+    def _load_loop(self):
+        """Loading stage: runs until the transform stage sends _STOP"""
+        while True:
+            item = self.load_queue.get()
+            if item is _STOP:
+                return
+            snapshot_ts, transformed = item
+            try:
+                self.load(transformed, snapshot_ts)
+                self._count('loaded')
+            except Exception as e:
+                self._count_error('load', e)
+
+    def _put(self, target, item, wait_forever=False):
+        """
+        Put on a bounded queue, blocking while it is full
+
+        The extract stage gives up when a stop is requested so shutdown is
+        not held up by a stalled loader. Everything already queued is kept.
+        """
+        while True:
+            try:
+                target.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if self.stop_event.is_set() and not wait_forever:
+                    print("⚠️  Dropping snapshot: pipeline is stopping and the queue is full")
+                    return
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def _count_error(self, stage, error):
+        with self._lock:
+            self.stats['errors'][stage] += 1
+        print(f"❌ Error in {stage} stage: {error}")
+
+
+if __name__ == "__main__":
+    """Test the daemon with fake stages of different speeds"""
+    print("Testing polling daemon...\n")
+
+    def fake_extract():
+        time.sleep(0.05)
+        return list(range(10))
+
+    def fake_transform(raw, snapshot_ts):
+        time.sleep(0.05)
+        return [x * 2 for x in raw]
+
+    loads = []
+
+    def fake_load(rows, snapshot_ts):
+        time.sleep(0.3)  # slower than the interval: the queues absorb it
+        loads.append(snapshot_ts)
+        if len(loads) == 2:
+            raise ConnectionError("database unavailable")
+        print(f"Loaded {len(rows)} rows for snapshot {snapshot_ts:%H:%M:%S.%f}")
+
+    daemon = PipelineDaemon(fake_extract, fake_transform, fake_load, interval=0.1, queue_size=2)
+    stats = daemon.run(max_ticks=8)
+    print(f"Failed load counted: {stats['errors']['load'] == 1 and stats['loaded'] == len(loads) - 1}")
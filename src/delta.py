@@ -0,0 +1,297 @@
+"""
+Delta Module
+
+This module drops aircraft states that did not change since the last time
+they were passed on, before they are cleaned and loaded:
+- An in-memory index keyed by icao24 holds the last emitted state of every
+  aircraft
+- A state is emitted when the aircraft is new, when its position, altitude,
+  velocity or track moved beyond a tolerance, when on_ground flipped, or
+  when it has not been emitted for a while (heartbeat)
+- Positions are compared with where the last emitted state predicts the
+  aircraft to be (dead reckoning from velocity and track), so aircraft
+  cruising in a straight line are not re-emitted every snapshot
+- Each snapshot is compared with the index in one vectorized pass
+
+States are compared with the last *emitted* state, not the last seen one,
+so slow drift still gets emitted once it adds up to a tolerance. A state
+only counts as emitted once commit() confirms it was written: rows lost by
+a failed load are emitted again with the next snapshot.
+"""
+
+import threading
+
+import numpy as np
+import pandas as pd
+
+# How far a value may move before the state counts as changed
+DEFAULT_TOLERANCES = {
+    'position_m': 1000.0,   # distance from the dead-reckoned position
+    'altitude_m': 30.0,     # baro_altitude, still in meters before cleaning
+    'velocity_ms': 2.0,
+    'track_deg': 3.0,
+}
+
+# Fields stored in the index, and the tolerance of those compared directly
+_FIELDS = ['latitude', 'longitude', 'baro_altitude', 'velocity', 'true_track']
+_DIRECT_TOLERANCES = {
+    'baro_altitude': 'altitude_m',
+    'velocity': 'velocity_ms',
+    'true_track': 'track_deg',
+}
+
+# Fields whose difference wraps around (degrees)
+_PERIODS = {'true_track': 360.0}
+
+METERS_PER_DEGREE = 111_320.0
+
+
+def _changed(new, old, tolerance, period=None):
+    """
+    Element-wise: moved by more than tolerance, or became/stopped being NaN
+
+    Args:
+        new, old (numpy.ndarray): float64 values
+        tolerance (float): Allowed absolute difference
+        period (float): Optional period for angles (e.g. 360)
+
+    Returns:
+        numpy.ndarray: bool mask
+    """
+    difference = np.abs(new - old)
+    if period is not None:
+        difference = np.minimum(difference, period - difference)
+    return (difference > tolerance) | (np.isnan(new) != np.isnan(old))
+
+
+def _position_error(latitude, longitude, previous, elapsed):
+    """
+    Distance in meters between observed positions and the positions
+    predicted from the previous states
+
+    Args:
+        latitude, longitude (numpy.ndarray): Observed positions
+        previous (dict): Previous latitude/longitude/velocity/true_track
+        elapsed (numpy.ndarray): Seconds since the previous states
+
+    Returns:
+        numpy.ndarray: Error in meters (NaN where a position is missing)
+    """
+    speed = np.nan_to_num(previous['velocity'])
+    track = np.radians(np.nan_to_num(previous['true_track']))
+    travelled = speed * np.nan_to_num(elapsed)
+
+    predicted_latitude = previous['latitude'] + travelled * np.cos(track) / METERS_PER_DEGREE
+    predicted_longitude = previous['longitude'] + travelled * np.sin(track) / (
+        METERS_PER_DEGREE * np.maximum(np.cos(np.radians(previous['latitude'])), 0.01)
+    )
+
+    # Equirectangular approximation: fine at these distances
+    north = (latitude - predicted_latitude) * METERS_PER_DEGREE
+    east = ((longitude - predicted_longitude + 180.0) % 360.0 - 180.0) * (
+        METERS_PER_DEGREE * np.cos(np.radians(latitude))
+    )
+    return np.hypot(north, east)
+
+
+def _snapshot_columns(flights_df):
+    """Indexed fields as float64, on_ground as bool and last_contact as float64 seconds"""
+    values = {field: flights_df[field].to_numpy(dtype=np.float64, na_value=np.nan) for field in _FIELDS}
+    on_ground = flights_df['on_ground'].to_numpy(dtype=bool, na_value=False)
+    contact = flights_df['last_contact'].to_numpy(dtype=np.float64, na_value=np.nan)
+    return values, on_ground, contact
+
+
+class DeltaFilter:
+    """
+    Stateful filter passing on only the aircraft states that changed
+
+    Meant to be fed the raw snapshots of one stream in time order. filter()
+    and commit() may run on different threads (transform and load stages),
+    each called in snapshot order.
+    """
+
+    def __init__(self, tolerances=None, heartbeat=300, expire_after=900):
+        """
+        Create an empty filter
+
+        Args:
+            tolerances (dict): Overrides for DEFAULT_TOLERANCES
+            heartbeat (float): Seconds of last_contact after which an
+                unchanged state is emitted anyway, None to never do so
+            expire_after (float): Seconds without a sighting after which an
+                aircraft is forgotten, which bounds the index size
+        """
+        self.tolerances = {**DEFAULT_TOLERANCES, **(tolerances or {})}
+        self.heartbeat = heartbeat
+        self.expire_after = expire_after
+
+        self._icao24 = pd.Index([], dtype=object)
+        self._state = {field: np.empty(0) for field in _FIELDS}
+        self._on_ground = np.empty(0, dtype=bool)
+        self._emitted_at = np.empty(0)
+        self._seen_at = np.empty(0)
+        self._lock = threading.Lock()
+
+        self.stats = {'snapshots': 0, 'rows_in': 0, 'rows_out': 0, 'new': 0, 'expired': 0}
+
+    def __len__(self):
+        """Number of aircraft currently tracked"""
+        return len(self._icao24)
+
+    def filter(self, flights_df):
+        """
+        Return the rows of a snapshot whose state changed
+
+        The index is not updated with the returned rows: pass them to
+        commit() once they are written, until then they are compared with
+        the previous emitted state and emitted again.
+
+        Args:
+            flights_df (pandas.DataFrame): Raw flights from extraction
+                (icao24, latitude, longitude, baro_altitude, velocity,
+                true_track, on_ground, last_contact)
+
+        Returns:
+            pandas.DataFrame: The changed rows, in their original order
+        """
+        self.stats['snapshots'] += 1
+        self.stats['rows_in'] += len(flights_df)
+        if flights_df.empty:
+            return flights_df
+
+        # One state per aircraft: with duplicates, the last one wins
+        if flights_df['icao24'].duplicated().any():
+            flights_df = flights_df.drop_duplicates('icao24', keep='last')
+        values, on_ground, contact = _snapshot_columns(flights_df)
+
+        with self._lock:
+            position = self._icao24.get_indexer(flights_df['icao24'])
+            known = position >= 0
+            lookup = np.where(known, position, 0)
+
+            if len(self._icao24):
+                previous = {field: self._state[field][lookup] for field in _FIELDS}
+                elapsed = contact - self._emitted_at[lookup]
+
+                changed = on_ground != self._on_ground[lookup]
+                for field, tolerance in _DIRECT_TOLERANCES.items():
+                    changed |= _changed(values[field], previous[field],
+                                        self.tolerances[tolerance], _PERIODS.get(field))
+                error = _position_error(values['latitude'], values['longitude'], previous, elapsed)
+                changed |= error > self.tolerances['position_m']
+                changed |= np.isnan(values['latitude']) != np.isnan(previous['latitude'])
+                if self.heartbeat is not None:
+                    changed |= elapsed >= self.heartbeat
+                emit = ~known | changed
+            else:
+                emit = ~known
+
+            # Aircraft still reported are kept, even while nothing is emitted
+            self._seen_at[position[known]] = contact[known]
+            self._expire(np.nanmax(contact) if not np.isnan(contact).all() else None)
+
+        self.stats['rows_out'] += int(emit.sum())
+        return flights_df[emit]
+
+    def commit(self, changes):
+        """
+        Record rows returned by filter() as written
+
+        Later snapshots are compared with these states. Call it in snapshot
+        order, and not at all for rows whose write failed.
+
+        Args:
+            changes (pandas.DataFrame): Output of filter() (None is ignored)
+        """
+        if changes is None or changes.empty:
+            return
+        values, on_ground, contact = _snapshot_columns(changes)
+
+        with self._lock:
+            position = self._icao24.get_indexer(changes['icao24'])
+            known = position >= 0
+            for field in _FIELDS:
+                self._state[field][position[known]] = values[field][known]
+            self._on_ground[position[known]] = on_ground[known]
+            self._emitted_at[position[known]] = contact[known]
+            self._seen_at[position[known]] = contact[known]
+
+            new = ~known
+            if new.any():
+                self._icao24 = self._icao24.append(pd.Index(changes['icao24'].to_numpy(dtype=object)[new]))
+                for field in _FIELDS:
+                    self._state[field] = np.concatenate([self._state[field], values[field][new]])
+                self._on_ground = np.concatenate([self._on_ground, on_ground[new]])
+                self._emitted_at = np.concatenate([self._emitted_at, contact[new]])
+                self._seen_at = np.concatenate([self._seen_at, contact[new]])
+            self.stats['new'] += int(new.sum())
+
+    def _expire(self, now):
+        """Forget aircraft not seen for expire_after seconds (lock held)"""
+        if now is None or self.expire_after is None:
+            return
+        # NaN last_contact never compares as fresh, so those go as well
+        keep = now - self._seen_at < self.expire_after
+        if keep.all():
+            return
+
+        self.stats['expired'] += int((~keep).sum())
+        self._icao24 = self._icao24[keep]
+        for field in _FIELDS:
+            self._state[field] = self._state[field][keep]
+        self._on_ground = self._on_ground[keep]
+        self._emitted_at = self._emitted_at[keep]
+        self._seen_at = self._seen_at[keep]
+
+    def report(self):
+        """Print how much the filter removed so far"""
+        rows_in, rows_out = self.stats['rows_in'], self.stats['rows_out']
+        if rows_in:
+            print(f"🔻 Delta filter: {rows_out} of {rows_in} states passed on "
+                  f"({rows_in / max(rows_out, 1):.1f}x fewer), tracking {len(self)} aircraft")
+
+
+if __name__ == "__main__":
+    """Feed simulated snapshots with mostly idle aircraft through the filter"""
+    import time
+
+    print("Testing delta filter...\n")
+
+    rng = np.random.default_rng(0)
+    n = 20_000
+    icao24 = np.array([f"{x:06x}" for x in rng.choice(2 ** 24, n, replace=False)], dtype=object)
+    on_ground = rng.random(n) < 0.3
+    latitude = rng.uniform(40, 55, n)
+    longitude = rng.uniform(-5, 20, n)
+    velocity = np.where(on_ground, 0.0, 230.0)
+    track = rng.uniform(0, 360, n)
+    turning = ~on_ground & (rng.random(n) < 0.1)   # 10% of the airborne ones turn
+
+    delta = DeltaFilter()
+    t = 1_700_000_000
+    for step in range(10):
+        t += 10
+        track = np.where(turning, track + 3.0, track) % 360.0
+        latitude = latitude + velocity * 10 * np.cos(np.radians(track)) / METERS_PER_DEGREE
+        longitude = longitude + velocity * 10 * np.sin(np.radians(track)) / (
+            METERS_PER_DEGREE * np.cos(np.radians(latitude)))
+        snapshot = pd.DataFrame({
+            'icao24': icao24,
+            'latitude': latitude,
+            'longitude': longitude,
+            'baro_altitude': np.where(on_ground, np.nan, 10_000.0).astype(np.float32),
+            'velocity': velocity.astype(np.float32),
+            'true_track': track.astype(np.float32),
+            'on_ground': on_ground,
+            'last_contact': pd.array(np.full(n, t), dtype='Int64'),
+        })
+        started = time.perf_counter()
+        changed = delta.filter(snapshot)
+        if step != 4:  # the load of snapshot 4 fails: its changes come back
+            delta.commit(changed)
+        print(f"Snapshot {step}: {len(changed):>6} of {n} rows changed "
+              f"({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+    print()
+    delta.report()
@@ -7,14 +7,71 @@ This module handles extracting data from different sources:
 """
 
 import pandas as pd
+import numpy as np
 import requests
 import time
 import os
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 
-def extract_airports():
+from src.opensky_client import OpenSkyClient, OpenSkyError
+
+# Default area: a smaller part of Europe to reduce data size
+EUROPE_BBOX = {
+    'lamin': 45,  # South boundary (latitude)
+    'lomin': 5,   # West boundary (longitude)
+    'lamax': 50,  # North boundary (latitude)
+    'lomax': 15   # East boundary (longitude)
+}
+
+# Columns of each entry of the 'states' list returned by the API
+STATE_COLUMNS = [
+    "icao24", "callsign", "origin_country", "time_position",
+    "last_contact", "longitude", "latitude", "baro_altitude",
+    "on_ground", "velocity", "true_track", "vertical_rate",
+    "sensors", "geo_altitude", "squawk", "spi", "position_source"
+]
+
+# Columns we keep for the rest of the pipeline
+KEEP_COLUMNS = [
+    "icao24", "callsign", "origin_country", "time_position",
+    "last_contact", "longitude", "latitude", "baro_altitude",
+    "on_ground", "velocity", "true_track", "vertical_rate"
+]
+
+# Storage type of every kept column when parsing the API response
+STATE_DTYPES = {
+    "icao24": object,            # 24-bit hex address (see compact_schema for a uint32 form)
+    "callsign": object,
+    "origin_country": object,
+    "time_position": 'timestamp',  # int64 seconds with a missing-value mask
+    "last_contact": 'timestamp',
+    "longitude": np.float64,
+    "latitude": np.float64,
+    "baro_altitude": np.float32,
+    "on_ground": np.bool_,
+    "velocity": np.float32,
+    "true_track": np.float32,
+    "vertical_rate": np.float32
+}
+
+# Client shared by every call so connections stay alive between snapshots
+_default_client = None
+
+def get_default_client():
+    """Return the shared OpenSky client, creating it on first use"""
+    global _default_client
+    if _default_client is None:
+        _default_client = OpenSkyClient(pool_maxsize=16)
+    return _default_client
+
+def extract_airports(path="data/airports.csv"):
     """
     Extract airport data from CSV file
     
+    Args:
+        path (str): CSV file to read
+    
     Returns:
         pandas.DataFrame: Airport data with columns like name, city, country, coordinates
     """
@@ -22,7 +79,7 @@ def extract_airports():
     
     try:
         # TODO: Read the airports.csv file using pandas
-        airports = pd.read_csv("data/airports.csv")
+        airports = pd.read_csv(path)
         
         # TODO: Print how many airports were loaded
         print(f"{len(airports)} aréoports chargés")
@@ -33,97 +90,206 @@ def extract_airports():
         print(f"❌ Error reading airport data: {e}")
         return pd.DataFrame()
 
-def extract_flights():
+def parse_states(states):
+    """
+    Parse the OpenSky 'states' list-of-lists into typed columnar arrays
+    
+    Each kept column is pulled out of the rows in one C-level pass and
+    converted straight into a NumPy array of its final type, so no
+    intermediate 17-column object DataFrame is built. Missing values become
+    NaN for floats and a mask for the integer timestamps.
+    
+    Args:
+        states (list): Raw 'states' value from the API response
+        
+    Returns:
+        dict: column name -> NumPy array, plus '<column>_mask' boolean
+        arrays marking missing timestamps
+    """
+    states = states or []
+    rows = len(states)
+    
+    parsed = {}
+    for column, dtype in STATE_DTYPES.items():
+        values = list(map(itemgetter(STATE_COLUMNS.index(column)), states))
+        if dtype == 'timestamp':
+            array = np.array(values, dtype=np.float64).reshape(rows)
+            mask = np.isnan(array)
+            array[mask] = 0
+            parsed[column] = array.astype(np.int64)
+            parsed[f'{column}_mask'] = mask
+        else:
+            parsed[column] = np.array(values, dtype=dtype).reshape(rows)
+    
+    return parsed
+
+def states_to_dataframe(states):
+    """
+    Convert the OpenSky 'states' list-of-lists into a flights DataFrame
+    
+    Args:
+        states (list): Raw 'states' value from the API response
+        
+    Returns:
+        pandas.DataFrame: Flight data restricted to KEEP_COLUMNS, with
+        float64 coordinates, float32 telemetry, nullable Int64 timestamps
+        and a bool on_ground column
+    """
+    parsed = parse_states(states)
+    
+    data = {}
+    for column in KEEP_COLUMNS:
+        if STATE_DTYPES[column] == 'timestamp':
+            data[column] = pd.arrays.IntegerArray(parsed[column], parsed[f'{column}_mask'])
+        else:
+            data[column] = parsed[column]
+    
+    return pd.DataFrame(data, columns=KEEP_COLUMNS, copy=False)
+
+def extract_flights(bbox=None, client=None, archive=None):
     """
     Extract current flight data from OpenSky Network API
     
+    Args:
+        bbox (dict): Area to fetch with lamin/lomin/lamax/lomax keys,
+            defaults to EUROPE_BBOX
+        client (OpenSkyClient): Client to use, defaults to the shared one
+        archive (SnapshotArchive): Optional archive the raw payload is captured to
+    
     Returns:
         pandas.DataFrame: Flight data with current aircraft positions
     """
     print("🌐 Fetching live flight data from API...")
     
-    # API endpoint for OpenSky Network
-    url = "https://opensky-network.org/api/states/all"
+    client = client or get_default_client()
     
     # Parameters to limit to a smaller area (Europe) to reduce data size
-    params = {
-        'lamin': 45,  # South boundary (latitude)
-        'lomin': 5,   # West boundary (longitude) 
-        'lamax': 50,  # North boundary (latitude)
-        'lomax': 15   # East boundary (longitude)
-    }
+    params = dict(bbox or EUROPE_BBOX)
     
     try:
         print("Making API request... (this may take a few seconds)")
         
-        # TODO: Make the API request using requests.get()
-        request = requests.get(url,params = params, timeout = 10)
-
-        
-        # TODO: Check if the response is successful
-        if request.status_code == 200 :
-            print("Request successful!")
-            data = request.json()
-            states = data['states'] if data['states'] else []
-
-        else :
-            print(f"Request failed with status code: {request.status_code}")
+        data = client.get_states(params)
+        print("Request successful!")
         
-        columns = [
-            "icao24", "callsign", "origin_country", "time_position",
-            "last_contact", "longitude", "latitude", "baro_altitude",
-            "on_ground", "velocity", "true_track", "vertical_rate",
-            "sensors", "geo_altitude", "squawk", "spi", "position_source"
-        ]
-
-        keep_columns = [
-            "icao24", "callsign", "origin_country", "time_position",
-            "last_contact", "longitude", "latitude", "baro_altitude",
-            "on_ground", "velocity", "true_track", "vertical_rate"
-        ]
+        if archive is not None:
+            archive.append(data)
         
-        flights = pd.DataFrame(states, columns = columns)[keep_columns]
+        flights = states_to_dataframe(data.get('states'))
         print(f"{len(flights)} vols chargés")
-        
-        # TODO: Get the JSON data from the response
-        
-        # TODO: Extract the 'states' data from the JSON
-        
-        # TODO: Convert to DataFrame
-        
-        # TODO: Print how many flights were found
 
         return flights
         
-    except requests.exceptions.RequestException as e:
+    except (OpenSkyError, requests.exceptions.RequestException) as e:
         print(f"❌ Network error fetching flight data: {e}")
         return pd.DataFrame()
     except Exception as e:
         print(f"❌ Error processing flight data: {e}")
         return pd.DataFrame()
 
-def test_api_connection():
+def split_bbox(bbox, tile_size_deg):
+    """
+    Split a bounding box into tiles of at most tile_size_deg on each side
+    
+    Args:
+        bbox (dict): Area with lamin/lomin/lamax/lomax keys
+        tile_size_deg (float): Maximum tile edge in degrees
+        
+    Returns:
+        list: Tile bounding boxes covering bbox
+    """
+    lat_edges = np.unique(np.append(np.arange(bbox['lamin'], bbox['lamax'], tile_size_deg), bbox['lamax']))
+    lon_edges = np.unique(np.append(np.arange(bbox['lomin'], bbox['lomax'], tile_size_deg), bbox['lomax']))
+    
+    return [
+        {'lamin': float(lamin), 'lomin': float(lomin), 'lamax': float(lamax), 'lomax': float(lomax)}
+        for lamin, lamax in zip(lat_edges[:-1], lat_edges[1:])
+        for lomin, lomax in zip(lon_edges[:-1], lon_edges[1:])
+    ]
+
+def extract_flights_tiled(bbox=None, tile_size_deg=5.0, max_workers=4, timeout=10, client=None,
+                          archive=None):
+    """
+    Extract flights over a large area by fetching tiles concurrently
+    
+    The area is split into tiles that are fetched in a bounded thread pool
+    sharing the client's connection pool. Results are merged and deduplicated by
+    icao24, keeping the most recent last_contact (aircraft on a tile edge
+    can appear twice). A failed tile only removes its own aircraft from the
+    snapshot.
+    
+    Args:
+        bbox (dict): Area with lamin/lomin/lamax/lomax keys, defaults to EUROPE_BBOX
+        tile_size_deg (float): Maximum tile edge in degrees
+        max_workers (int): Maximum number of tiles fetched at once
+        timeout (float): Timeout in seconds for each tile request
+        client (OpenSkyClient): Client to use, defaults to the shared one
+        archive (SnapshotArchive): Optional archive the merged raw states are captured to
+        
+    Returns:
+        pandas.DataFrame: Flight data, with per-tile statistics in
+        flights.attrs['tile_stats']
+    """
+    tiles = split_bbox(bbox or EUROPE_BBOX, tile_size_deg)
+    print(f"🌐 Fetching live flight data from API in {len(tiles)} tiles...")
+    
+    client = client or get_default_client()
+    
+    def fetch(tile):
+        started = time.perf_counter()
+        try:
+            data = client.get_states(tile, timeout=timeout)
+            states = data.get('states') or []
+            return {'tile': tile, 'rows': len(states), 'error': None, 'time': data.get('time'),
+                    'seconds': time.perf_counter() - started}, states
+        except Exception as e:
+            return {'tile': tile, 'rows': 0, 'error': str(e), 'time': None,
+                    'seconds': time.perf_counter() - started}, []
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(fetch, tiles))
+    
+    tile_stats = [stats for stats, _ in results]
+    states = [state for _, tile_states in results for state in tile_states]
+    
+    tile_times = [stats['time'] for stats in tile_stats if stats['time']]
+    if archive is not None and tile_times:
+        archive.append({'time': max(tile_times), 'states': states})
+    
+    flights = states_to_dataframe(states)
+    flights = (flights.sort_values('last_contact', ascending=False, kind='stable')
+                      .drop_duplicates(subset='icao24', keep='first')
+                      .reset_index(drop=True))
+    
+    failed = [stats for stats in tile_stats if stats['error']]
+    flights.attrs['tile_stats'] = {
+        'tiles': len(tiles),
+        'failed_tiles': len(failed),
+        'raw_rows': len(states),
+        'rows': len(flights),
+        'per_tile': tile_stats,
+    }
+    
+    for stats in failed:
+        print(f"⚠️  Tile {stats['tile']} failed: {stats['error']}")
+    print(f"{len(flights)} vols chargés ({len(tiles) - len(failed)}/{len(tiles)} tiles OK)")
+    
+    return flights
+
+def test_api_connection(client=None):
     """
     Test function to check if the OpenSky API is accessible
     Students can use this to debug connection issues
     """
     print("🔍 Testing API connection...")
     
+    client = client or get_default_client()
+    
     try:
-        response = requests.get(
-            "https://opensky-network.org/api/states/all",
-            params={'lamin': 45, 'lomin': 5, 'lamax': 46, 'lomax': 6},
-            timeout=5
-        )
-        
-        if response.status_code == 200:
-            data = response.json()
-            flight_count = len(data['states']) if data['states'] else 0
-            print(f"✅ API connection successful! Found {flight_count} flights in test area")
-            return True
-        else:
-            print(f"⚠️ API returned status code: {response.status_code}")
-            return False
+        data = client.get_states({'lamin': 45, 'lomin': 5, 'lamax': 46, 'lomax': 6}, timeout=5)
+        flight_count = len(data['states']) if data.get('states') else 0
+        print(f"✅ API connection successful! Found {flight_count} flights in test area")
+        return True
             
     except Exception as e:
         print(f"❌ API connection failed: {e}")
@@ -0,0 +1,279 @@
+"""
+Geofence Module
+
+This module turns successive snapshots into airport arrival and departure
+events:
+- Every airport gets a fence: a radius around it and an altitude ceiling
+  above its field elevation
+- Fence centres are bucketed in a 3D grid (the same unit-sphere grid as the
+  spatial index) whose cells are as wide as the largest fence, so an
+  aircraft only has to be tested against the fences of its own and the 26
+  neighbouring cells, whatever the number of airports
+- The fence an aircraft is in is compared with the one it was in at its
+  previous sighting: leaving a fence is a departure, entering one an arrival
+
+An aircraft seen for the first time does not produce an event: whether it
+just arrived is unknown.
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.compact_schema import expand_flights
+from src.spatial_index import NEIGHBOUR_OFFSETS, cell_keys, km_to_chord, to_unit_vectors
+
+# Default fence: within this distance of the airport, and below this height
+# above the field (or on the ground)
+DEFAULT_RADIUS_KM = 8.0
+DEFAULT_CEILING_FT = 3000.0
+
+EVENT_COLUMNS = ['event_type', 'icao24', 'callsign', 'airport_iata', 'airport_icao', 'event_time',
+                 'latitude', 'longitude', 'altitude', 'on_ground']
+
+
+class GeofenceEngine:
+    """
+    Detects aircraft entering and leaving airport fences
+
+    Meant to be fed the transformed snapshots of one stream in time order,
+    from a single thread.
+    """
+
+    def __init__(self, airports_df, radius_km=DEFAULT_RADIUS_KM, ceiling_ft=DEFAULT_CEILING_FT,
+                 expire_after=900):
+        """
+        Build the fences of a set of airports
+
+        Args:
+            airports_df (pandas.DataFrame): Cleaned airports with latitude,
+                longitude, altitude (feet), iata_code and icao_code
+            radius_km (float or array-like): Fence radius, one value for all
+                airports or one per airport row
+            ceiling_ft (float or array-like): Fence height above the field
+            expire_after (float): Seconds without a sighting after which an
+                aircraft is forgotten, which bounds the state size
+        """
+        self.expire_after = expire_after
+        self.airports_df = airports_df
+
+        n = len(airports_df)
+        latitudes = airports_df['latitude'].to_numpy(dtype=np.float64)
+        longitudes = airports_df['longitude'].to_numpy(dtype=np.float64)
+        elevation = np.nan_to_num(airports_df['altitude'].to_numpy(dtype=np.float64, na_value=np.nan))
+        radius_km = np.broadcast_to(np.asarray(radius_km, dtype=np.float64), n)
+
+        self._centres = to_unit_vectors(latitudes, longitudes)
+        self._fence_chord = km_to_chord(radius_km)
+        self._ceiling = elevation + np.broadcast_to(np.asarray(ceiling_ft, dtype=np.float64), n)
+        self._iata = airports_df['iata_code'].to_numpy(dtype=object)
+        self._icao = (airports_df['icao_code'].to_numpy(dtype=object) if 'icao_code' in airports_df.columns
+                      else np.full(n, None, dtype=object))
+
+        # Fence centres sorted by grid cell, cells as wide as the largest fence
+        self._cell_size = float(self._fence_chord.max()) if n else 1.0
+        keys = cell_keys(np.floor(self._centres / self._cell_size))
+        self._order = np.argsort(keys, kind='stable')
+        self._cell_keys, self._cell_start, self._cell_count = np.unique(
+            keys[self._order], return_index=True, return_counts=True)
+
+        self._icao24 = pd.Index([], dtype=object)
+        self._fence = np.empty(0, dtype=np.int64)
+        self._seen_at = np.empty(0)
+
+        self.stats = {'snapshots': 0, 'arrivals': 0, 'departures': 0, 'expired': 0}
+
+    def __len__(self):
+        """Number of aircraft currently tracked"""
+        return len(self._icao24)
+
+    def locate(self, latitudes, longitudes, altitudes, on_ground):
+        """
+        Find the fence each aircraft is in
+
+        Args:
+            latitudes, longitudes (numpy.ndarray): Degrees
+            altitudes (numpy.ndarray): Feet, NaN where unknown
+            on_ground (numpy.ndarray): bool
+
+        Returns:
+            numpy.ndarray: Airport row of the nearest fence containing each
+            aircraft, -1 for none
+        """
+        n = len(latitudes)
+        fence = np.full(n, -1, dtype=np.int64)
+        if n == 0 or len(self._order) == 0:
+            return fence
+
+        points = to_unit_vectors(latitudes, longitudes)
+        cells = np.floor(points / self._cell_size).astype(np.int64)
+
+        # Candidate (aircraft, airport) pairs from the neighbouring cells,
+        # looking up the 27 cells of every aircraft in one pass
+        keys = cell_keys((cells[:, None, :] + NEIGHBOUR_OFFSETS[None]).reshape(-1, 3))
+        cell = np.minimum(np.searchsorted(self._cell_keys, keys), len(self._cell_keys) - 1)
+        occupied = np.flatnonzero(self._cell_keys[cell] == keys)
+        if not len(occupied):
+            return fence
+        cell = cell[occupied]
+        counts = self._cell_count[cell]
+        pair_aircraft = np.repeat(occupied // len(NEIGHBOUR_OFFSETS), counts)
+        starts = np.repeat(self._cell_start[cell] - np.cumsum(counts) + counts, counts)
+        pair_airport = self._order[starts + np.arange(len(pair_aircraft))]
+
+        chord = np.linalg.norm(points[pair_aircraft] - self._centres[pair_airport], axis=1)
+        low_enough = on_ground[pair_aircraft] | (altitudes[pair_aircraft] <= self._ceiling[pair_airport])
+        inside = (chord <= self._fence_chord[pair_airport]) & low_enough
+        pair_aircraft, pair_airport, chord = pair_aircraft[inside], pair_airport[inside], chord[inside]
+
+        # Nearest fence first for every aircraft, then keep the first pair
+        order = np.lexsort((chord, pair_aircraft))
+        pair_aircraft, pair_airport = pair_aircraft[order], pair_airport[order]
+        first = np.ones(len(pair_aircraft), dtype=bool)
+        first[1:] = pair_aircraft[1:] != pair_aircraft[:-1]
+        fence[pair_aircraft[first]] = pair_airport[first]
+        return fence
+
+    def update(self, flights_df):
+        """
+        Compare one snapshot with the previous sightings
+
+        Args:
+            flights_df (pandas.DataFrame): Transformed flights (altitude in
+                feet); the compact schema is accepted as well
+
+        Returns:
+            pandas.DataFrame: One row per event with EVENT_COLUMNS
+        """
+        self.stats['snapshots'] += 1
+        flights_df = expand_flights(flights_df)
+        if not flights_df.empty:
+            flights_df = flights_df[flights_df['latitude'].notna() & flights_df['longitude'].notna()]
+            if flights_df['icao24'].duplicated().any():
+                flights_df = flights_df.drop_duplicates('icao24', keep='last')
+        if flights_df.empty:
+            return pd.DataFrame(columns=EVENT_COLUMNS)
+
+        latitudes = flights_df['latitude'].to_numpy(dtype=np.float64)
+        longitudes = flights_df['longitude'].to_numpy(dtype=np.float64)
+        altitudes = flights_df['altitude'].to_numpy(dtype=np.float64, na_value=np.nan)
+        on_ground = flights_df['on_ground'].to_numpy(dtype=bool, na_value=False)
+        contact = flights_df['last_contact'].to_numpy(dtype=np.float64, na_value=np.nan)
+        fence = self.locate(latitudes, longitudes, altitudes, on_ground)
+
+        position = self._icao24.get_indexer(flights_df['icao24'])
+        known = position >= 0
+        previous = np.full(len(fence), -1, dtype=np.int64)
+        previous[known] = self._fence[position[known]]
+        moved = known & (fence != previous)
+        departed = moved & (previous >= 0)
+        arrived = moved & (fence >= 0)
+
+        self._fence[position[known]] = fence[known]
+        self._seen_at[position[known]] = contact[known]
+        new = ~known
+        if new.any():
+            self._icao24 = self._icao24.append(pd.Index(flights_df['icao24'].to_numpy(dtype=object)[new]))
+            self._fence = np.concatenate([self._fence, fence[new]])
+            self._seen_at = np.concatenate([self._seen_at, contact[new]])
+        if not np.isnan(contact).all():
+            self._expire(np.nanmax(contact))
+
+        events = pd.concat([
+            self._events('departure', flights_df, departed, previous[departed]),
+            self._events('arrival', flights_df, arrived, fence[arrived]),
+        ], ignore_index=True)
+        self.stats['departures'] += int(departed.sum())
+        self.stats['arrivals'] += int(arrived.sum())
+        return events
+
+    def _events(self, event_type, flights_df, mask, airports):
+        """Event rows for the masked flights at the given airport rows"""
+        rows = flights_df[mask]
+        return pd.DataFrame({
+            'event_type': event_type,
+            'icao24': rows['icao24'].to_numpy(dtype=object),
+            'callsign': rows['callsign'].to_numpy(dtype=object),
+            'airport_iata': self._iata[airports],
+            'airport_icao': self._icao[airports],
+            'event_time': rows['last_contact'].to_numpy(),
+            'latitude': rows['latitude'].to_numpy(),
+            'longitude': rows['longitude'].to_numpy(),
+            'altitude': rows['altitude'].to_numpy(),
+            'on_ground': rows['on_ground'].to_numpy(),
+        }, columns=EVENT_COLUMNS)
+
+    def _expire(self, now):
+        """Forget aircraft not seen for expire_after seconds"""
+        if self.expire_after is None:
+            return
+        keep = now - self._seen_at < self.expire_after
+        if keep.all():
+            return
+        self.stats['expired'] += int((~keep).sum())
+        self._icao24 = self._icao24[keep]
+        self._fence = self._fence[keep]
+        self._seen_at = self._seen_at[keep]
+
+    def report(self):
+        """Print the events detected so far"""
+        print(f"🛬 Geofence: {self.stats['arrivals']} arrival(s), {self.stats['departures']} "
+              f"departure(s) over {self.stats['snapshots']} snapshot(s), tracking {len(self)} aircraft")
+
+
+if __name__ == "__main__":
+    """Fly aircraft in and out of random airports and check the events"""
+    import time
+
+    print("Testing geofence engine...\n")
+
+    rng = np.random.default_rng(0)
+    n_airports = 7000
+    airports = pd.DataFrame({
+        'latitude': np.degrees(np.arcsin(rng.uniform(-1, 1, n_airports))),
+        'longitude': rng.uniform(-180, 180, n_airports),
+        'altitude': rng.uniform(0, 2000, n_airports),
+        'iata_code': [f"{i:03d}" for i in range(n_airports)],
+        'icao_code': [f"K{i:03d}" for i in range(n_airports)],
+    })
+    engine = GeofenceEngine(airports)
+
+    # Each aircraft sits over its home airport, then climbs away and comes back
+    n = 20_000
+    home = rng.integers(0, n_airports, n)
+    icao24 = np.array([f"{x:06x}" for x in rng.choice(2 ** 24, n, replace=False)], dtype=object)
+    leave_at = rng.integers(1, 5, n)
+    back_at = leave_at + rng.integers(1, 5, n)
+    t = 1_700_000_000
+    for step in range(10):
+        t += 10
+        away = (step >= leave_at) & (step < back_at)
+        snapshot = pd.DataFrame({
+            'icao24': icao24,
+            'callsign': None,
+            'latitude': airports['latitude'].to_numpy()[home] + np.where(away, 0.5, 0.0),
+            'longitude': airports['longitude'].to_numpy()[home],
+            'altitude': np.where(away, 20_000.0, airports['altitude'].to_numpy()[home] + 500),
+            'on_ground': False,
+            'last_contact': t,
+        })
+        started = time.perf_counter()
+        events = engine.update(snapshot)
+        print(f"Snapshot {step}: {len(events):>5} events ({(time.perf_counter() - started) * 1000:.1f} ms)")
+
+    departures = (back_at > leave_at) & (leave_at < 10)
+    arrivals = back_at < 10
+    print()
+    engine.report()
+    print(f"Expected {int(arrivals.sum())} arrivals and {int(departures.sum())} departures")
+
+    # Brute force on one snapshot
+    lats = rng.uniform(-60, 60, 2000)
+    lons = rng.uniform(-180, 180, 2000)
+    nearby = rng.integers(0, n_airports, 2000)
+    lats[:1000] = airports['latitude'].to_numpy()[nearby[:1000]] + rng.normal(0, 0.05, 1000)
+    lons[:1000] = airports['longitude'].to_numpy()[nearby[:1000]] + rng.normal(0, 0.05, 1000)
+    fence = engine.locate(lats, lons, np.zeros(2000), np.zeros(2000, dtype=bool))
+    chords = np.linalg.norm(to_unit_vectors(lats, lons)[:, None] - engine._centres[None], axis=2)
+    inside = chords <= engine._fence_chord[None]
+    expected = np.where(inside.any(axis=1), np.where(inside, chords, np.inf).argmin(axis=1), -1)
+    print(f"Matches brute force: {np.array_equal(fence, expected)} ({(fence >= 0).sum()} of 2000 inside a fence)")
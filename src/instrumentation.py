@@ -0,0 +1,254 @@
+"""
+Instrumentation Module
+
+This module measures each pipeline stage (extract, transform, load, verify):
+- Wall time, CPU time of the calling thread, rows in/out, bytes fetched,
+  growth of the peak RSS and database round-trips
+- One JSON line per stage run, written through the 'airlife.metrics' logger
+- Optionally, running totals in a Prometheus text-format file for the
+  node_exporter textfile collector, rewritten at most every few seconds
+
+Everything measured is a clock or counter read, so it can stay on in
+production.
+"""
+
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+logger = logging.getLogger('airlife.metrics')
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# Stage currently running in each thread, so round-trips can be attributed
+_current = threading.local()
+
+# JSON log handlers already attached, by target, so that several collectors
+# in one process do not write every record twice
+_log_handlers = {}
+
+# Seconds between two rewrites of the Prometheus textfile: well under the
+# usual scrape interval, without rewriting it after every stage run
+PROMETHEUS_WRITE_INTERVAL = 5.0
+
+# Running totals exported to Prometheus: metric -> (type, help)
+PROMETHEUS_METRICS = {
+    'runs_total': ('counter', 'Number of times the stage ran'),
+    'errors_total': ('counter', 'Number of stage runs that raised'),
+    'wall_seconds_total': ('counter', 'Wall-clock time spent in the stage'),
+    'cpu_seconds_total': ('counter', 'CPU time spent in the stage'),
+    'rows_in_total': ('counter', 'Rows received by the stage'),
+    'rows_out_total': ('counter', 'Rows produced by the stage'),
+    'bytes_total': ('counter', 'Bytes fetched by the stage'),
+    'db_round_trips_total': ('counter', 'Database round-trips made by the stage'),
+    'last_wall_seconds': ('gauge', 'Wall-clock time of the latest run'),
+    'last_peak_rss_delta_bytes': ('gauge', 'Growth of the peak RSS during the latest run'),
+}
+
+
+def _peak_rss():
+    """Peak resident set size of the process in bytes (0 if unknown)"""
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+def record_round_trips(count=1):
+    """
+    Count database round-trips against the stage running in this thread
+
+    Called automatically for every statement run through SQLAlchemy; code
+    using a raw DBAPI cursor calls it itself.
+    """
+    record = getattr(_current, 'record', None)
+    if record is not None:
+        record['db_round_trips'] += count
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    record_round_trips()
+
+
+class PipelineMetrics:
+    """
+    Collects per-stage measurements and publishes them
+    """
+
+    def __init__(self, json_log=None, prometheus_path=None, prometheus_interval=PROMETHEUS_WRITE_INTERVAL):
+        """
+        Create the collector
+
+        Args:
+            json_log (str): Optional file to append JSON lines to, '-' for
+                stderr. Without it, records still go to the 'airlife.metrics'
+                logger for any handler configured elsewhere.
+            prometheus_path (str): Optional Prometheus textfile to keep the
+                running totals in
+            prometheus_interval (float): Minimum seconds between two
+                rewrites of the textfile; summary() always writes it
+        """
+        self.prometheus_path = prometheus_path
+        self.prometheus_interval = prometheus_interval
+        self._last_prometheus_write = None
+        self.totals = {}
+        self._lock = threading.Lock()
+
+        if json_log and json_log not in _log_handlers:
+            handler = logging.StreamHandler(sys.stderr) if json_log == '-' else logging.FileHandler(json_log)
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            _log_handlers[json_log] = handler
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """
+        Measure one run of a stage
+
+        The yielded dict can be updated inside the block with 'rows_out',
+        'bytes' or any extra field to include in the JSON record.
+
+        Args:
+            name (str): Stage name, e.g. 'extract'
+            rows_in (int): Optional number of input rows
+
+        Yields:
+            dict: The record being filled in
+        """
+        record = {'stage': name, 'rows_in': rows_in, 'rows_out': None, 'bytes': 0,
+                  'db_round_trips': 0}
+        previous = getattr(_current, 'record', None)
+        _current.record = record
+
+        rss_before = _peak_rss()
+        cpu_before = time.thread_time()
+        started = time.perf_counter()
+        try:
+            yield record
+            record['error'] = None
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record['wall_seconds'] = round(time.perf_counter() - started, 6)
+            record['cpu_seconds'] = round(time.thread_time() - cpu_before, 6)
+            record['peak_rss_delta_bytes'] = _peak_rss() - rss_before
+            record['time'] = datetime.now(timezone.utc).isoformat()
+            _current.record = previous
+            self._publish(record)
+
+    def _publish(self, record):
+        """Log one record and fold it into the running totals"""
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(record, default=str))
+
+        with self._lock:
+            totals = self.totals.setdefault(record['stage'], dict.fromkeys(PROMETHEUS_METRICS, 0))
+            totals['runs_total'] += 1
+            totals['errors_total'] += record['error'] is not None
+            totals['wall_seconds_total'] += record['wall_seconds']
+            totals['cpu_seconds_total'] += record['cpu_seconds']
+            totals['rows_in_total'] += record['rows_in'] or 0
+            totals['rows_out_total'] += record['rows_out'] or 0
+            totals['bytes_total'] += record['bytes'] or 0
+            totals['db_round_trips_total'] += record['db_round_trips']
+            totals['last_wall_seconds'] = record['wall_seconds']
+            totals['last_peak_rss_delta_bytes'] = record['peak_rss_delta_bytes']
+
+            now = time.monotonic()
+            if self.prometheus_path and (self._last_prometheus_write is None
+                                         or now - self._last_prometheus_write >= self.prometheus_interval):
+                self._last_prometheus_write = now
+                self._write_prometheus()
+
+    def _write_prometheus(self):
+        """Rewrite the textfile atomically so a scrape never sees half of it (lock held)"""
+        lines = []
+        for metric, (kind, description) in PROMETHEUS_METRICS.items():
+            full_name = f'airlife_stage_{metric}'
+            lines.append(f'# HELP {full_name} {description}')
+            lines.append(f'# TYPE {full_name} {kind}')
+            for stage, totals in sorted(self.totals.items()):
+                lines.append(f'{full_name}{{stage="{stage}"}} {totals[metric]}')
+
+        directory = os.path.dirname(os.path.abspath(self.prometheus_path))
+        try:
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            # mkstemp creates the file as 0600: the collector may run as another user
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, self.prometheus_path)
+        except OSError as e:
+            print(f"⚠️  Could not write metrics file {self.prometheus_path}: {e}")
+
+    def summary(self):
+        """Print a one-line summary per stage, and write the final totals to the textfile"""
+        with self._lock:
+            if self.prometheus_path:
+                self._write_prometheus()
+            for stage, totals in self.totals.items():
+                runs = totals['runs_total']
+                print(f"⏱️  {stage}: {runs} run(s), "
+                      f"{totals['wall_seconds_total'] / runs:.3f}s wall / "
+                      f"{totals['cpu_seconds_total'] / runs:.3f}s CPU on average, "
+                      f"{totals['rows_out_total']} rows out, "
+                      f"{totals['db_round_trips_total']} DB round-trips")
+
+
+if __name__ == "__main__":
+    """Measure a few fake stages and show the outputs"""
+    print("Testing instrumentation...\n")
+
+    with tempfile.TemporaryDirectory() as directory:
+        prometheus_path = os.path.join(directory, 'airlife.prom')
+        metrics = PipelineMetrics(json_log='-', prometheus_path=prometheus_path)
+
+        for _ in range(3):
+            with metrics.stage('extract') as record:
+                payload = b'x' * 50_000_000
+                record['bytes'] = len(payload)
+                record['rows_out'] = 1000
+            with metrics.stage('transform', rows_in=1000) as record:
+                record['rows_out'] = sum(i * i for i in range(200_000)) and 990
+            with metrics.stage('load', rows_in=990):
+                record_round_trips(3)
+
+        try:
+            with metrics.stage('verify'):
+                raise RuntimeError("database unavailable")
+        except RuntimeError:
+            pass
+
+        print()
+        metrics.summary()
+        print(f"\n{prometheus_path} (mode {os.stat(prometheus_path).st_mode & 0o777:o}):")
+        with open(prometheus_path) as f:
+            print(f.read())
+
+        # Overhead of an empty stage, with the (throttled) textfile and without
+        logger.setLevel(logging.WARNING)
+        for label in ['with the textfile', 'without the textfile']:
+            started = time.perf_counter()
+            for _ in range(10_000):
+                with metrics.stage('noop'):
+                    pass
+            print(f"Overhead {label}: {(time.perf_counter() - started) / 10_000 * 1e6:.1f} µs per stage")
+            metrics.prometheus_path = None
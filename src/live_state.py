@@ -0,0 +1,484 @@
+"""
+Live State Module
+
+This module keeps the latest state of every aircraft in memory, so live
+maps can be served without querying the database:
+- Each transformed snapshot is merged into the store: aircraft seen again
+  are updated, new ones added, and aircraft not seen for a while dropped
+- States are held as columns sorted by grid cell, with the offset of every
+  cell, so a bounding box maps to one contiguous slice per latitude row
+- Bounding-box, radius and nearest-N queries read an immutable view of the
+  store: updates build the next view and swap it in, so readers never lock;
+  only the aircraft that changed cell are sorted and merged into the order
+  of the previous view
+- LiveStateServer answers these queries as JSON over HTTP
+"""
+
+import json
+import math
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from src.compact_schema import expand_flights
+from src.spatial_index import EARTH_RADIUS_KM, haversine_km
+
+# Columns kept per aircraft (the icao24 key aside)
+STATE_COLUMNS = ['callsign', 'origin_country', 'latitude', 'longitude', 'altitude', 'velocity',
+                 'true_track', 'vertical_rate', 'on_ground', 'last_contact', 'nearest_airport_iata']
+_TEXT_COLUMNS = {'callsign', 'origin_country', 'nearest_airport_iata'}
+
+DEFAULT_CELL_DEG = 1.0
+DEFAULT_EXPIRE_AFTER = 300
+
+# Half the Earth's circumference: no point on Earth is further away
+_MAX_DISTANCE_KM = np.pi * EARTH_RADIUS_KM
+_KM_PER_DEGREE = np.pi * EARTH_RADIUS_KM / 180
+
+# nearest() starts from the radius expected to hold n aircraft at the local
+# density, times this margin, and doubles it until enough aircraft are found
+_NEAREST_MARGIN = 1.5
+
+
+class _View:
+    """Immutable state of the store: columns sorted by grid cell, with cell offsets"""
+
+    def __init__(self, icao24, columns, cell_deg, keys=None):
+        """
+        Args:
+            icao24 (numpy.ndarray): Aircraft addresses
+            columns (dict): STATE_COLUMNS arrays, aligned with icao24
+            cell_deg (float): Size of the grid cells in degrees
+            keys (numpy.ndarray): Cell keys of the rows when they are already
+                sorted by cell (they are sorted here otherwise)
+        """
+        self.cell_deg = cell_deg
+        self.rows = int(np.ceil(180 / cell_deg))
+        self.cols = int(np.ceil(360 / cell_deg))
+
+        if keys is None:
+            keys = self.cell_keys(columns['latitude'], columns['longitude'])
+            order = np.argsort(keys, kind='stable')
+            icao24, keys = icao24[order], keys[order]
+            columns = {name: values[order] for name, values in columns.items()}
+        self.icao24 = icao24
+        self.index = pd.Index(self.icao24)
+        self.columns = columns
+        self.keys = keys
+        self.starts = np.zeros(self.rows * self.cols + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys, minlength=self.rows * self.cols), out=self.starts[1:])
+
+    def __len__(self):
+        return len(self.icao24)
+
+    def cell_row(self, latitude):
+        return np.clip(((np.asarray(latitude) + 90) // self.cell_deg).astype(np.int64), 0, self.rows - 1)
+
+    def cell_col(self, longitude):
+        return np.clip(((np.asarray(longitude) + 180) // self.cell_deg).astype(np.int64), 0, self.cols - 1)
+
+    def cell_keys(self, latitude, longitude):
+        return self.cell_row(latitude) * self.cols + self.cell_col(longitude)
+
+    def cell_span(self, low, high, origin, count):
+        """First and last cell index covering [low, high] of one axis (plain ints, for single queries)"""
+        first = min(max(int((low + origin) // self.cell_deg), 0), count - 1)
+        last = min(max(int((high + origin) // self.cell_deg), 0), count - 1)
+        return first, last
+
+    def candidates(self, lamin, lomin, lamax, lomax):
+        """Positions of the states in the grid cells covering a box (lomin > lomax wraps the antimeridian)"""
+        first_row, last_row = self.cell_span(lamin, lamax, 90, self.rows)
+        row_keys = np.arange(first_row, last_row + 1) * self.cols
+        col_ranges = [(lomin, lomax)] if lomin <= lomax else [(lomin, 180.0), (-180.0, lomax)]
+        firsts, lasts = [], []
+        for low, high in col_ranges:
+            first_col, last_col = self.cell_span(low, high, 180, self.cols)
+            firsts.append(self.starts[row_keys + first_col])
+            lasts.append(self.starts[row_keys + last_col + 1])
+        return _concat_ranges(np.concatenate(firsts), np.concatenate(lasts))
+
+    def count_around(self, latitude, longitude):
+        """Number of states in the 3x3 cells around a point, and the area of those cells in km²"""
+        first_row, last_row = self.cell_span(latitude - self.cell_deg, latitude + self.cell_deg, 90, self.rows)
+        first_col, last_col = self.cell_span(longitude - self.cell_deg, longitude + self.cell_deg, 180, self.cols)
+        row_keys = np.arange(first_row, last_row + 1) * self.cols
+        count = int((self.starts[row_keys + last_col + 1] - self.starts[row_keys + first_col]).sum())
+        cell_km = self.cell_deg * _KM_PER_DEGREE
+        area = len(row_keys) * (last_col - first_col + 1) * cell_km ** 2 * max(np.cos(np.radians(latitude)), 0.01)
+        return count, area
+
+
+def _concat_ranges(firsts, lasts):
+    """np.concatenate of np.arange(first, last) for every pair, without building each range"""
+    lengths = lasts - firsts
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    offsets = firsts - (np.cumsum(lengths) - lengths)
+    return np.repeat(offsets, lengths) + np.arange(total)
+
+
+class LiveStateStore:
+    """
+    Latest state per icao24, indexed by grid cell
+
+    update() is meant to be called from a single thread (the load stage);
+    queries can run from any number of threads at the same time.
+    """
+
+    def __init__(self, cell_deg=DEFAULT_CELL_DEG, expire_after=DEFAULT_EXPIRE_AFTER):
+        """
+        Create an empty store
+
+        Args:
+            cell_deg (float): Size of the grid cells in degrees
+            expire_after (float): Seconds of last_contact after which an
+                aircraft no longer reported is dropped; must exceed the delta
+                heartbeat when unchanged aircraft are filtered out upstream
+        """
+        self.cell_deg = cell_deg
+        self.expire_after = expire_after
+        self._view = _View(np.empty(0, dtype=object), _empty_columns(), cell_deg)
+        self.stats = {'snapshots': 0, 'updated': 0, 'new': 0, 'moved': 0, 'expired': 0, 'update_ms': 0.0}
+
+    def __len__(self):
+        return len(self._view)
+
+    def update(self, flights_df):
+        """
+        Merge a transformed snapshot into the store
+
+        Args:
+            flights_df (pandas.DataFrame): Transformed flights (regular or
+                compact schema)
+        """
+        started = time.perf_counter()
+        self.stats['snapshots'] += 1
+        flights_df = expand_flights(flights_df)
+        if not flights_df.empty and flights_df['icao24'].duplicated().any():
+            flights_df = flights_df.drop_duplicates('icao24', keep='last')
+
+        view = self._view
+        incoming = _state_columns(flights_df)
+        position = view.index.get_indexer(flights_df['icao24']) if len(flights_df) else np.empty(0, dtype=np.int64)
+        known = position >= 0
+
+        # Copy on write: the current view stays valid for running queries.
+        # Rows of the current view come first, in its cell order, then the
+        # aircraft seen for the first time
+        columns = {}
+        for name, values in view.columns.items():
+            values = values.copy()
+            values[position[known]] = incoming[name][known]
+            columns[name] = np.concatenate([values, incoming[name][~known]])
+        icao24 = np.concatenate([view.icao24, flights_df['icao24'].to_numpy(dtype=object)[~known]])
+
+        # Drop aircraft without a position or not heard from for expire_after seconds
+        keep = ~np.isnan(columns['latitude']) & ~np.isnan(columns['longitude'])
+        contact = columns['last_contact']
+        if self.expire_after is not None and len(contact) and not np.isnan(contact).all():
+            with np.errstate(invalid='ignore'):
+                keep &= ~(contact < np.nanmax(contact) - self.expire_after)
+        self.stats['expired'] += int((~keep).sum())
+
+        # Only aircraft that changed cell (or are new) are sorted again; the
+        # others keep the order of the current view and the moved ones are
+        # merged into it, instead of sorting every aircraft
+        rows = np.flatnonzero(keep)
+        keys = np.zeros(len(icao24), dtype=np.int64)
+        keys[rows] = view.cell_keys(columns['latitude'][rows], columns['longitude'][rows])
+        stays = keep.copy()
+        stays[:len(view)] &= keys[:len(view)] == view.keys
+        stays[len(view):] = False
+        staying = np.flatnonzero(stays)
+        moving = np.flatnonzero(keep & ~stays)
+        moving = moving[np.argsort(keys[moving], kind='stable')]
+        if len(moving) or len(staying) < len(icao24):
+            order = np.insert(staying, np.searchsorted(keys[staying], keys[moving], side='right'), moving)
+            icao24, keys = icao24[order], keys[order]
+            columns = {name: values[order] for name, values in columns.items()}
+
+        self._view = _View(icao24, columns, self.cell_deg, keys)
+        self.stats['moved'] += len(moving)
+
+        self.stats['updated'] += int(known.sum())
+        self.stats['new'] += int((~known).sum())
+        self.stats['update_ms'] = (time.perf_counter() - started) * 1000
+
+    def get(self, icao24):
+        """State of one aircraft as a dict, or None if unknown"""
+        view = self._view
+        if icao24 not in view.index:
+            return None
+        return _records(view, np.array([view.index.get_loc(icao24)]))[0]
+
+    def bbox(self, lamin, lomin, lamax, lomax, limit=None):
+        """
+        Aircraft inside a bounding box
+
+        Args:
+            lamin, lomin, lamax, lomax (float): Box in degrees; lomin > lomax
+                means the box crosses the antimeridian
+            limit (int): Maximum number of aircraft returned
+
+        Returns:
+            list: One dict per aircraft
+        """
+        view = self._view
+        rows = view.candidates(lamin, lomin, lamax, lomax)
+        latitude = view.columns['latitude'][rows]
+        longitude = view.columns['longitude'][rows]
+        inside = (latitude >= lamin) & (latitude <= lamax)
+        if lomin <= lomax:
+            inside &= (longitude >= lomin) & (longitude <= lomax)
+        else:
+            inside &= (longitude >= lomin) | (longitude <= lomax)
+        return _records(view, rows[inside][:limit])
+
+    def radius(self, latitude, longitude, radius_km, limit=None):
+        """
+        Aircraft within radius_km of a point, closest first
+
+        Returns:
+            list: One dict per aircraft, with distance_km
+        """
+        view = self._view
+        rows, distances = self._within(view, latitude, longitude, radius_km)
+        order = np.argsort(distances, kind='stable')[:limit]
+        return _records(view, rows[order], distances[order])
+
+    def nearest(self, latitude, longitude, n=10):
+        """
+        The n aircraft closest to a point, closest first
+
+        Searches growing circles until one holds at least n aircraft, so
+        only the cells around the point are read. The first circle is sized
+        from the number of aircraft in the cells around the point, so one
+        pass is usually enough.
+
+        Returns:
+            list: One dict per aircraft, with distance_km
+        """
+        view = self._view
+        count, area = view.count_around(latitude, longitude)
+        if count:
+            radius_km = _NEAREST_MARGIN * np.sqrt(n * area / (np.pi * count))
+        else:
+            # Nothing in the surrounding cells: start just beyond them
+            radius_km = 2 * view.cell_deg * _KM_PER_DEGREE
+        while True:
+            rows, distances = self._within(view, latitude, longitude, radius_km)
+            if len(rows) >= n or radius_km >= _MAX_DISTANCE_KM:
+                break
+            radius_km = min(radius_km * 2, _MAX_DISTANCE_KM)
+        order = np.argsort(distances, kind='stable')[:n]
+        return _records(view, rows[order], distances[order])
+
+    @staticmethod
+    def _within(view, latitude, longitude, radius_km):
+        """Positions and distances of the states within radius_km of a point"""
+        radius_deg = radius_km / _KM_PER_DEGREE
+        lamin, lamax = latitude - radius_deg, latitude + radius_deg
+        if lamin <= -90 or lamax >= 90:
+            # The circle covers a pole: every longitude is in range
+            lamin, lamax, lomin, lomax = max(lamin, -90.0), min(lamax, 90.0), -180.0, 180.0
+        else:
+            half_width = radius_deg / np.cos(np.radians(max(abs(lamin), abs(lamax))))
+            if half_width >= 180:
+                lomin, lomax = -180.0, 180.0
+            else:
+                lomin = (longitude - half_width + 180) % 360 - 180
+                lomax = (longitude + half_width + 180) % 360 - 180
+        rows = view.candidates(lamin, lomin, lamax, lomax)
+        distances = haversine_km(latitude, longitude, view.columns['latitude'][rows],
+                                 view.columns['longitude'][rows])
+        inside = distances <= radius_km
+        return rows[inside], distances[inside]
+
+    def report(self):
+        """Print the size of the store and the cost of the last update"""
+        print(f"🗺️  Live state: {len(self)} aircraft over {self.stats['snapshots']} snapshot(s), "
+              f"{self.stats['expired']} expired, last update {self.stats['update_ms']:.1f} ms")
+
+
+def _empty_columns():
+    return {name: np.empty(0, dtype=object if name in _TEXT_COLUMNS else np.float64) for name in STATE_COLUMNS}
+
+
+def _state_columns(flights_df):
+    """STATE_COLUMNS of a frame as NumPy arrays (text as objects, the rest as floats)"""
+    columns = {}
+    for name in STATE_COLUMNS:
+        if name not in flights_df.columns:
+            columns[name] = np.full(len(flights_df), None if name in _TEXT_COLUMNS else np.nan,
+                                    dtype=object if name in _TEXT_COLUMNS else np.float64)
+        elif name in _TEXT_COLUMNS:
+            values = flights_df[name].to_numpy(dtype=object)
+            columns[name] = np.where(pd.isna(values), None, values)
+        else:
+            columns[name] = flights_df[name].to_numpy(dtype=np.float64, na_value=np.nan)
+    return columns
+
+
+def _records(view, rows, distances=None):
+    """JSON-ready dicts for some positions of a view (NaN becomes None)"""
+    values = {'icao24': view.icao24[rows].tolist()}
+    for name, column in view.columns.items():
+        selected = column[rows]
+        if name == 'on_ground':
+            values[name] = [None if math.isnan(x) else bool(x) for x in selected.tolist()]
+        elif name == 'last_contact':
+            values[name] = [None if math.isnan(x) else int(x) for x in selected.tolist()]
+        elif name in _TEXT_COLUMNS:
+            values[name] = selected.tolist()
+        else:
+            values[name] = [None if math.isnan(x) else x for x in selected.tolist()]
+    if distances is not None:
+        values['distance_km'] = np.round(distances, 3).tolist()
+    names = list(values)
+    return [dict(zip(names, record)) for record in zip(*values.values())]
+
+
+class _LiveStateHandler(BaseHTTPRequestHandler):
+    """
+    GET /aircraft?bbox=lamin,lomin,lamax,lomax[&limit=N]
+    GET /aircraft?lat=..&lon=..&radius_km=..[&limit=N]
+    GET /aircraft?lat=..&lon=..&nearest=N
+    GET /aircraft/<icao24>
+    GET /stats
+    """
+
+    store = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            if url.path == '/aircraft':
+                self._send(200, self._query_aircraft(query))
+            elif url.path.startswith('/aircraft/'):
+                state = self.store.get(url.path[len('/aircraft/'):].lower())
+                self._send(200, state) if state else self._send(404, {'error': 'unknown aircraft'})
+            elif url.path == '/stats':
+                self._send(200, {'aircraft': len(self.store), **self.store.stats})
+            else:
+                self._send(404, {'error': 'unknown path'})
+        except (KeyError, ValueError) as e:
+            self._send(400, {'error': f"bad query: {e}"})
+
+    def _query_aircraft(self, query):
+        limit = int(query['limit']) if 'limit' in query else None
+        if 'bbox' in query:
+            lamin, lomin, lamax, lomax = (float(x) for x in query['bbox'].split(','))
+            aircraft = self.store.bbox(lamin, lomin, lamax, lomax, limit)
+        elif 'nearest' in query:
+            aircraft = self.store.nearest(float(query['lat']), float(query['lon']), int(query['nearest']))
+        elif 'radius_km' in query:
+            aircraft = self.store.radius(float(query['lat']), float(query['lon']), float(query['radius_km']), limit)
+        else:
+            raise ValueError("expected bbox, radius_km or nearest")
+        return {'count': len(aircraft), 'aircraft': aircraft}
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class LiveStateServer:
+    """Serves the queries of a LiveStateStore as JSON over HTTP, from a background thread"""
+
+    def __init__(self, store, host='127.0.0.1', port=8080):
+        """
+        Args:
+            store (LiveStateStore): Store to serve
+            host (str): Address to listen on
+            port (int): Port to listen on (0 picks a free one)
+        """
+        handler = type('LiveStateHandler', (_LiveStateHandler,), {'store': store})
+        self.httpd = ThreadingHTTPServer((host, port), handler)
+        self.httpd.daemon_threads = True
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='live-state-http', daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread.start()
+        print(f"🗺️  Live state API on {self.url}/aircraft")
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    """Feed world-wide snapshots to the store, check queries against brute force and time them"""
+    from urllib.request import urlopen
+
+    print("Testing live state store...\n")
+
+    rng = np.random.default_rng(0)
+    n = 20_000
+    icao24 = np.array([f"{x:06x}" for x in rng.choice(2 ** 24, n, replace=False)], dtype=object)
+    latitude = np.degrees(np.arcsin(rng.uniform(-0.9, 0.9, n)))
+    longitude = rng.uniform(-180, 180, n)
+
+    store = LiveStateStore()
+    for i in range(5):
+        seen = rng.random(n) < 0.95
+        latitude = np.clip(latitude + rng.normal(0, 0.05, n), -89.9, 89.9)
+        longitude = (longitude + rng.normal(0, 0.05, n) + 180) % 360 - 180
+        store.update(pd.DataFrame({
+            'icao24': icao24[seen], 'callsign': [f"AFR{x}" for x in range(seen.sum())],
+            'latitude': latitude[seen], 'longitude': longitude[seen],
+            'altitude': rng.uniform(0, 40_000, seen.sum()), 'on_ground': rng.random(seen.sum()) < 0.1,
+            'last_contact': 1_700_000_000 + 10 * i,
+        }))
+    store.report()
+
+    view = store._view
+    lats, lons = view.columns['latitude'], view.columns['longitude']
+    box = store.bbox(40, -10, 55, 20)
+    expected = ((lats >= 40) & (lats <= 55) & (lons >= -10) & (lons <= 20)).sum()
+    print(f"bbox: {len(box)} aircraft, brute force {expected}")
+    wrapped = store.bbox(-20, 170, 20, -170)
+    expected = ((lats >= -20) & (lats <= 20) & ((lons >= 170) | (lons <= -170))).sum()
+    print(f"bbox across the antimeridian: {len(wrapped)} aircraft, brute force {expected}")
+    circle = store.radius(48.85, 2.35, 500)
+    expected = (haversine_km(48.85, 2.35, lats, lons) <= 500).sum()
+    print(f"radius: {len(circle)} aircraft, brute force {expected}")
+    closest = store.nearest(89.0, 179.9, 5)
+    expected = np.sort(haversine_km(89.0, 179.9, lats, lons))[:5]
+    print(f"nearest 5 near the pole match brute force: "
+          f"{np.allclose([a['distance_km'] for a in closest], expected, atol=1e-3)}")
+
+    for name, query in [('bbox', lambda: store.bbox(45, 0, 50, 10)),
+                        ('radius', lambda: store.radius(48.85, 2.35, 200)),
+                        ('nearest', lambda: store.nearest(48.85, 2.35, 10))]:
+        started = time.perf_counter()
+        for _ in range(1000):
+            result = query()
+        print(f"{name}: {len(result)} aircraft in {(time.perf_counter() - started):.3f} ms per query")
+
+    server = LiveStateServer(store, port=0).start()
+    with urlopen(f"{server.url}/aircraft?lat=48.85&lon=2.35&nearest=3") as response:
+        body = json.load(response)
+    print(f"HTTP nearest: {[(a['icao24'], a['distance_km']) for a in body['aircraft']]}")
+    with urlopen(f"{server.url}/aircraft/{body['aircraft'][0]['icao24']}") as response:
+        print(f"HTTP lookup: {json.load(response)['icao24']}")
+    server.stop()
@@ -3,14 +3,26 @@ Data Loading Module
 
 This module handles loading cleaned data into PostgreSQL database:
 - Load airport data to airports table
-- Load flight data to flights table  
+- Load flight data to flights table (bulk COPY through staging tables)
 - Verify data was loaded correctly
 """
 
+import io
+import threading
+from datetime import datetime, timedelta, timezone
+
 import pandas as pd
 from sqlalchemy import create_engine, text
 import psycopg2
 
+from src.compact_schema import expand_flights
+from src.instrumentation import record_round_trips
+from src.partitions import (INTERVALS, PARTITION_INTERVAL, drop_partitions_before, ensure_partitions,
+                            forget_partitions, is_partitioned)
+from src.trajectories import decode_track
+from src.rollups import (flight_rollup_upsert, forget_rollups, has_rollups, rebuild_flight_rollup,
+                         refresh_airport_rollup)
+
 # Database connection configuration
 # Update these values with your actual database credentials
 DATABASE_CONFIG = {
@@ -23,47 +35,331 @@ DATABASE_CONFIG = {
 
 def get_connection_string():
     """Build PostgreSQL connection string"""
-    return f"postgresql://{DATABASE_CONFIG['username']}:{DATABASE_CONFIG['password']}@{DATABASE_CONFIG['host']}:{DATABASE_CONFIG['port']}/{DATABASE_CONFIG['database']}"
+    return f"postgresql+psycopg2://{DATABASE_CONFIG['username']}:{DATABASE_CONFIG['password']}@{DATABASE_CONFIG['host']}:{DATABASE_CONFIG['port']}/{DATABASE_CONFIG['database']}"
+
+# Connection pool settings for the shared engine
+POOL_CONFIG = {
+    'pool_size': 5,          # connections kept open between cycles
+    'max_overflow': 5,       # extra connections allowed under load
+    'pool_recycle': 1800,    # reopen connections older than 30 minutes
+    'pool_pre_ping': True,   # replace connections the server closed
+}
+
+_engine = None
+_engine_lock = threading.Lock()
 
-def load_to_database(airports_df, flights_df):
+def get_engine():
+    """
+    Return the engine shared by the whole process, creating it on first use
+    
+    Reusing one engine keeps its pooled connections open across loads,
+    verification and daemon cycles instead of reconnecting every time.
+    
+    Returns:
+        sqlalchemy.engine.Engine: Pooled engine for DATABASE_CONFIG
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(get_connection_string(), **POOL_CONFIG)
+    return _engine
+
+def dispose_engine():
+    """Close all pooled connections (the next get_engine() starts fresh)"""
+    global _engine
+    with _engine_lock:
+        if _engine is not None:
+            _engine.dispose()
+            _engine = None
+
+# Columns filled in by the database itself, never sent from a DataFrame
+GENERATED_COLUMNS = {'id', 'created_at'}
+
+INTEGER_TYPES = {'smallint', 'integer', 'bigint'}
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """psycopg2 cursor that reports its round-trips to the instrumentation"""
+    
+    def execute(self, query, vars=None):
+        record_round_trips()
+        return super().execute(query, vars)
+    
+    def copy_expert(self, sql, file, size=8192):
+        record_round_trips()
+        return super().copy_expert(sql, file, size)
+
+
+def get_table_columns(cursor, table_name):
+    """
+    Read the declared columns of a table
+    
+    Args:
+        cursor: psycopg2 cursor
+        table_name (str): Table to inspect
+        
+    Returns:
+        dict: column name -> PostgreSQL data type, in table order
+    """
+    cursor.execute(
+        """
+        SELECT column_name, data_type
+        FROM information_schema.columns
+        WHERE table_schema = current_schema() AND table_name = %s
+        ORDER BY ordinal_position
+        """,
+        (table_name,)
+    )
+    return dict(cursor.fetchall())
+
+
+def prepare_for_copy(df, table_columns):
+    """
+    Align a DataFrame with a table's declared schema before COPY
+    
+    Keeps only the columns the table declares (minus generated ones like the
+    SERIAL id) and turns float columns that target integer types back into
+    integers, since NaN forces pandas to store them as floats.
+    
+    Args:
+        df (pandas.DataFrame): Data to load
+        table_columns (dict): Output of get_table_columns()
+        
+    Returns:
+        pandas.DataFrame: Frame whose columns all exist in the table
+    """
+    columns = [c for c in df.columns if c in table_columns and c not in GENERATED_COLUMNS]
+    df = df[columns]
+    
+    for column in columns:
+        if table_columns[column] in INTEGER_TYPES and df[column].dtype.kind == 'f':
+            df = df.assign(**{column: df[column].round().astype('Int64')})
+    
+    return df
+
+
+def dataframe_to_csv_buffer(df):
+    """Serialize a DataFrame into an in-memory CSV buffer ready for COPY"""
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False, header=False, na_rep='')
+    buffer.seek(0)
+    return buffer
+
+
+def copy_dataframe(cursor, df, table_name):
+    """
+    Stream a DataFrame into a table with COPY ... FROM STDIN
+    
+    Args:
+        cursor: psycopg2 cursor
+        df (pandas.DataFrame): Data whose columns all exist in the table
+        table_name (str): Destination table
+    """
+    column_list = ', '.join(f'"{c}"' for c in df.columns)
+    cursor.copy_expert(
+        f"COPY {table_name} ({column_list}) FROM STDIN WITH (FORMAT csv, NULL '')",
+        dataframe_to_csv_buffer(df)
+    )
+
+
+def stage_dataframe(cursor, df, table_name):
+    """
+    COPY a DataFrame into a temporary staging copy of a table
+    
+    The staging table has the same column types as the real one but no
+    constraints, defaults or indexes, and disappears at commit.
+    
+    Args:
+        cursor: psycopg2 cursor
+        df (pandas.DataFrame): Data to stage
+        table_name (str): Real table whose schema the staging table copies
+        
+    Returns:
+        tuple: (staging table name, list of staged columns)
+    """
+    table_columns = get_table_columns(cursor, table_name)
+    if not table_columns:
+        raise ValueError(f"Table '{table_name}' does not exist (run database_setup.sql)")
+    
+    df = prepare_for_copy(df, table_columns)
+    columns = list(df.columns)
+    staging_table = f"staging_{table_name}"
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    
+    cursor.execute(
+        f"CREATE TEMP TABLE {staging_table} ON COMMIT DROP AS "
+        f"SELECT {column_list} FROM {table_name} WITH NO DATA"
+    )
+    copy_dataframe(cursor, df, staging_table)
+    return staging_table, columns
+
+
+def replace_table_contents(cursor, df, table_name):
+    """
+    Replace a table's rows with a DataFrame while keeping its schema
+    
+    Rows are COPYed into a staging table first, so the real table is only
+    locked for one TRUNCATE + INSERT ... SELECT inside the transaction.
+    
+    Args:
+        cursor: psycopg2 cursor inside an open transaction
+        df (pandas.DataFrame): New table contents
+        table_name (str): Destination table
+        
+    Returns:
+        tuple: (staging table name, list of loaded columns)
+    """
+    staging_table, columns = stage_dataframe(cursor, df, table_name)
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    
+    cursor.execute(f"TRUNCATE {table_name} RESTART IDENTITY")
+    cursor.execute(
+        f"INSERT INTO {table_name} ({column_list}) "
+        f"SELECT {column_list} FROM {staging_table}"
+    )
+    return staging_table, columns
+
+
+def append_flights_snapshot(cursor, flights_df, snapshot_ts, update_rollups=False):
+    """
+    Append one snapshot to the flights history and update flights_latest
+    
+    Only aircraft whose last_contact moved forward since the state stored in
+    flights_latest (or that were never seen before) are written, both to the
+    history and to flights_latest. Both writes (and the rollup update) happen
+    in one statement so they see the same flights_latest.
+    
+    A state without last_contact cannot be shown to be newer: it is written
+    for aircraft not in flights_latest yet, and it never replaces a stored
+    state that has a last_contact. A stored state without last_contact is
+    replaced by the next snapshot of its aircraft.
+    
+    Args:
+        cursor: psycopg2 cursor inside an open transaction
+        flights_df (pandas.DataFrame): Cleaned flight data for this snapshot
+        snapshot_ts (datetime): Time the snapshot was taken
+        update_rollups (bool): Also fold the written rows into the rollups
+        
+    Returns:
+        int: Number of aircraft whose state changed
+    """
+    df = flights_df.assign(snapshot_ts=snapshot_ts)
+    staging_table, columns = stage_dataframe(cursor, df, 'flights')
+    column_list = ', '.join(f'"{c}"' for c in columns)
+    changed_list = ', '.join(f's."{c}"' for c in columns)
+    update_list = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in columns if c != 'icao24')
+    rollup = f", rollup AS ({flight_rollup_upsert('changed')})" if update_rollups else ""
+    
+    cursor.execute(f"""
+        WITH snapshot AS (
+            SELECT DISTINCT ON (icao24) {column_list}
+            FROM {staging_table}
+            ORDER BY icao24, last_contact DESC NULLS LAST
+        ),
+        changed AS (
+            SELECT {changed_list}
+            FROM snapshot s
+            LEFT JOIN flights_latest l ON l.icao24 = s.icao24
+            WHERE l.icao24 IS NULL OR l.last_contact IS NULL OR s.last_contact > l.last_contact
+        ),
+        history AS (
+            INSERT INTO flights ({column_list})
+            SELECT {column_list} FROM changed
+        ){rollup}
+        INSERT INTO flights_latest ({column_list})
+        SELECT {column_list} FROM changed
+        ON CONFLICT (icao24) DO UPDATE SET {update_list}
+        WHERE flights_latest.last_contact IS NULL
+           OR flights_latest.last_contact < EXCLUDED.last_contact
+    """)
+    return cursor.rowcount
+
+
+def load_to_database(airports_df, flights_df, method='copy', mode='replace', snapshot_ts=None):
     """
     Load cleaned data into PostgreSQL database
     
+    The default 'copy' method streams each DataFrame through COPY into a
+    staging table and merges it into the tables created by
+    database_setup.sql, so SERIAL ids, column types and indexes are kept.
+    Both tables are written in a single transaction.
+    
+    In 'append' mode the flights table becomes a history: each snapshot is
+    appended with a snapshot_ts, flights_latest keeps the newest state per
+    icao24, and aircraft whose last_contact did not move forward are skipped.
+    
+    With the partitioned schema (database_setup_partitioned.sql) the
+    partition for snapshot_ts, and a few after it, are created if missing.
+    
     Args:
         airports_df (pandas.DataFrame): Cleaned airport data
         flights_df (pandas.DataFrame): Cleaned flight data
+        method (str): 'copy' for the bulk loader, 'to_sql' for the old
+            pandas path that recreates the tables from the DataFrames
+        mode (str): 'replace' to overwrite flights, 'append' to keep history
+            (requires method='copy')
+        snapshot_ts (datetime): Time the flights were observed, defaults to now
     """
     print("💾 Loading data to PostgreSQL database...")
     
-    # Create connection string using the function above
-    connection_string = get_connection_string()
+    if mode == 'append' and method != 'copy':
+        print("❌ Append mode needs the 'copy' load method")
+        return
+    
+    # Frames kept in the compact schema go back to plain strings for the database
+    flights_df = expand_flights(flights_df)
+    snapshot_ts = snapshot_ts or datetime.now(timezone.utc)
     
     try:
-        # Create SQLAlchemy engine
-        engine = create_engine(connection_string)
-        
+        engine = get_engine()
     except Exception as e:
         print(f"Error in load_data : error {e}\n")
-        print(f"Could not create engine with connection string \n ::  {connection_string}")
+        print(f"Could not create engine with connection string \n ::  {get_connection_string()}")
+        return
     
     try :
-        # Load airports data
-        # Use pandas to_sql method to insert data
-        airports_df.to_sql('airports', engine, if_exists='replace', index=False)
-
-        # Parameters explanation:
-        # - 'airports': table name in database
-        # - engine: database connection
-        # - if_exists='replace': replace table if it exists (use 'append' to add to existing data)
-        # - index=False: don't include pandas row index as a column
-        
-        # Load flights data (only if not empty)
-        # Check if flights_df is not empty before loading
-        # Hint: if not flights_df.empty:
-        flights_df.to_sql('flights', engine, if_exists='replace', index=False)
+        if method == 'copy':
+            connection = engine.raw_connection()
+            try:
+                with connection.cursor(cursor_factory=CountingCursor) as cursor:
+                    rollups = has_rollups(cursor)
+                    if not airports_df.empty:
+                        replace_table_contents(cursor, airports_df, 'airports')
+                        if rollups:
+                            refresh_airport_rollup(cursor)
+                    if not flights_df.empty and is_partitioned(cursor, 'flights'):
+                        for name in ensure_partitions(cursor, 'flights', snapshot_ts):
+                            print(f"🗂️  Created partition {name}")
+                    if not flights_df.empty and mode == 'append':
+                        changed = append_flights_snapshot(cursor, flights_df, snapshot_ts,
+                                                          update_rollups=rollups)
+                        print(f"📝 {changed} of {len(flights_df)} aircraft changed since last snapshot")
+                    elif not flights_df.empty:
+                        staging_table, _ = replace_table_contents(
+                            cursor, flights_df.assign(snapshot_ts=snapshot_ts), 'flights'
+                        )
+                        if rollups:
+                            rebuild_flight_rollup(cursor, staging_table)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                # The schema may have changed under us: re-read it next time
+                forget_partitions()
+                forget_rollups()
+                raise
+            finally:
+                connection.close()
+        else:
+            # Parameters explanation:
+            # - if_exists='replace': replace table if it exists (use 'append' to add to existing data)
+            # - index=False: don't include pandas row index as a column
+            airports_df.to_sql('airports', engine, if_exists='replace', index=False)
+            if not flights_df.empty:
+                flights_df.to_sql('flights', engine, if_exists='replace', index=False)
         
         # Print loading statistics
-        if not flights_df.empty :
+        if not airports_df.empty :
             print(f"yihouuu : Loaded {len(airports_df)} airports to database")
         else:
             print("No airport data to load in sql, panda dataframe was empty")
@@ -82,39 +378,366 @@ def load_to_database(airports_df, flights_df):
         print("   - Username and password are correct")
         print("   - Tables are created (run database_setup.sql)")
 
+def load_flight_batch(snapshots, mode='append'):
+    """
+    Load several flight snapshots in a single transaction
+    
+    Unlike load_to_database, errors are raised so the caller (e.g. the spool
+    drainer) can keep the snapshots and retry. In append mode a snapshot
+    loaded twice is harmless: aircraft whose last_contact did not move
+    forward are skipped.
+    
+    Args:
+        snapshots (list): (snapshot_ts, cleaned flights DataFrame) pairs in
+            time order
+        mode (str): 'append' to add every snapshot to the history,
+            'replace' to only keep the last one
+        
+    Returns:
+        int: Number of flight rows sent to the database
+    """
+    if mode == 'replace':
+        snapshots = snapshots[-1:]
+    
+    connection = get_engine().raw_connection()
+    rows = 0
+    try:
+        with connection.cursor(cursor_factory=CountingCursor) as cursor:
+            rollups = has_rollups(cursor)
+            partitioned = is_partitioned(cursor, 'flights')
+            for snapshot_ts, flights_df in snapshots:
+                flights_df = expand_flights(flights_df)
+                if flights_df.empty:
+                    continue
+                if partitioned:
+                    for name in ensure_partitions(cursor, 'flights', snapshot_ts):
+                        print(f"🗂️  Created partition {name}")
+                if mode == 'append':
+                    append_flights_snapshot(cursor, flights_df, snapshot_ts, update_rollups=rollups)
+                else:
+                    staging_table, _ = replace_table_contents(
+                        cursor, flights_df.assign(snapshot_ts=snapshot_ts), 'flights'
+                    )
+                    if rollups:
+                        rebuild_flight_rollup(cursor, staging_table)
+                # The next snapshot of the batch stages into the same table name
+                cursor.execute("DROP TABLE staging_flights")
+                rows += len(flights_df)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        forget_partitions()
+        forget_rollups()
+        raise
+    finally:
+        connection.close()
+    return rows
+
+def load_flight_history(flights_df, update_latest=True):
+    """
+    Bulk-append historical flight rows, each with its own snapshot_ts
+    
+    Meant for backfills: rows go straight into the flights history (with
+    the rollups updated) in one transaction, without the per-snapshot
+    last_contact check of append mode, so chunks can be loaded in any order
+    and from several connections at once. flights_latest only moves forward.
+    
+    With the partitioned schema, call ensure_flight_partitions() for the
+    chunk's time range first: creating partitions here would make parallel
+    loads race on the catalog and hold the parent table lock while loading.
+    
+    Args:
+        flights_df (pandas.DataFrame): Cleaned flights with a snapshot_ts column
+        update_latest (bool): Also fold the newest state of each aircraft
+            into flights_latest
+        
+    Returns:
+        int: Number of flight rows written
+    """
+    flights_df = expand_flights(flights_df)
+    if flights_df.empty:
+        return 0
+    
+    connection = get_engine().raw_connection()
+    try:
+        with connection.cursor(cursor_factory=CountingCursor) as cursor:
+            staging_table, columns = stage_dataframe(cursor, flights_df, 'flights')
+            column_list = ', '.join(f'"{c}"' for c in columns)
+            cursor.execute(f"INSERT INTO flights ({column_list}) SELECT {column_list} FROM {staging_table}")
+            if has_rollups(cursor):
+                cursor.execute(flight_rollup_upsert(staging_table))
+            if update_latest:
+                # Sorted by icao24 so concurrent loads lock rows in the same order
+                update_list = ', '.join(f'"{c}" = EXCLUDED."{c}"' for c in columns if c != 'icao24')
+                cursor.execute(f"""
+                    INSERT INTO flights_latest ({column_list})
+                    SELECT * FROM (
+                        SELECT DISTINCT ON (icao24) {column_list}
+                        FROM {staging_table}
+                        ORDER BY icao24, last_contact DESC NULLS LAST
+                    ) newest
+                    ORDER BY icao24
+                    ON CONFLICT (icao24) DO UPDATE SET {update_list}
+                    WHERE flights_latest.last_contact IS NULL
+                       OR flights_latest.last_contact < EXCLUDED.last_contact
+                """)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        forget_rollups()
+        raise
+    finally:
+        connection.close()
+    return len(flights_df)
+
+def ensure_flight_partitions(start, end):
+    """
+    Create the flights partitions covering [start, end] in a short transaction of their own
+    
+    Does nothing with the plain schema. Meant to run from a single thread
+    before the rows of that time range are loaded in parallel.
+    
+    Args:
+        start (datetime): Earliest snapshot_ts about to be loaded
+        end (datetime): Latest snapshot_ts about to be loaded
+    """
+    connection = get_engine().raw_connection()
+    try:
+        with connection.cursor(cursor_factory=CountingCursor) as cursor:
+            if not is_partitioned(cursor, 'flights'):
+                return
+            ts = start
+            while True:
+                for name in ensure_partitions(cursor, 'flights', ts, ahead=0):
+                    print(f"🗂️  Created partition {name}")
+                if ts >= end:
+                    break
+                ts = min(ts + INTERVALS[PARTITION_INTERVAL], end)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        forget_partitions()
+        raise
+    finally:
+        connection.close()
+
+def append_rows(df, table_name):
+    """
+    Append a DataFrame to a table with COPY, in its own transaction
+    
+    Args:
+        df (pandas.DataFrame): Rows to write; columns missing from the table
+            are left out
+        table_name (str): Existing table
+    """
+    engine = get_engine()
+    connection = engine.raw_connection()
+    try:
+        with connection.cursor(cursor_factory=CountingCursor) as cursor:
+            table_columns = get_table_columns(cursor, table_name)
+            if not table_columns:
+                raise ValueError(f"Table '{table_name}' does not exist (run database_setup.sql)")
+            copy_dataframe(cursor, prepare_for_copy(df, table_columns), table_name)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+def load_tracks(tracks_df):
+    """
+    Append encoded track segments to the flight_tracks table
+    
+    Errors are raised so the caller can hand the segments back to the
+    TrackBuilder (requeue) instead of losing them.
+    
+    Args:
+        tracks_df (pandas.DataFrame): Output of TrackBuilder.pop_closed()
+        
+    Returns:
+        int: Number of segments written
+    """
+    if tracks_df.empty:
+        return 0
+    
+    # COPY reads bytea in hex form
+    append_rows(tracks_df.assign(track=['\\x' + bytes(blob).hex() for blob in tracks_df['track']]),
+                'flight_tracks')
+    
+    print(f"🛤️  Saved {len(tracks_df)} track segment(s)")
+    return len(tracks_df)
+
+def load_airport_events(events_df, snapshot_ts=None):
+    """
+    Append arrival/departure events to the airport_events table
+    
+    Args:
+        events_df (pandas.DataFrame): Output of GeofenceEngine.update()
+        snapshot_ts (datetime): Snapshot the events were detected in,
+            defaults to now
+        
+    Returns:
+        int: Number of events written
+    """
+    if events_df.empty:
+        return 0
+    
+    events_df = events_df.assign(snapshot_ts=snapshot_ts or datetime.now(timezone.utc))
+    try:
+        append_rows(events_df, 'airport_events')
+    except Exception as e:
+        print(f"❌ Error saving airport events: {e}")
+        return 0
+    
+    arrivals = int((events_df['event_type'] == 'arrival').sum())
+    print(f"🛬 Saved {arrivals} arrival(s) and {len(events_df) - arrivals} departure(s)")
+    return len(events_df)
+
+def load_quarantine(quarantine_df, snapshot_ts=None):
+    """
+    Append rows that failed data-quality rules to flights_quarantine
+    
+    Args:
+        quarantine_df (pandas.DataFrame): Quarantine output of validate_flights()
+        snapshot_ts (datetime): Snapshot the rows came from, defaults to now
+        
+    Returns:
+        int: Number of rows written
+    """
+    if quarantine_df.empty:
+        return 0
+    
+    quarantine_df = quarantine_df.assign(snapshot_ts=snapshot_ts or datetime.now(timezone.utc))
+    try:
+        append_rows(quarantine_df, 'flights_quarantine')
+    except Exception as e:
+        print(f"❌ Error saving quarantined flights: {e}")
+        return 0
+    
+    print(f"🚧 Quarantined {len(quarantine_df)} flight row(s)")
+    return len(quarantine_df)
+
+def read_track(icao24, start_time=None, end_time=None):
+    """
+    Read back the path of one aircraft
+    
+    Only the segments of that aircraft overlapping the time range are read
+    (through the (icao24, start_time) index), so the cost grows with the
+    length of the track, not with the size of the history.
+    
+    Args:
+        icao24 (str): Aircraft address
+        start_time (int): Optional first unix time of interest
+        end_time (int): Optional last unix time of interest
+        
+    Returns:
+        pandas.DataFrame: segment, time, latitude, longitude and altitude
+        per point, in time order
+    """
+    query = text("""
+        SELECT id, track FROM flight_tracks
+        WHERE icao24 = :icao24
+          AND (CAST(:start_time AS BIGINT) IS NULL OR end_time >= :start_time)
+          AND (CAST(:end_time AS BIGINT) IS NULL OR start_time <= :end_time)
+        ORDER BY start_time
+    """)
+    with get_engine().connect() as connection:
+        rows = connection.execute(query, {'icao24': icao24, 'start_time': start_time,
+                                          'end_time': end_time}).all()
+    
+    points = [decode_track(blob).assign(segment=segment_id) for segment_id, blob in rows]
+    if not points:
+        return pd.DataFrame(columns=['segment', 'time', 'latitude', 'longitude', 'altitude'])
+    
+    track = pd.concat(points, ignore_index=True)
+    if start_time is not None:
+        track = track[track['time'] >= start_time]
+    if end_time is not None:
+        track = track[track['time'] <= end_time]
+    return track[['segment', 'time', 'latitude', 'longitude', 'altitude']].reset_index(drop=True)
+
+def enforce_retention(retention_days):
+    """
+    Drop flight history older than a number of days
+    
+    Only the partitioned schema supports retention: expired data goes by
+    dropping whole partitions, which is instant and leaves no dead rows
+    behind, unlike a DELETE on one large table.
+    
+    Args:
+        retention_days (float): Age after which history is dropped
+        
+    Returns:
+        list: Names of the dropped partitions
+    """
+    try:
+        engine = get_engine()
+    except Exception as e:
+        print(f"Error in load_data : error {e}\n")
+        return []
+    
+    cutoff = datetime.now(timezone.utc) - timedelta(days=retention_days)
+    try:
+        connection = engine.raw_connection()
+        try:
+            with connection.cursor(cursor_factory=CountingCursor) as cursor:
+                if not is_partitioned(cursor, 'flights'):
+                    print("⚠️  Retention needs the partitioned schema (database_setup_partitioned.sql)")
+                    return []
+                dropped = drop_partitions_before(cursor, 'flights', cutoff)
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.close()
+    except Exception as e:
+        print(f"❌ Error applying retention: {e}")
+        return []
+    
+    for name in dropped:
+        print(f"🗑️  Dropped expired partition {name}")
+    return dropped
+
+# Counts and samples for verify_data, fetched in a single round-trip
+VERIFY_QUERY = """
+SELECT
+    (SELECT COUNT(*) FROM airports) AS airports_count,
+    (SELECT COUNT(*) FROM flights) AS flights_count,
+    (SELECT json_agg(a) FROM (SELECT name, city, country FROM airports LIMIT 3) a) AS sample_airports,
+    (SELECT json_agg(f) FROM (SELECT callsign, origin_country, altitude FROM flights LIMIT 3) f) AS sample_flights
+"""
+
 def verify_data():
     """
     Verify that data was loaded correctly by running some basic queries
     """
     print("🔍 Verifying data was loaded correctly...")
     
-    connection_string = get_connection_string()
-    
     try:
-        # Create SQLAlchemy engine
-        engine = create_engine(connection_string)
+        engine = get_engine()
     except Exception as e:
         print(f"Error in load_data : error {e}\n")
-        print(f"Could not create engine with connection string \n ::  {connection_string}")
+        print(f"Could not create engine with connection string \n ::  {get_connection_string()}")
+        return
     
     try :
-        # Count airports in database
-        airports_count = pd.read_sql("SELECT COUNT(*) as count FROM airports", engine)
-        print(f"📊 Airports in database: {airports_count.iloc[0]['count']}")
+        with engine.connect() as connection:
+            result = connection.execute(text(VERIFY_QUERY)).mappings().one()
         
-        # Count flights in database  
-        flights_count = pd.read_sql("SELECT COUNT(*) as count FROM flights", engine)
-        print(f"📊 Flights in database: {flights_count.iloc[0]['count']}")
+        # Count airports and flights in database
+        print(f"📊 Airports in database: {result['airports_count']}")
+        print(f"📊 Flights in database: {result['flights_count']}")
         
         # Show sample airport data
-        sample_airports = pd.read_sql("SELECT name, city, country FROM airports LIMIT 3", engine)
+        sample_airports = pd.DataFrame(result['sample_airports'] or [], columns=['name', 'city', 'country'])
         print("\n📋 Sample airports:")
         print(sample_airports.to_string(index=False))
         
         # Show sample flight data (if any exists)
-        #Check if flights table has data first
-        sample_flights = pd.read_sql("SELECT callsign, origin_country, altitude FROM flights LIMIT 3", engine)
-        if not sample_flights.empty:
+        if result['sample_flights']:
+            sample_flights = pd.DataFrame(result['sample_flights'])
             print("\n✈️  Sample flights:")
             print(sample_flights.to_string(index=False))
         
@@ -128,46 +751,74 @@ def run_sample_queries():
     """
     print("📈 Running sample analysis queries...")
     
-    connection_string = get_connection_string()
-    
     try:
-        engine = create_engine(connection_string)
+        engine = get_engine()
     except Exception as e:
         print(f"Error in load_data : error {e}\n")
-        print(f"Could not create engine with connection string \n ::  {connection_string}")
+        print(f"Could not create engine with connection string \n ::  {get_connection_string()}")
+        return
     
     try :
-        # Query 1: Airports by country
+        # Query 1: Airports by country (from the rollup kept by the loader)
         print("\n🌍 Top 5 countries by number of airports:")
         country_query = """
-        SELECT country, COUNT(*) as airport_count 
-        FROM airports 
-        WHERE country IS NOT NULL 
-        GROUP BY country 
-        ORDER BY airport_count DESC 
+        SELECT country, airport_count
+        FROM airports_by_country
+        ORDER BY airport_count DESC
         LIMIT 5
         """
         country_results = pd.read_sql(country_query, engine)
         print(country_results.to_string(index=False))
         
-        # Query 2: Flight altitude analysis (if flight data exists)
-        flight_check = pd.read_sql("SELECT COUNT(*) as count FROM flights", engine)
-        if flight_check.iloc[0]['count'] > 0:
+        # Query 2: Flight altitude analysis, combining the hourly rollups
+        altitude_query = """
+        SELECT
+            SUM(altitude_count)::BIGINT as total_flights,
+            ROUND(SUM(altitude_sum) / NULLIF(SUM(altitude_count), 0)) as avg_altitude_ft,
+            ROUND(MIN(altitude_min)) as min_altitude_ft,
+            ROUND(MAX(altitude_max)) as max_altitude_ft
+        FROM flights_rollup_hourly
+        """
+        altitude_results = pd.read_sql(altitude_query, engine)
+        if altitude_results.iloc[0]['total_flights']:
             print("\n✈️  Flight altitude statistics:")
-            altitude_query = """
-            SELECT 
-                COUNT(*) as total_flights,
-                ROUND(AVG(altitude)) as avg_altitude_ft,
-                ROUND(MIN(altitude)) as min_altitude_ft,
-                ROUND(MAX(altitude)) as max_altitude_ft
-            FROM flights 
-            WHERE altitude IS NOT NULL
-            """
-            altitude_results = pd.read_sql(altitude_query, engine)
             print(altitude_results.to_string(index=False))
+            
+            # Query 3: Busiest origin countries over the last 24 hours
+            print("\n🕐 Top 5 origin countries in the last 24 hours:")
+            recent_query = """
+            SELECT
+                origin_country,
+                SUM(flights)::BIGINT as flights,
+                ROUND(SUM(velocity_sum) / NULLIF(SUM(velocity_count), 0), 1) as avg_velocity
+            FROM flights_rollup_hourly
+            WHERE bucket >= date_trunc('hour', now()) - interval '24 hours'
+            GROUP BY origin_country
+            ORDER BY flights DESC
+            LIMIT 5
+            """
+            print(pd.read_sql(recent_query, engine).to_string(index=False))
+        
+        # Query 4: Busiest airports over the last hour, from the geofence events
+        events_query = """
+        SELECT
+            airport_iata,
+            COUNT(*) FILTER (WHERE event_type = 'arrival') as arrivals,
+            COUNT(*) FILTER (WHERE event_type = 'departure') as departures
+        FROM airport_events
+        WHERE snapshot_ts >= now() - interval '1 hour'
+        GROUP BY airport_iata
+        ORDER BY COUNT(*) DESC
+        LIMIT 5
+        """
+        events_results = pd.read_sql(events_query, engine)
+        if not events_results.empty:
+            print("\n🛬 Busiest airports in the last hour:")
+            print(events_results.to_string(index=False))
         
     except Exception as e:
         print(f"❌ Error running sample queries: {e}")
+        print("💡 The rollup tables are created by database_setup.sql")
 
 def test_database_connection():
     """
@@ -176,14 +827,13 @@ def test_database_connection():
     """
     print("🔌 Testing database connection...")
     
-    connection_string = get_connection_string()
-    
     try:
-        engine = create_engine(connection_string)
+        engine = get_engine()
         print("engine created")
     except Exception as e:
         print(f"Error in load_data (1) : error {e}\n")
-        print(f"Could not create engine with connection string \n ::  {connection_string}")
+        print(f"Could not create engine with connection string \n ::  {get_connection_string()}")
+        return False
     
     try :
         # Try a simple query
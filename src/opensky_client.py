@@ -0,0 +1,249 @@
+"""
+OpenSky API Client
+
+This module wraps the OpenSky Network REST API in a reusable client:
+- One keep-alive requests.Session (connection pool) for every call
+- Retries with exponential backoff and jitter on network errors and 5xx
+- Waits out 429 responses using X-Rate-Limit-Retry-After-Seconds
+- An optional request budget so polling never overspends API credits
+"""
+
+import random
+import threading
+import time
+from collections import deque
+
+import requests
+
+OPENSKY_API_URL = "https://opensky-network.org/api"
+
+# Status codes worth retrying: the server or something in front of it is struggling
+RETRY_STATUS_CODES = {500, 502, 503, 504}
+
+
+class OpenSkyError(Exception):
+    """Raised when the API could not return a usable response"""
+
+
+class RateLimitError(OpenSkyError):
+    """Raised when the API asks us to wait longer than we are willing to"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class RequestBudgetExceeded(OpenSkyError):
+    """Raised when a call would go over the configured request budget"""
+
+
+class OpenSkyClient:
+    """
+    Reusable OpenSky Network client
+
+    Safe to share between threads: the session's connection pool is sized
+    with pool_maxsize and the counters are protected by a lock.
+    """
+
+    def __init__(self, base_url=OPENSKY_API_URL, timeout=10, max_retries=4,
+                 backoff_base=0.5, backoff_max=30.0, max_rate_limit_wait=60.0,
+                 request_budget=None, budget_window=3600.0, pool_maxsize=10, auth=None):
+        """
+        Create a client
+
+        Args:
+            base_url (str): API root, point it at a local server for tests
+            timeout (float): Default timeout in seconds for one HTTP request
+            max_retries (int): Retries after the first attempt
+            backoff_base (float): First backoff delay in seconds, doubled per retry
+            backoff_max (float): Cap on a single backoff delay in seconds
+            max_rate_limit_wait (float): Longest 429 wait we sleep through,
+                longer ones raise RateLimitError
+            request_budget (int): Maximum HTTP requests per budget_window,
+                None for no limit
+            budget_window (float): Length of the budget window in seconds
+            pool_maxsize (int): Connections kept alive for concurrent callers
+            auth (tuple): Optional (username, password) for the API
+        """
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.request_budget = request_budget
+        self.budget_window = budget_window
+
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if auth:
+            self.session.auth = auth
+
+        self._lock = threading.Lock()
+        self._request_times = deque()
+        self.stats = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'bytes': 0}
+        self.rate_limit_remaining = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the pooled connections"""
+        self.session.close()
+
+    def get_states(self, bbox=None, timeout=None):
+        """
+        Fetch current state vectors
+
+        Args:
+            bbox (dict): Optional area with lamin/lomin/lamax/lomax keys
+            timeout (float): Override of the per-request timeout
+
+        Returns:
+            dict: Decoded JSON payload with 'time' and 'states'
+        """
+        return self.get('/states/all', params=bbox, timeout=timeout)
+
+    def get(self, path, params=None, timeout=None):
+        """
+        GET an API path with retries, backoff and rate-limit handling
+
+        Args:
+            path (str): Path below base_url, e.g. '/states/all'
+            params (dict): Query parameters
+            timeout (float): Override of the per-request timeout
+
+        Returns:
+            dict: Decoded JSON payload
+        """
+        url = self.base_url + path
+        attempt = 0
+
+        while True:
+            self._spend_budget()
+            try:
+                response = self.session.get(url, params=params, timeout=timeout or self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self._wait_before_retry(attempt, f"network error: {e}")
+                attempt += 1
+                continue
+
+            self._record_response(response)
+
+            if response.status_code == 200:
+                return response.json()
+
+            if response.status_code == 429:
+                with self._lock:
+                    self.stats['rate_limited'] += 1
+                retry_after = self._retry_after(response)
+                if retry_after > self.max_rate_limit_wait or attempt >= self.max_retries:
+                    raise RateLimitError(f"Rate limited by OpenSky, retry in {retry_after:.0f}s",
+                                         retry_after)
+                self._sleep(retry_after)
+                attempt += 1
+                continue
+
+            if response.status_code in RETRY_STATUS_CODES:
+                self._wait_before_retry(attempt, f"status code {response.status_code}")
+                attempt += 1
+                continue
+
+            raise OpenSkyError(f"OpenSky returned status code {response.status_code}")
+
+    def _spend_budget(self):
+        """Count one request against the budget, refusing when it is used up"""
+        with self._lock:
+            now = time.monotonic()
+            while self._request_times and now - self._request_times[0] > self.budget_window:
+                self._request_times.popleft()
+            if self.request_budget is not None and len(self._request_times) >= self.request_budget:
+                raise RequestBudgetExceeded(
+                    f"Request budget of {self.request_budget} per {self.budget_window:.0f}s used up"
+                )
+            self._request_times.append(now)
+            self.stats['requests'] += 1
+
+    def _record_response(self, response):
+        """Keep track of bytes received and the remaining API credits"""
+        with self._lock:
+            self.stats['bytes'] += len(response.content)
+            remaining = response.headers.get('X-Rate-Limit-Remaining')
+            if remaining is not None and remaining.isdigit():
+                self.rate_limit_remaining = int(remaining)
+
+    def _retry_after(self, response):
+        """Seconds the server asked us to wait, falling back to our own backoff"""
+        for header in ('X-Rate-Limit-Retry-After-Seconds', 'Retry-After'):
+            value = response.headers.get(header)
+            if value is not None:
+                try:
+                    return max(float(value), 0.0)
+                except ValueError:
+                    pass
+        return self.backoff_base
+
+    def _wait_before_retry(self, attempt, reason):
+        """Back off before the next attempt, or give up after max_retries"""
+        if attempt >= self.max_retries:
+            raise OpenSkyError(f"Giving up after {attempt + 1} attempts ({reason})")
+        # Full jitter: spread retries from many clients over the whole window
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        self._sleep(delay)
+
+    def _sleep(self, delay):
+        with self._lock:
+            self.stats['retries'] += 1
+        time.sleep(delay)
+
+
+if __name__ == "__main__":
+    """Test the client against a local stand-in for the OpenSky API"""
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    print("Testing OpenSky client against a local server...\n")
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        calls = 0
+
+        def do_GET(self):
+            StandInHandler.calls += 1
+            if StandInHandler.calls == 1:
+                self.send_response(429)
+                self.send_header('X-Rate-Limit-Retry-After-Seconds', '0.2')
+                self.end_headers()
+                return
+            if StandInHandler.calls == 2:
+                self.send_response(503)
+                self.end_headers()
+                return
+            body = json.dumps({'time': 0, 'states': [['abc123', 'TEST1   ', 'France']]}).encode()
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StandInHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with OpenSkyClient(base_url=f"http://127.0.0.1:{server.server_address[1]}",
+                       backoff_base=0.05, request_budget=3) as client:
+        payload = client.get_states()
+        print(f"Got {len(payload['states'])} state(s) after {client.stats['retries']} retries")
+        print(f"Client stats: {client.stats}")
+
+        try:
+            client.get_states()
+        except RequestBudgetExceeded as e:
+            print(f"Budget enforced: {e}")
+
+    server.shutdown()
@@ -0,0 +1,292 @@
+"""
+Parallel Transform Module
+
+This module spreads the flight transform of large batches (world-wide
+snapshots, replays, backfills) over several processes:
+- The coordinates of the batch and the airport spatial index are placed in
+  shared memory, so workers read them without any pickling
+- Each worker runs the coordinate rules and the nearest-airport lookup on a
+  row chunk and writes its results into shared output arrays at the chunk's
+  offset, so the original row order is kept
+- The parent applies the results: it drops rejected rows, finishes the
+  cleaning with the same code as clean_flights and attaches the airport
+  columns
+- Small inputs are transformed in-process with clean_flights and
+  combine_data, which the parallel path matches row for row
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+from src.transform_data import FLIGHT_COLUMNS, clean_flights, combine_data, coordinate_rules, finish_flights
+from src.spatial_index import AirportIndex, airport_match_columns, get_airport_index, locate_airports
+from src.compact_schema import compact_flights
+
+# Below this many rows, starting the work in other processes costs more
+# than it saves
+MIN_PARALLEL_ROWS = 50_000
+
+# Chunks per worker, so one slow chunk does not hold up the whole batch
+CHUNKS_PER_WORKER = 4
+
+# Arrays are placed in shared memory at multiples of this many bytes
+_ALIGNMENT = 64
+
+# Shared airport index of a worker process, attached once by _init_worker
+_worker_state = {}
+
+
+def _share_arrays(arrays):
+    """
+    Copy arrays into one new shared memory block
+
+    Args:
+        arrays (dict): Name -> numpy.ndarray
+
+    Returns:
+        tuple: (SharedMemory, layout) where layout lists
+        (name, dtype, shape, offset) for _view_arrays()
+    """
+    layout = []
+    size = 0
+    for name, array in arrays.items():
+        layout.append((name, array.dtype.str, array.shape, size))
+        size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+    block = shared_memory.SharedMemory(create=True, size=max(size, 1))
+    for (name, _, _, _), view in zip(layout, _view_arrays(block.buf, layout).values()):
+        view[...] = arrays[name]
+    return block, layout
+
+
+def _view_arrays(buffer, layout):
+    """Arrays backed by a shared memory buffer, following a _share_arrays() layout"""
+    return {
+        name: np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer, offset=offset)
+        for name, dtype, shape, offset in layout
+    }
+
+
+def _init_worker(index_block_name, index_layout):
+    """Attach the shared airport index once per worker process"""
+    block = shared_memory.SharedMemory(name=index_block_name)
+    _worker_state['block'] = block
+    _worker_state['index'] = AirportIndex.from_arrays(_view_arrays(block.buf, index_layout))
+
+
+def _transform_chunk(batch_block_name, batch_layout, start, stop, max_radius_km):
+    """
+    Run the numeric part of the transform on rows [start, stop) of a batch
+
+    Writes, for every row, the 1-based number of the first coordinate rule
+    it fails (0 if none) and the nearest airport of the rows kept.
+    """
+    block = shared_memory.SharedMemory(name=batch_block_name)
+    try:
+        _transform_views(_view_arrays(block.buf, batch_layout), start, stop, max_radius_km)
+    finally:
+        block.close()
+
+
+def _transform_views(batch, start, stop, max_radius_km):
+    """Body of _transform_chunk, so no view outlives the shared block"""
+    chunk = pd.DataFrame({'latitude': batch['latitude'][start:stop],
+                          'longitude': batch['longitude'][start:stop]})
+
+    rule = np.zeros(stop - start, dtype=np.int8)
+    for number, (_, failing) in enumerate(coordinate_rules(chunk), start=1):
+        rule[(rule == 0) & failing] = number
+    batch['rule'][start:stop] = rule
+
+    kept = rule == 0
+    positions = np.full(stop - start, -1, dtype=np.int64)
+    distances = np.full(stop - start, np.nan)
+    bearings = np.full(stop - start, np.nan)
+    if kept.any():
+        positions[kept], distances[kept], bearings[kept] = locate_airports(
+            _worker_state['index'],
+            chunk['latitude'].to_numpy()[kept], chunk['longitude'].to_numpy()[kept],
+            max_radius_km=max_radius_km
+        )
+    batch['position'][start:stop] = positions
+    batch['distance'][start:stop] = distances
+    batch['bearing'][start:stop] = bearings
+
+
+class ParallelTransformer:
+    """
+    Cleans flights and matches them with airports on several cores
+
+    The worker processes and the shared copy of the airport index are kept
+    for the life of the object, so they are set up once per run. Use it as a
+    context manager, or call close(), to stop the workers.
+    """
+
+    def __init__(self, airports_df, workers=None, min_rows=MIN_PARALLEL_ROWS):
+        """
+        Prepare a transformer for one set of airports
+
+        Args:
+            airports_df (pandas.DataFrame): Cleaned airports
+            workers (int): Worker processes, defaults to the number of CPUs
+            min_rows (int): Batches smaller than this run in-process
+        """
+        self.airports_df = airports_df
+        self.workers = workers or os.cpu_count() or 1
+        self.min_rows = min_rows
+        self._pool = None
+        self._index_block = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Stop the workers and release the shared index"""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        if self._index_block is not None:
+            self._index_block.close()
+            self._index_block.unlink()
+            self._index_block = None
+
+    def _get_pool(self):
+        """Start the workers on first use"""
+        if self._pool is None:
+            index = get_airport_index(self.airports_df)
+            self._index_block, index_layout = _share_arrays(index.to_arrays())
+            # Not fork: the daemon calls this from a thread of a threaded process
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            self._pool = ProcessPoolExecutor(
+                self.workers, mp_context=multiprocessing.get_context(method),
+                initializer=_init_worker, initargs=(self._index_block.name, index_layout)
+            )
+        return self._pool
+
+    def transform(self, flights_df, compact=False, max_radius_km=None):
+        """
+        Clean raw flights and attach their nearest airport
+
+        Same result as combine_data(airports, clean_flights(flights))[1].
+
+        Args:
+            flights_df (pandas.DataFrame): Raw flight data from API
+            compact (bool): Return the compact schema
+            max_radius_km (float): Optional nearest-airport search radius
+
+        Returns:
+            pandas.DataFrame: Flights ready for loading
+        """
+        if (self.workers <= 1 or len(flights_df) < self.min_rows or self.airports_df.empty
+                or flights_df.empty):
+            _, final_flights = combine_data(self.airports_df, clean_flights(flights_df),
+                                            max_radius_km=max_radius_km, compact=compact)
+            return final_flights
+
+        print(f"🧹 Cleaning flight data on {self.workers} processes...")
+        print(f"Starting with {len(flights_df)} flights")
+        df = flights_df.set_axis(FLIGHT_COLUMNS, axis=1)
+        results = self._run_chunks(df, max_radius_km)
+
+        # Same attribution as apply_rules: each row counts against its first failing rule
+        rule_names = [name for name, _ in coordinate_rules(df.iloc[:0])]
+        counts = np.bincount(results['rule'], minlength=len(rule_names) + 1)[1:]
+        rejections = dict(zip(rule_names, counts.tolist()))
+        kept = results['rule'] == 0
+        if not kept.all():
+            df = df[kept]
+        df = finish_flights(df, rejections)
+
+        print("🔗 Preparing data for loading...")
+        nearest = airport_match_columns(self.airports_df, results['position'][kept],
+                                        results['distance'][kept], results['bearing'][kept])
+        df = df.assign(**{column: nearest[column].to_numpy() for column in nearest.columns})
+        matched = nearest['nearest_airport_distance_km'].notna().sum()
+        print(f"Matched {matched} of {len(df)} flights with an airport")
+        print(f"Final flight records: {len(df)}")
+        if compact:
+            df = compact_flights(df)
+        return df
+
+    def _run_chunks(self, df, max_radius_km):
+        """Share the coordinates of a batch, process its chunks and collect the results"""
+        n = len(df)
+        block, layout = _share_arrays({
+            'latitude': df['latitude'].to_numpy(dtype=np.float64, na_value=np.nan),
+            'longitude': df['longitude'].to_numpy(dtype=np.float64, na_value=np.nan),
+            'position': np.empty(n, dtype=np.int64),
+            'distance': np.empty(n),
+            'bearing': np.empty(n),
+            'rule': np.empty(n, dtype=np.int8),
+        })
+        try:
+            bounds = np.linspace(0, n, self.workers * CHUNKS_PER_WORKER + 1).astype(np.int64)
+            futures = [
+                self._get_pool().submit(_transform_chunk, block.name, layout, int(start), int(stop),
+                                        max_radius_km)
+                for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start
+            ]
+            for future in futures:
+                future.result()
+            return {name: view.copy() for name, view in _view_arrays(block.buf, layout).items()
+                    if name in ('position', 'distance', 'bearing', 'rule')}
+        finally:
+            block.close()
+            block.unlink()
+
+
+if __name__ == "__main__":
+    """Check the parallel path against the in-process transform and time both"""
+    import contextlib
+    import io
+    import time
+
+    print("Testing parallel transform...\n")
+
+    rng = np.random.default_rng(0)
+    airports = pd.DataFrame({
+        'latitude': np.degrees(np.arcsin(rng.uniform(-1, 1, 7000))),
+        'longitude': rng.uniform(-180, 180, 7000),
+        'iata_code': [f"A{i:05d}" for i in range(7000)],
+    })
+    n = 200_000
+    raw = pd.DataFrame({
+        0: [f"{x:06x}" for x in rng.integers(0, 2 ** 24, n)],
+        1: [f"AFR{x:<5d}" for x in rng.integers(0, 10_000, n)],
+        2: 'France',
+        3: 1_700_000_000,
+        4: 1_700_000_000,
+        5: rng.uniform(-190, 190, n),
+        6: np.degrees(np.arcsin(rng.uniform(-1, 1, n))),
+        7: rng.uniform(0, 12_000, n),
+        8: rng.random(n) < 0.1,
+        9: rng.uniform(0, 250, n),
+        10: rng.uniform(0, 360, n),
+        11: rng.uniform(-10, 10, n),
+    })
+    raw.loc[::97, 6] = np.nan
+
+    workers = max(os.cpu_count() or 1, 2)
+    with ParallelTransformer(airports, workers=workers) as transformer:
+        with contextlib.redirect_stdout(io.StringIO()):
+            transformer.transform(raw.head(transformer.min_rows))   # start the workers
+            started = time.perf_counter()
+            parallel = transformer.transform(raw, compact=True)
+            parallel_seconds = time.perf_counter() - started
+
+            started = time.perf_counter()
+            _, sequential = combine_data(airports, clean_flights(raw), compact=True)
+            sequential_seconds = time.perf_counter() - started
+
+    pd.testing.assert_frame_equal(parallel, sequential)
+    print(f"Same result as the in-process transform: {parallel.attrs['rejections']}")
+    print(f"In-process: {sequential_seconds:.2f}s, {workers} processes: {parallel_seconds:.2f}s "
+          f"on {os.cpu_count()} CPU(s) for {n} rows")
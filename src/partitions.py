@@ -0,0 +1,209 @@
+"""
+Partition Management Module
+
+This module maintains the time-partitioned flights table created by
+database_setup_partitioned.sql:
+- Range partitions on snapshot_ts (hourly or daily, in UTC) are created by
+  the loader ahead of the snapshots that need them
+- Known partitions are remembered by the process, so a load whose
+  partitions already exist costs no extra round-trip
+- Retention drops whole partitions instead of DELETEing rows
+"""
+
+import re
+import threading
+from datetime import datetime, timedelta, timezone
+
+INTERVALS = {
+    'hour': timedelta(hours=1),
+    'day': timedelta(days=1),
+}
+
+# Partition granularity and how many partitions to keep ready ahead of time
+PARTITION_INTERVAL = 'day'
+PARTITIONS_AHEAD = 2
+
+_BOUND_PATTERN = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# table -> whether it is partitioned, and the (lower, upper) bounds of the
+# partitions known to exist
+_partitioned = {}
+_known_partitions = {}
+_lock = threading.Lock()
+
+
+def partition_start(ts, interval=PARTITION_INTERVAL):
+    """
+    First instant of the partition holding a timestamp
+
+    Args:
+        ts (datetime): Timezone-aware timestamp
+        interval (str): 'hour' or 'day'
+
+    Returns:
+        datetime: Start of the hour or day in UTC
+    """
+    ts = ts.astimezone(timezone.utc)
+    if interval == 'hour':
+        return ts.replace(minute=0, second=0, microsecond=0)
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def partition_name(table_name, start, interval=PARTITION_INTERVAL):
+    """Name of the partition starting at start, e.g. flights_p20240131"""
+    suffix = '%Y%m%d%H' if interval == 'hour' else '%Y%m%d'
+    return f"{table_name}_p{start.strftime(suffix)}"
+
+
+def is_partitioned(cursor, table_name):
+    """True if the table is a natively partitioned table (cached per process)"""
+    with _lock:
+        if table_name in _partitioned:
+            return _partitioned[table_name]
+
+    cursor.execute(
+        """
+        SELECT c.relkind = 'p'
+        FROM pg_class c
+        WHERE c.oid = to_regclass(%s)
+        """,
+        (table_name,)
+    )
+    row = cursor.fetchone()
+    with _lock:
+        _partitioned[table_name] = bool(row and row[0])
+        return _partitioned[table_name]
+
+
+def list_partitions(cursor, table_name):
+    """
+    Read the partitions of a table and their time ranges from the catalog
+
+    Args:
+        cursor: psycopg2 cursor
+        table_name (str): Partitioned parent table
+
+    Returns:
+        list: (partition name, lower bound, upper bound) sorted by lower
+        bound. A default partition or a MINVALUE/MAXVALUE bound is left out.
+    """
+    cursor.execute(
+        """
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(%s)
+        """,
+        (table_name,)
+    )
+    partitions = []
+    for name, bound in cursor.fetchall():
+        match = _BOUND_PATTERN.search(bound or '')
+        if match:
+            lower, upper = (datetime.fromisoformat(value) for value in match.groups())
+            partitions.append((name, lower, upper))
+    return sorted(partitions, key=lambda p: p[1])
+
+
+def _covered(bounds, start, end):
+    """True if [start, end) lies inside one of the known partitions"""
+    return any(lower <= start and end <= upper for lower, upper in bounds)
+
+
+def ensure_partitions(cursor, table_name, snapshot_ts, interval=PARTITION_INTERVAL,
+                      ahead=PARTITIONS_AHEAD):
+    """
+    Make sure partitions exist for a snapshot and the next few intervals
+
+    Creating partitions ahead of time keeps the catalog change (and its
+    lock on the parent table) out of the loads that follow.
+
+    Args:
+        cursor: psycopg2 cursor inside an open transaction
+        table_name (str): Partitioned parent table
+        snapshot_ts (datetime): Time of the snapshot about to be loaded
+        interval (str): 'hour' or 'day'
+        ahead (int): Extra partitions to create after the current one
+
+    Returns:
+        list: Names of the partitions created
+    """
+    step = INTERVALS[interval]
+    first = partition_start(snapshot_ts, interval)
+    wanted = [(first + i * step, first + (i + 1) * step) for i in range(ahead + 1)]
+
+    with _lock:
+        known = _known_partitions.get(table_name, [])
+    if all(_covered(known, start, end) for start, end in wanted):
+        return []
+
+    known = [(lower, upper) for _, lower, upper in list_partitions(cursor, table_name)]
+    created = []
+    for start, end in wanted:
+        if _covered(known, start, end):
+            continue
+        name = partition_name(table_name, start, interval)
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table_name} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            (start, end)
+        )
+        known.append((start, end))
+        created.append(name)
+
+    with _lock:
+        _known_partitions[table_name] = known
+    return created
+
+
+def drop_partitions_before(cursor, table_name, cutoff):
+    """
+    Drop every partition whose whole range is older than a cutoff
+
+    Args:
+        cursor: psycopg2 cursor inside an open transaction
+        table_name (str): Partitioned parent table
+        cutoff (datetime): Partitions ending at or before this time go
+
+    Returns:
+        list: Names of the partitions dropped
+    """
+    dropped = []
+    for name, _, upper in list_partitions(cursor, table_name):
+        if upper <= cutoff:
+            cursor.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+
+    with _lock:
+        _known_partitions.pop(table_name, None)
+    return dropped
+
+
+def forget_partitions(table_name=None):
+    """Clear the remembered partitions (e.g. after the schema was recreated)"""
+    with _lock:
+        if table_name is None:
+            _partitioned.clear()
+            _known_partitions.clear()
+        else:
+            _partitioned.pop(table_name, None)
+            _known_partitions.pop(table_name, None)
+
+
+if __name__ == "__main__":
+    """Show the partitions that would be created around now"""
+    print("Testing partition layout...\n")
+
+    now = datetime.now(timezone.utc)
+    for interval in INTERVALS:
+        first = partition_start(now, interval)
+        print(f"{interval} partitions for {now:%Y-%m-%d %H:%M} UTC:")
+        for i in range(PARTITIONS_AHEAD + 1):
+            start = first + i * INTERVALS[interval]
+            print(f"   {partition_name('flights', start, interval)}: "
+                  f"{start:%Y-%m-%d %H:%M} -> {start + INTERVALS[interval]:%Y-%m-%d %H:%M}")
+
+    hour = partition_start(now, 'hour')
+    bounds = [(partition_start(now), partition_start(now) + INTERVALS['day'])]
+    print(f"\nHour {hour:%H:00} covered by today's partition: "
+          f"{_covered(bounds, hour, hour + INTERVALS['hour'])}")
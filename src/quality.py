@@ -0,0 +1,273 @@
+"""
+Data Quality Module
+
+This module checks raw flight snapshots against declarative rules before
+they are cleaned:
+- Rules are plain dicts (check type, column, limits) evaluated with one
+  vectorized kernel per check type
+- Every rule owns one bit; a snapshot is evaluated into one bitmask per row
+  in a single columnar pass (each column is converted once)
+- Rules either 'reject' a row (it is held back from loading) or only 'flag'
+  it (it is loaded anyway)
+- Every failing row, rejected or flagged, can be written to the
+  flights_quarantine table with its reason codes
+"""
+
+import numpy as np
+import pandas as pd
+
+from src.extract_data import KEEP_COLUMNS
+
+# Rules over the raw extraction columns (meters, m/s, unix seconds).
+# Range, pattern and charset checks let missing values pass; not_null catches them.
+FLIGHT_RULES = [
+    {'name': 'icao24_missing', 'check': 'not_null', 'columns': ['icao24']},
+    {'name': 'icao24_format', 'check': 'charset', 'column': 'icao24', 'chars': '0123456789abcdefABCDEF',
+     'min_length': 6, 'max_length': 6},
+    {'name': 'coordinates_missing', 'check': 'not_null', 'columns': ['latitude', 'longitude']},
+    {'name': 'latitude_range', 'check': 'range', 'column': 'latitude', 'min': -90, 'max': 90},
+    {'name': 'longitude_range', 'check': 'range', 'column': 'longitude', 'min': -180, 'max': 180},
+    {'name': 'altitude_range', 'check': 'range', 'column': 'baro_altitude', 'min': -500, 'max': 20_000},
+    {'name': 'velocity_range', 'check': 'range', 'column': 'velocity', 'min': 0, 'max': 400},
+    {'name': 'vertical_rate_range', 'check': 'range', 'column': 'vertical_rate', 'min': -150, 'max': 150,
+     'action': 'flag'},
+    {'name': 'callsign_format', 'check': 'charset', 'column': 'callsign',
+     'chars': 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789', 'min_length': 2, 'max_length': 8,
+     'allow_empty': True, 'action': 'flag'},
+    {'name': 'last_contact_missing', 'check': 'not_null', 'columns': ['last_contact'], 'action': 'flag'},
+    {'name': 'position_stale', 'check': 'max_lag', 'column': 'time_position', 'reference': 'last_contact',
+     'max_seconds': 60, 'action': 'flag'},
+]
+
+
+class _Columns:
+    """Converts each column of a frame to NumPy once, however many rules read it"""
+
+    def __init__(self, df):
+        self.df = df
+        self._floats = {}
+        self._objects = {}
+        self._missing = {}
+
+    def floats(self, column):
+        if column not in self._floats:
+            self._floats[column] = self.df[column].to_numpy(dtype=np.float64, na_value=np.nan)
+        return self._floats[column]
+
+    def objects(self, column):
+        if column not in self._objects:
+            self._objects[column] = self.df[column].to_numpy(dtype=object)
+        return self._objects[column]
+
+    def missing(self, column):
+        if column not in self._missing:
+            if self.df[column].dtype.kind in 'biuf':
+                self._missing[column] = np.isnan(self.floats(column))
+            else:
+                self._missing[column] = pd.isna(self.objects(column))
+        return self._missing[column]
+
+
+def _check_not_null(columns, rule):
+    """Fails where any of the columns is missing"""
+    failing = np.zeros(len(columns.df), dtype=bool)
+    for column in rule['columns']:
+        failing |= columns.missing(column)
+    return failing
+
+
+def _check_range(columns, rule):
+    """Fails outside [min, max]; missing values pass"""
+    values = columns.floats(rule['column'])
+    with np.errstate(invalid='ignore'):
+        return (values < rule['min']) | (values > rule['max'])
+
+
+def _check_pattern(columns, rule):
+    """Fails where a text value does not fully match a regex; missing values pass"""
+    matches = columns.df[rule['column']].astype('string').str.fullmatch(rule['pattern'])
+    return ~matches.fillna(True).to_numpy(dtype=bool)
+
+
+def _check_charset(columns, rule):
+    """
+    Fails where a text value, without trailing spaces, is not made of the
+    allowed ASCII characters or has the wrong length; missing values pass
+
+    A table lookup over the code points of the whole column: much cheaper
+    than a regex per value for the short codes found in snapshots.
+    """
+    missing = columns.missing(rule['column'])
+    text = np.where(missing, ' ', columns.objects(rule['column'])).astype('U')
+    width = text.itemsize // 4
+    points = text.view(np.uint32).reshape(len(text), width)
+
+    allowed = np.zeros(128, dtype=bool)
+    allowed[np.frombuffer(rule['chars'].encode('ascii'), dtype=np.uint8)] = True
+
+    padding = (points == 0) | (points == ord(' '))
+    # Length up to the last character that is not trailing padding
+    lengths = np.where(padding.all(axis=1), 0, width - np.argmax(~padding[:, ::-1], axis=1))
+    in_value = np.arange(width) < lengths[:, None]
+    valid = (allowed[np.minimum(points, 127)] & (points < 128) | ~in_value).all(axis=1)
+    valid &= (lengths >= rule.get('min_length', 0)) & (lengths <= rule.get('max_length', width))
+    if rule.get('allow_empty'):
+        valid |= lengths == 0
+    return ~valid & ~missing
+
+
+def _check_max_lag(columns, rule):
+    """Fails where column lags reference by more than max_seconds; missing values pass"""
+    lag = columns.floats(rule['reference']) - columns.floats(rule['column'])
+    with np.errstate(invalid='ignore'):
+        return lag > rule['max_seconds']
+
+
+CHECKS = {
+    'not_null': _check_not_null,
+    'range': _check_range,
+    'pattern': _check_pattern,
+    'charset': _check_charset,
+    'max_lag': _check_max_lag,
+}
+
+
+def evaluate_rules(df, rules=FLIGHT_RULES):
+    """
+    Evaluate every rule into one bitmask per row
+
+    Args:
+        df (pandas.DataFrame): Rows to check
+        rules (list): Rule dicts; rule i sets bit i
+
+    Returns:
+        numpy.ndarray: uint64 masks, 0 for rows passing every rule
+    """
+    if len(rules) > 64:
+        raise ValueError("At most 64 rules fit in the bitmask")
+
+    columns = _Columns(df)
+    masks = np.zeros(len(df), dtype=np.uint64)
+    for bit, rule in enumerate(rules):
+        failing = CHECKS[rule['check']](columns, rule)
+        masks |= failing.astype(np.uint64) << np.uint64(bit)
+    return masks
+
+
+def rejecting_bits(rules=FLIGHT_RULES):
+    """Bitmask of the rules whose failures hold a row back"""
+    bits = 0
+    for bit, rule in enumerate(rules):
+        if rule.get('action', 'reject') == 'reject':
+            bits |= 1 << bit
+    return np.uint64(bits)
+
+
+def reason_codes(masks, rules=FLIGHT_RULES):
+    """
+    Names of the failed rules for each mask, as PostgreSQL array literals
+
+    Each distinct mask is formatted once, so this stays cheap however many
+    rows fail the same way.
+
+    Args:
+        masks (numpy.ndarray): Output of evaluate_rules()
+
+    Returns:
+        numpy.ndarray: Strings like '{icao24_format,altitude_range}'
+    """
+    unique, inverse = np.unique(masks, return_inverse=True)
+    formatted = np.array([
+        '{' + ','.join(rule['name'] for bit, rule in enumerate(rules) if int(mask) >> bit & 1) + '}'
+        for mask in unique
+    ], dtype=object)
+    return formatted[inverse.reshape(-1)]
+
+
+def rule_counts(masks, rules=FLIGHT_RULES):
+    """Number of rows failing each rule"""
+    return {rule['name']: int(np.count_nonzero(masks & np.uint64(1 << bit)))
+            for bit, rule in enumerate(rules)}
+
+
+def validate_flights(flights_df, rules=FLIGHT_RULES):
+    """
+    Check a raw snapshot and split off the rows that fail
+
+    Args:
+        flights_df (pandas.DataFrame): Raw flights from extraction
+        rules (list): Rule dicts, FLIGHT_RULES by default
+
+    Returns:
+        tuple: (rows to keep, quarantine DataFrame with the raw columns plus
+        reason_mask, reasons and rejected). Per-rule failure counts are in
+        quarantine.attrs['counts'].
+    """
+    if flights_df.empty:
+        return flights_df, pd.DataFrame()
+
+    df = flights_df.set_axis(KEEP_COLUMNS, axis=1)
+    masks = evaluate_rules(df, rules)
+    failing = masks != 0
+    rejected = (masks & rejecting_bits(rules)) != 0
+
+    quarantine = df[failing].assign(
+        reason_mask=masks[failing].astype(np.int64),
+        reasons=reason_codes(masks[failing], rules),
+        rejected=rejected[failing],
+    )
+    quarantine.attrs['counts'] = rule_counts(masks[failing], rules)
+
+    if rejected.any():
+        flights_df = flights_df[~rejected]
+    return flights_df, quarantine
+
+
+def report_quality(quarantine, rows_in):
+    """Print the per-rule failure counts of one validated snapshot"""
+    if quarantine.empty:
+        print(f"✅ All {rows_in} flights passed the quality rules")
+        return
+    rejected = int(quarantine['rejected'].sum())
+    print(f"🚧 {rejected} of {rows_in} flights rejected, {len(quarantine) - rejected} flagged")
+    for name, count in quarantine.attrs['counts'].items():
+        if count:
+            print(f"   {name}: {count}")
+
+
+if __name__ == "__main__":
+    """Validate a synthetic snapshot with some broken rows"""
+    import time
+
+    print("Testing data quality rules...\n")
+
+    rng = np.random.default_rng(0)
+    n = 100_000
+    raw = pd.DataFrame({
+        'icao24': [f"{x:06x}" for x in rng.integers(0, 2 ** 24, n)],
+        'callsign': [f"AFR{x:<5d}" for x in rng.integers(0, 10_000, n)],
+        'origin_country': 'France',
+        'time_position': pd.array(np.full(n, 1_700_000_000), dtype='Int64'),
+        'last_contact': pd.array(np.full(n, 1_700_000_005), dtype='Int64'),
+        'longitude': rng.uniform(-10, 20, n),
+        'latitude': rng.uniform(40, 55, n),
+        'baro_altitude': rng.uniform(0, 12_000, n).astype(np.float32),
+        'on_ground': rng.random(n) < 0.1,
+        'velocity': rng.uniform(0, 250, n).astype(np.float32),
+        'true_track': rng.uniform(0, 360, n).astype(np.float32),
+        'vertical_rate': rng.uniform(-10, 10, n).astype(np.float32),
+    })
+    raw.loc[0, 'icao24'] = 'zz1234'
+    raw.loc[1, 'latitude'] = np.nan
+    raw.loc[2, 'baro_altitude'] = 45_000
+    raw.loc[3, 'callsign'] = 'af r'
+    raw.loc[4, 'time_position'] = 1_699_999_000
+    raw.loc[5, ['velocity', 'longitude']] = [900, 250]
+
+    started = time.perf_counter()
+    kept, quarantine = validate_flights(raw)
+    elapsed = time.perf_counter() - started
+
+    report_quality(quarantine, len(raw))
+    print(quarantine[['icao24', 'reasons', 'rejected']].to_string())
+    print(f"\n{len(kept)} rows kept, {elapsed * 1000:.1f} ms for {n} rows")
@@ -0,0 +1,159 @@
+"""
+Reference Data Cache Module
+
+This module avoids re-reading and re-cleaning the airport list on every run:
+- Cleaned airports and their spatial index are written once as plain .npy
+  column files, which are memory-mapped on the next run
+- The cache is keyed by the SHA-256 of the source CSV, so editing the CSV
+  rebuilds it automatically
+- Within one process (e.g. the daemon) the loaded airports stay in memory
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from src.extract_data import extract_airports
+from src.transform_data import clean_airports
+from src.spatial_index import AirportIndex, get_airport_index, register_airport_index
+
+DEFAULT_CSV_PATH = "data/airports.csv"
+DEFAULT_CACHE_DIR = "data/cache"
+
+# Bump when the cached layout or the cleaning rules change
+CACHE_VERSION = 2
+
+# Cleaned airports already loaded by this process, by source digest
+_MEMORY_CACHE = {}
+
+
+def file_digest(path):
+    """SHA-256 of a file's content, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_cache(directory, airports_df, index):
+    """Write cleaned airports and their index as .npy files plus a manifest"""
+    manifest = {'version': CACHE_VERSION, 'rows': len(airports_df), 'columns': []}
+
+    for column in airports_df.columns:
+        values = airports_df[column]
+        if values.dtype.kind in 'biuf':
+            np.save(os.path.join(directory, f'col_{column}.npy'), values.to_numpy())
+            kind = 'numeric'
+        else:
+            # Fixed-width unicode can be memory-mapped, object arrays cannot
+            nulls = values.isna().to_numpy()
+            text = values.astype(object).where(~nulls, '').astype(str).to_numpy(dtype='U')
+            np.save(os.path.join(directory, f'col_{column}.npy'), text)
+            np.save(os.path.join(directory, f'null_{column}.npy'), nulls)
+            kind = 'text'
+        manifest['columns'].append({'name': column, 'kind': kind})
+
+    for name, array in index.to_arrays().items():
+        np.save(os.path.join(directory, f'index_{name}.npy'), array)
+
+    with open(os.path.join(directory, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+
+def _read_cache(directory):
+    """Memory-map a cache directory back into (airports_df, index)"""
+    with open(os.path.join(directory, 'manifest.json')) as f:
+        manifest = json.load(f)
+    if manifest.get('version') != CACHE_VERSION:
+        return None
+
+    def load(name):
+        return np.load(os.path.join(directory, f'{name}.npy'), mmap_mode='r')
+
+    data = {}
+    for column in manifest['columns']:
+        name = column['name']
+        if column['kind'] == 'numeric':
+            data[name] = load(f'col_{name}')
+        else:
+            text = np.asarray(load(f'col_{name}')).astype(object)
+            text[np.asarray(load(f'null_{name}'))] = None
+            data[name] = text
+    airports_df = pd.DataFrame(data, columns=[c['name'] for c in manifest['columns']], copy=False)
+
+    index_arrays = {
+        filename[len('index_'):-len('.npy')]: load(filename[:-len('.npy')])
+        for filename in os.listdir(directory) if filename.startswith('index_')
+    }
+    return airports_df, AirportIndex.from_arrays(index_arrays)
+
+
+def load_reference_airports(csv_path=DEFAULT_CSV_PATH, cache_dir=DEFAULT_CACHE_DIR):
+    """
+    Return cleaned airports, using the on-disk cache when the CSV is unchanged
+
+    Args:
+        csv_path (str): Source airports CSV
+        cache_dir (str): Directory holding one sub-directory per CSV digest
+
+    Returns:
+        pandas.DataFrame: Cleaned airport data (its spatial index is
+        registered so combine_data does not rebuild it)
+    """
+    digest = file_digest(csv_path)
+    if digest in _MEMORY_CACHE:
+        return _MEMORY_CACHE[digest]
+
+    directory = os.path.join(cache_dir, f'airports-{digest[:16]}')
+    cached = None
+    if os.path.exists(os.path.join(directory, 'manifest.json')):
+        try:
+            cached = _read_cache(directory)
+        except Exception as e:
+            print(f"⚠️  Airport cache unreadable, rebuilding it: {e}")
+
+    if cached is not None:
+        airports_df, index = cached
+        print(f"📦 Loaded {len(airports_df)} cleaned airports from cache")
+    else:
+        airports_df = clean_airports(extract_airports(csv_path))
+        if airports_df.empty:
+            return airports_df
+        index = get_airport_index(airports_df)
+
+        # Write next to the final location, then swap it in atomically
+        os.makedirs(cache_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=cache_dir)
+        try:
+            _write_cache(staging, airports_df, index)
+            shutil.rmtree(directory, ignore_errors=True)
+            os.replace(staging, directory)
+            print(f"📦 Cached cleaned airports in {directory}")
+        except OSError as e:
+            shutil.rmtree(staging, ignore_errors=True)
+            print(f"⚠️  Could not write airport cache: {e}")
+
+    register_airport_index(airports_df, index)
+    _MEMORY_CACHE.clear()
+    _MEMORY_CACHE[digest] = airports_df
+    return airports_df
+
+
+if __name__ == "__main__":
+    """Time a cold and a warm load of the airport reference data"""
+    import time
+
+    print("Testing airport reference cache...\n")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for label in ('cold', 'warm'):
+            _MEMORY_CACHE.clear()
+            started = time.perf_counter()
+            airports = load_reference_airports(cache_dir=cache_dir)
+            print(f"{label} load: {len(airports)} airports in {time.perf_counter() - started:.4f}s\n")
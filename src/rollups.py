@@ -0,0 +1,127 @@
+"""
+Rollups Module
+
+This module maintains small summary tables so reporting queries never scan
+the flights history:
+- flights_rollup_hourly: per hour and origin country, the number of flight
+  rows plus count/sum/min/max of altitude and velocity (so averages can be
+  combined over any range of buckets)
+- airports_by_country: number of airports per country
+
+The loader updates them in the same transaction as the rows they summarize.
+Rollups are kept when retention drops old flight partitions.
+"""
+
+import threading
+
+FLIGHT_ROLLUP_TABLE = 'flights_rollup_hourly'
+AIRPORT_ROLLUP_TABLE = 'airports_by_country'
+
+# Aggregates kept per bucket: column -> (expression over flight rows, how
+# to merge a new value into the stored one)
+FLIGHT_AGGREGATES = {
+    'flights': ('COUNT(*)', '{t}.flights + EXCLUDED.flights'),
+    'altitude_count': ('COUNT(altitude)', '{t}.altitude_count + EXCLUDED.altitude_count'),
+    'altitude_sum': ('COALESCE(SUM(altitude), 0)', '{t}.altitude_sum + EXCLUDED.altitude_sum'),
+    'altitude_min': ('MIN(altitude)', 'LEAST({t}.altitude_min, EXCLUDED.altitude_min)'),
+    'altitude_max': ('MAX(altitude)', 'GREATEST({t}.altitude_max, EXCLUDED.altitude_max)'),
+    'velocity_count': ('COUNT(velocity)', '{t}.velocity_count + EXCLUDED.velocity_count'),
+    'velocity_sum': ('COALESCE(SUM(velocity), 0)', '{t}.velocity_sum + EXCLUDED.velocity_sum'),
+    'velocity_min': ('MIN(velocity)', 'LEAST({t}.velocity_min, EXCLUDED.velocity_min)'),
+    'velocity_max': ('MAX(velocity)', 'GREATEST({t}.velocity_max, EXCLUDED.velocity_max)'),
+}
+
+_rollups_available = None
+_lock = threading.Lock()
+
+
+def has_rollups(cursor):
+    """True if the rollup tables exist (checked once per process)"""
+    global _rollups_available
+    with _lock:
+        if _rollups_available is not None:
+            return _rollups_available
+
+    cursor.execute(
+        "SELECT to_regclass(%s) IS NOT NULL AND to_regclass(%s) IS NOT NULL",
+        (FLIGHT_ROLLUP_TABLE, AIRPORT_ROLLUP_TABLE)
+    )
+    available = bool(cursor.fetchone()[0])
+    with _lock:
+        _rollups_available = available
+    return available
+
+
+def forget_rollups():
+    """Check again for the rollup tables on the next load"""
+    global _rollups_available
+    with _lock:
+        _rollups_available = None
+
+
+def flight_rollup_upsert(source):
+    """
+    SQL that folds flight rows into the hourly rollup
+
+    The statement can run on its own or as a data-modifying CTE.
+
+    Args:
+        source (str): Table or CTE name holding new flight rows with a
+            snapshot_ts column
+
+    Returns:
+        str: INSERT ... ON CONFLICT statement
+    """
+    columns = ', '.join(FLIGHT_AGGREGATES)
+    expressions = ', '.join(expression for expression, _ in FLIGHT_AGGREGATES.values())
+    merges = ', '.join(
+        f"{column} = {merge.format(t=FLIGHT_ROLLUP_TABLE)}"
+        for column, (_, merge) in FLIGHT_AGGREGATES.items()
+    )
+    return f"""
+        INSERT INTO {FLIGHT_ROLLUP_TABLE} (bucket, origin_country, {columns})
+        SELECT date_trunc('hour', snapshot_ts), COALESCE(origin_country, 'Unknown'), {expressions}
+        FROM {source}
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (bucket, origin_country) DO UPDATE SET {merges}
+    """
+
+
+def rebuild_flight_rollup(cursor, source):
+    """
+    Replace the hourly rollup with the aggregates of one set of rows
+
+    Used when the flights table itself is replaced.
+
+    Args:
+        cursor: psycopg2 cursor inside an open transaction
+        source (str): Table holding the new flights table contents
+    """
+    cursor.execute(f"DELETE FROM {FLIGHT_ROLLUP_TABLE}")
+    cursor.execute(flight_rollup_upsert(source))
+
+
+def refresh_airport_rollup(cursor):
+    """
+    Recount airports per country
+
+    The airports table is small reference data, so recounting it whenever
+    it is reloaded is cheaper than tracking changes.
+
+    Args:
+        cursor: psycopg2 cursor inside an open transaction
+    """
+    cursor.execute(f"DELETE FROM {AIRPORT_ROLLUP_TABLE}")
+    cursor.execute(f"""
+        INSERT INTO {AIRPORT_ROLLUP_TABLE} (country, airport_count)
+        SELECT country, COUNT(*) FROM airports
+        WHERE country IS NOT NULL
+        GROUP BY country
+    """)
+
+
+if __name__ == "__main__":
+    """Show the rollup statement the loader runs after each snapshot"""
+    print("Testing rollup SQL...\n")
+    print(flight_rollup_upsert('changed'))
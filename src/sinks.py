@@ -0,0 +1,435 @@
+"""
+Sinks Module
+
+This module lets transformed snapshots go to more than one kind of storage:
+- FlightSink is the small interface the pipeline writes through
+- PostgresSink loads into the flights tables (directly or through a spool)
+- ParquetSink writes a columnar dataset partitioned by date and hour, with
+  row-group statistics, so history scans skip whole files and row groups
+  without going through the database
+- Small per-snapshot files of past hours are compacted into one file per
+  hour, sorted by coarse grid cell so bounding-box filters skip row groups;
+  the Parquet sink does it on a background thread, so writes never wait
+- scan_flights() reads the dataset back with time, area and column filters
+
+The Parquet sink needs pyarrow (optional: pip install pyarrow).
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from src.compact_schema import expand_flights
+from src.load_data import load_flight_batch
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # optional: only the Parquet sink needs it
+    pa = None
+
+# Rows per row group of compacted files: small enough for bbox filters to
+# skip most of an hour, large enough to keep the column chunks efficient
+ROW_GROUP_ROWS = 32_768
+
+# Compacted files are sorted by grid cells of this many degrees
+SORT_CELL_DEG = 10.0
+
+# Past hours are compacted at most this often (seconds)
+COMPACT_INTERVAL = 3600
+
+# Schema metadata key listing the files a compacted file replaced
+_SOURCES_KEY = b'airlife.sources'
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The Parquet sink needs pyarrow: pip install pyarrow")
+
+
+def flight_schema():
+    """Arrow schema of the flight dataset (the flights table columns, plus snapshot_ts)"""
+    _require_pyarrow()
+    return pa.schema([
+        ('icao24', pa.string()),
+        ('callsign', pa.string()),
+        ('origin_country', pa.string()),
+        ('time_position', pa.int64()),
+        ('last_contact', pa.int64()),
+        ('longitude', pa.float64()),
+        ('latitude', pa.float64()),
+        ('altitude', pa.float32()),
+        ('on_ground', pa.bool_()),
+        ('velocity', pa.float32()),
+        ('true_track', pa.float32()),
+        ('vertical_rate', pa.float32()),
+        ('nearest_airport_iata', pa.string()),
+        ('nearest_airport_distance_km', pa.float32()),
+        ('nearest_airport_bearing_deg', pa.float32()),
+        ('snapshot_ts', pa.timestamp('us', tz='UTC')),
+    ])
+
+
+def _partition_schema():
+    return pa.schema([('date', pa.string()), ('hour', pa.int8())])
+
+
+class FlightSink(ABC):
+    """
+    Destination of transformed flight snapshots
+
+    Subclasses implement write(); name is the metrics stage of the writes.
+    """
+
+    name = 'sink'
+
+    @abstractmethod
+    def write(self, flights_df, snapshot_ts):
+        """
+        Store one transformed snapshot
+
+        Args:
+            flights_df (pandas.DataFrame): Transformed flights
+            snapshot_ts (datetime): Time the snapshot was taken
+
+        Returns:
+            int: Rows written
+
+        Raises:
+            Exception: Whatever stopped the write, so the caller can count
+                the failure (a sink never reports rows it did not store)
+        """
+
+    def close(self):
+        """Flush and release whatever the sink holds"""
+
+
+class PostgresSink(FlightSink):
+    """Loads snapshots into PostgreSQL, or into a spool drained into it"""
+
+    def __init__(self, mode='replace', spool=None, give_up=None):
+        """
+        Args:
+            mode (str): 'replace' or 'append', as for load_flight_batch
+            spool (SnapshotSpool): Optional spool to write to instead
+            give_up (threading.Event): Stop waiting for a full spool once set
+        """
+        self.mode = mode
+        self.spool = spool
+        self.give_up = give_up
+        self.name = 'spool' if spool is not None else 'load'
+
+    def write(self, flights_df, snapshot_ts):
+        snapshot_ts = snapshot_ts or datetime.now(timezone.utc)
+        if self.spool is not None:
+            self.spool.append(flights_df, snapshot_ts, give_up=self.give_up)
+            return len(flights_df)
+        return load_flight_batch([(snapshot_ts, flights_df)], mode=self.mode)
+
+
+class ParquetSink(FlightSink):
+    """
+    Writes every snapshot as a Parquet file under root/date=YYYY-MM-DD/hour=HH/
+
+    Files appear atomically (written under a hidden name, then renamed), so
+    readers never see a partial file. Past hours are compacted by a
+    background thread, so write() only appends; compaction only ever
+    touches files that exist when it lists a partition, so it can run next
+    to writes into the same hour (e.g. when replaying).
+    """
+
+    name = 'parquet'
+
+    def __init__(self, root, compact_interval=COMPACT_INTERVAL):
+        """
+        Args:
+            root (str): Dataset directory
+            compact_interval (float): Seconds between background
+                compactions of past hours (None to only compact on close)
+        """
+        _require_pyarrow()
+        self.root = root
+        self.schema = flight_schema()
+        self.compact_interval = compact_interval
+        os.makedirs(root, exist_ok=True)
+        self._stop_event = threading.Event()
+        self._compactor = None
+        if compact_interval is not None:
+            self._compactor = threading.Thread(target=self._compact_periodically, name='parquet-compactor',
+                                               daemon=True)
+            self._compactor.start()
+
+    def write(self, flights_df, snapshot_ts):
+        if flights_df.empty:
+            return 0
+        snapshot_ts = snapshot_ts or datetime.now(timezone.utc)
+        table = flights_to_table(flights_df, snapshot_ts, self.schema)
+        directory = partition_path(self.root, snapshot_ts)
+        os.makedirs(directory, exist_ok=True)
+        name = f"part-{snapshot_ts.astimezone(timezone.utc):%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}.parquet"
+        _write_atomic(table, os.path.join(directory, name))
+        return table.num_rows
+
+    def close(self):
+        """Stop the background compactions, then compact the hours completed since the last one"""
+        self._stop_event.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        compact_dataset(self.root)
+
+    def _compact_periodically(self):
+        """Background thread: compact past hours every compact_interval seconds until closed"""
+        while not self._stop_event.wait(self.compact_interval):
+            try:
+                compact_dataset(self.root)
+            except Exception as e:
+                print(f"❌ Parquet compaction failed (retrying in {self.compact_interval:g}s): {e}")
+
+
+def partition_path(root, snapshot_ts):
+    """Directory of the hour partition of a snapshot"""
+    snapshot_ts = snapshot_ts.astimezone(timezone.utc)
+    return os.path.join(root, f"date={snapshot_ts:%Y-%m-%d}", f"hour={snapshot_ts.hour:02d}")
+
+
+def flights_to_table(flights_df, snapshot_ts, schema):
+    """
+    Convert transformed flights (regular or compact schema) to an Arrow table
+
+    Columns missing from the frame are written as nulls, so every file of
+    the dataset has the same schema.
+    """
+    df = expand_flights(flights_df)
+    n = len(df)
+    columns = []
+    for field in schema:
+        if field.name == 'snapshot_ts':
+            columns.append(pa.array(np.full(n, pd.Timestamp(snapshot_ts).tz_convert('UTC').value // 1000),
+                                    type=pa.int64()).cast(field.type))
+        elif field.name in df.columns:
+            values = df[field.name]
+            if pa.types.is_string(field.type):
+                values = values.astype(object).where(values.notna(), None)
+            columns.append(pa.array(values, type=field.type, from_pandas=True))
+        else:
+            columns.append(pa.nulls(n, type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _write_atomic(table, path, sources=None):
+    """Write a Parquet file under a hidden name, then rename it into place"""
+    if sources is not None:
+        metadata = dict(table.schema.metadata or {})
+        metadata[_SOURCES_KEY] = json.dumps(sources).encode()
+        table = table.replace_schema_metadata(metadata)
+    directory, name = os.path.split(path)
+    temp_path = os.path.join(directory, f".{name}.tmp")
+    pq.write_table(table, temp_path, row_group_size=ROW_GROUP_ROWS, compression='zstd',
+                   write_statistics=True)
+    os.replace(temp_path, path)
+
+
+def compact_dataset(root, before=None):
+    """
+    Merge the files of each past hour partition into one sorted file
+
+    Rows are sorted by grid cell, then time, so each row group covers a
+    small area and bbox filters can skip it. A compacted file records the
+    files it replaces, so a crash between writing it and deleting them is
+    repaired on the next run instead of duplicating rows.
+
+    Args:
+        root (str): Dataset directory
+        before (datetime): Only compact hours ending before this time
+            (default: the start of the current hour)
+
+    Returns:
+        int: Number of partitions compacted
+    """
+    _require_pyarrow()
+    before = before or datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    compacted = 0
+    for directory, hour_start in _hour_partitions(root):
+        if hour_start + timedelta(hours=1) > before:
+            continue
+        files = sorted(name for name in os.listdir(directory) if name.endswith('.parquet'))
+        files = _remove_replaced(directory, files)
+        if len(files) < 2:
+            continue
+
+        table = pa.concat_tables(pq.read_table(os.path.join(directory, name)).replace_schema_metadata(None)
+                                 for name in files)
+        table = table.take(_spatial_order(table))
+        name = f"compacted-{hour_start:%Y%m%dT%H}-{uuid.uuid4().hex[:8]}.parquet"
+        _write_atomic(table, os.path.join(directory, name), sources=files)
+        for old in files:
+            os.remove(os.path.join(directory, old))
+        compacted += 1
+        print(f"🗜️  Compacted {len(files)} files ({table.num_rows} rows) of {hour_start:%Y-%m-%d %H}:00")
+    return compacted
+
+
+def _hour_partitions(root):
+    """Yield (directory, hour start) of every date/hour partition"""
+    for date_name in sorted(os.listdir(root)):
+        if not date_name.startswith('date='):
+            continue
+        for hour_name in sorted(os.listdir(os.path.join(root, date_name))):
+            if hour_name.startswith('hour='):
+                hour_start = datetime.strptime(f"{date_name[5:]} {hour_name[5:]}", '%Y-%m-%d %H')
+                yield os.path.join(root, date_name, hour_name), hour_start.replace(tzinfo=timezone.utc)
+
+
+def _remove_replaced(directory, files):
+    """Delete files already merged into a compacted file; return the others"""
+    replaced = set()
+    for name in files:
+        if name.startswith('compacted-'):
+            metadata = pq.read_schema(os.path.join(directory, name)).metadata or {}
+            replaced.update(json.loads(metadata.get(_SOURCES_KEY, b'[]')))
+    for name in replaced.intersection(files):
+        os.remove(os.path.join(directory, name))
+    return [name for name in files if name not in replaced]
+
+
+def _spatial_order(table):
+    """Row order by (latitude cell, longitude cell, snapshot_ts)"""
+    latitude = table['latitude'].to_numpy(zero_copy_only=False)
+    longitude = table['longitude'].to_numpy(zero_copy_only=False)
+    snapshot_ts = table['snapshot_ts'].cast(pa.int64()).to_numpy(zero_copy_only=False)
+    rows = np.floor((np.nan_to_num(latitude, nan=90.0) + 90) / SORT_CELL_DEG)
+    columns = np.floor((np.nan_to_num(longitude, nan=180.0) + 180) / SORT_CELL_DEG)
+    return np.lexsort((snapshot_ts, columns, rows))
+
+
+def flight_dataset(root):
+    """Open the Parquet flight dataset as a pyarrow dataset"""
+    _require_pyarrow()
+    return ds.dataset(root, schema=flight_schema().append(pa.field('date', pa.string()))
+                      .append(pa.field('hour', pa.int8())), format='parquet',
+                      partitioning=ds.partitioning(_partition_schema(), flavor='hive'))
+
+
+def flight_filter(start=None, end=None, bbox=None):
+    """
+    Dataset filter on snapshot time and area
+
+    Partition columns are filtered too, so whole days and hours are pruned
+    from the directory names before any file is opened.
+
+    Args:
+        start (datetime): Earliest snapshot_ts (inclusive)
+        end (datetime): Latest snapshot_ts (exclusive)
+        bbox (dict): lamin, lomin, lamax, lomax
+
+    Returns:
+        pyarrow.dataset.Expression: The filter (None if there is nothing to filter)
+    """
+    conditions = []
+    if start is not None:
+        start = start.astimezone(timezone.utc)
+        first_day = f"{start:%Y-%m-%d}"
+        conditions.append(ds.field('date') >= first_day)
+        conditions.append((ds.field('date') > first_day) | (ds.field('hour') >= start.hour))
+        conditions.append(ds.field('snapshot_ts') >= pa.scalar(start, type=pa.timestamp('us', tz='UTC')))
+    if end is not None:
+        end = end.astimezone(timezone.utc)
+        # end is exclusive: the last hour that can hold rows is the one before it
+        last = end - timedelta(microseconds=1)
+        last_day = f"{last:%Y-%m-%d}"
+        conditions.append(ds.field('date') <= last_day)
+        conditions.append((ds.field('date') < last_day) | (ds.field('hour') <= last.hour))
+        conditions.append(ds.field('snapshot_ts') < pa.scalar(end, type=pa.timestamp('us', tz='UTC')))
+    if bbox is not None:
+        conditions.append((ds.field('latitude') >= bbox['lamin']) & (ds.field('latitude') <= bbox['lamax']))
+        conditions.append((ds.field('longitude') >= bbox['lomin']) & (ds.field('longitude') <= bbox['lomax']))
+
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def scan_flights(root, start=None, end=None, bbox=None, columns=None):
+    """
+    Read flights from the Parquet dataset
+
+    Args:
+        root (str): Dataset directory
+        start (datetime): Earliest snapshot_ts (inclusive)
+        end (datetime): Latest snapshot_ts (exclusive)
+        bbox (dict): lamin, lomin, lamax, lomax
+        columns (list): Columns to read (default: all flight columns)
+
+    Returns:
+        pandas.DataFrame: Matching flights
+    """
+    columns = columns or flight_schema().names
+    table = flight_dataset(root).to_table(columns=columns, filter=flight_filter(start, end, bbox))
+    return table.to_pandas()
+
+
+if __name__ == "__main__":
+    """Write two hours of synthetic snapshots, compact them and scan with filters"""
+    import shutil
+    import tempfile
+
+    print("Testing Parquet sink...\n")
+
+    rng = np.random.default_rng(0)
+    n = 20_000
+    icao24 = [f"{x:06x}" for x in rng.integers(0, 2 ** 24, n)]
+    first = datetime(2024, 5, 1, 10, 0, tzinfo=timezone.utc)
+
+    root = tempfile.mkdtemp()
+    try:
+        sink = ParquetSink(root, compact_interval=None)
+        started = time.perf_counter()
+        for i in range(48):
+            flights = pd.DataFrame({
+                'icao24': icao24,
+                'callsign': [f"AFR{x}" for x in range(n)],
+                'origin_country': 'France',
+                'time_position': 1_714_557_600 + 150 * i,
+                'last_contact': 1_714_557_600 + 150 * i,
+                'longitude': rng.uniform(-180, 180, n),
+                'latitude': np.degrees(np.arcsin(rng.uniform(-1, 1, n))),
+                'altitude': rng.uniform(0, 40_000, n),
+                'on_ground': rng.random(n) < 0.1,
+                'velocity': rng.uniform(0, 250, n),
+            })
+            sink.write(flights, first + timedelta(seconds=150 * i))
+        print(f"Wrote 48 snapshots ({48 * n} rows) in {time.perf_counter() - started:.2f}s")
+
+        compact_dataset(root, before=first + timedelta(hours=2))
+        print(f"Files after compaction: {len(flight_dataset(root).files)}")
+
+        bbox = {'lamin': 40, 'lomin': -10, 'lamax': 55, 'lomax': 20}
+        start, end = first + timedelta(minutes=70), first + timedelta(minutes=80)
+        expression = flight_filter(start, end, bbox)
+        dataset = flight_dataset(root)
+        files = len(list(dataset.get_fragments(filter=expression)))
+        print(f"Files opened for a 10-minute query: {files} of {len(dataset.files)}")
+        row_groups = sum(fragment.num_row_groups for fragment in dataset.get_fragments())
+        read_groups = sum(fragment.subset(expression, schema=dataset.schema).num_row_groups
+                          for fragment in dataset.get_fragments(filter=expression))
+        print(f"Row groups read for a 10-minute, Europe-sized query: {read_groups} of {row_groups}")
+
+        started = time.perf_counter()
+        europe = scan_flights(root, start, end, bbox, columns=['icao24', 'latitude', 'longitude', 'snapshot_ts'])
+        elapsed = time.perf_counter() - started
+        everything = scan_flights(root)
+        expected = everything[(everything['snapshot_ts'] >= start) & (everything['snapshot_ts'] < end)
+                              & everything['latitude'].between(40, 55) & everything['longitude'].between(-10, 20)]
+        print(f"Scan found {len(europe)} rows in {elapsed * 1000:.1f} ms, "
+              f"matches a full read: {len(europe) == len(expected)}")
+    finally:
+        shutil.rmtree(root)
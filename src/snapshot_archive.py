@@ -0,0 +1,155 @@
+"""
+Snapshot Archive Module
+
+This module keeps raw OpenSky responses on disk so runs can be reproduced:
+- Each 'states' payload is appended as its own gzip member to an hourly
+  segment file (append-only, never rewritten)
+- A small CSV index maps each snapshot time to its segment, byte offset
+  and length, so any snapshot can be read back without scanning
+- Archived snapshots can be replayed at recorded speed or as fast as possible
+"""
+
+import csv
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from src.extract_data import states_to_dataframe
+
+INDEX_FILE = 'index.csv'
+INDEX_FIELDS = ['time', 'segment', 'offset', 'length', 'rows']
+
+
+class SnapshotArchive:
+    """
+    Compressed, append-only, time-indexed store of raw API payloads
+    """
+
+    def __init__(self, path):
+        """
+        Open (or create) an archive directory
+
+        Args:
+            path (str): Directory holding the segments and the index
+        """
+        self.path = path
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+
+    def append(self, payload):
+        """
+        Store one raw API payload
+
+        Args:
+            payload (dict): Decoded /states/all response with 'time' and 'states'
+
+        Returns:
+            dict: The index entry written for this snapshot
+        """
+        snapshot_time = int(payload.get('time') or time.time())
+        segment = datetime.fromtimestamp(snapshot_time, timezone.utc).strftime('states-%Y%m%d-%H.json.gz')
+        # Each snapshot is a complete gzip member: concatenated members are
+        # still a valid gzip file, and one member can be read on its own
+        data = gzip.compress(json.dumps(payload, separators=(',', ':')).encode(), compresslevel=6)
+
+        with self._lock:
+            segment_path = os.path.join(self.path, segment)
+            with open(segment_path, 'ab') as f:
+                offset = f.tell()
+                f.write(data)
+
+            entry = {'time': snapshot_time, 'segment': segment, 'offset': offset,
+                     'length': len(data), 'rows': len(payload.get('states') or [])}
+            new_index = not os.path.exists(self.index_path)
+            with open(self.index_path, 'a', newline='') as f:
+                writer = csv.DictWriter(f, fieldnames=INDEX_FIELDS)
+                if new_index:
+                    writer.writeheader()
+                writer.writerow(entry)
+
+        return entry
+
+    def entries(self, start=None, end=None):
+        """
+        List archived snapshots in time order
+
+        Args:
+            start (int): Optional first unix time to include
+            end (int): Optional last unix time to include
+
+        Returns:
+            list: Index entries as dicts
+        """
+        if not os.path.exists(self.index_path):
+            return []
+
+        with open(self.index_path, newline='') as f:
+            entries = [
+                {'time': int(row['time']), 'segment': row['segment'], 'offset': int(row['offset']),
+                 'length': int(row['length']), 'rows': int(row['rows'])}
+                for row in csv.DictReader(f)
+            ]
+
+        entries = [e for e in entries
+                   if (start is None or e['time'] >= start) and (end is None or e['time'] <= end)]
+        return sorted(entries, key=lambda e: e['time'])
+
+    def read(self, entry):
+        """Read back the payload of one index entry"""
+        with open(os.path.join(self.path, entry['segment']), 'rb') as f:
+            f.seek(entry['offset'])
+            return json.loads(gzip.decompress(f.read(entry['length'])))
+
+
+def replay_snapshots(archive, speed=None, start=None, end=None):
+    """
+    Yield archived snapshots as flight DataFrames
+
+    Args:
+        archive (SnapshotArchive): Archive to read from
+        speed (float): 1.0 replays at recorded speed, 2.0 twice as fast,
+            None as fast as possible
+        start (int): Optional first unix time to replay
+        end (int): Optional last unix time to replay
+
+    Yields:
+        tuple: (snapshot time as datetime, raw flights DataFrame)
+    """
+    first_recorded = None
+    first_replayed = None
+
+    for entry in archive.entries(start, end):
+        if speed:
+            now = time.monotonic()
+            if first_recorded is None:
+                first_recorded, first_replayed = entry['time'], now
+            delay = first_replayed + (entry['time'] - first_recorded) / speed - now
+            if delay > 0:
+                time.sleep(delay)
+
+        payload = archive.read(entry)
+        snapshot_ts = datetime.fromtimestamp(entry['time'], timezone.utc)
+        yield snapshot_ts, states_to_dataframe(payload.get('states'))
+
+
+if __name__ == "__main__":
+    """Test capture and replay with a temporary archive"""
+    import tempfile
+
+    print("Testing snapshot archive...\n")
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive = SnapshotArchive(directory)
+        for i in range(3):
+            archive.append({'time': 1700000000 + i, 'states': [
+                ['abc123', 'TEST1   ', 'France', 1700000000 + i, 1700000000 + i,
+                 2.5 + i, 49.0, 1000.0, False, 200.0, 90.0, 0.0, None, 1000.0, None, False, 0]
+            ]})
+
+        print(f"Archived {len(archive.entries())} snapshots")
+        for snapshot_ts, flights in replay_snapshots(archive, speed=10.0):
+            print(f"{snapshot_ts:%H:%M:%S} -> {len(flights)} flight(s) at lon {flights['longitude'].iloc[0]}")
@@ -0,0 +1,391 @@
+"""
+Spatial Index Module
+
+This module answers "which airport is closest to this aircraft?" for a whole
+snapshot at once:
+- Airports are projected onto the unit sphere and sorted by cell of flat
+  3D grids of doubling cell sizes
+- All aircraft look up their neighbouring cells together in batched NumPy
+  operations, only the unmatched ones moving on to coarser grids
+- Distances are exact great-circle (haversine) distances in kilometres
+"""
+
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Cell keys pack three grid coordinates into one int64 (21 bits each)
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+
+# Offsets of a grid cell and its 26 neighbours (the cell itself is index 13)
+NEIGHBOUR_OFFSETS = np.array([[i, j, k] for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)],
+                              dtype=np.int64)
+_OTHER_NEIGHBOURS = np.arange(27) != 13
+
+# Number of queries processed together, bounds the size of the pair arrays
+_QUERY_CHUNK = 4096
+
+
+def to_unit_vectors(lats, lons):
+    """Convert latitude/longitude in degrees to (n, 3) unit vectors"""
+    lat = np.radians(np.asarray(lats, dtype=np.float64))
+    lon = np.radians(np.asarray(lons, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)))
+
+
+def cell_keys(cells):
+    """Pack (n, 3) integer grid coordinates (each within +-2**20) into sortable int64 keys"""
+    cells = cells.astype(np.int64) + _KEY_OFFSET
+    return (cells[:, 0] << (2 * _KEY_BITS)) | (cells[:, 1] << _KEY_BITS) | cells[:, 2]
+
+
+def chord_to_km(chord):
+    """Convert a chord length on the unit sphere to a great-circle distance in km"""
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+
+def km_to_chord(distance_km):
+    """Convert a great-circle distance in km to a chord length on the unit sphere"""
+    angle = np.minimum(np.asarray(distance_km, dtype=np.float64) / EARTH_RADIUS_KM, np.pi)
+    return 2.0 * np.sin(angle / 2.0)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Vectorized great-circle distance in km between two sets of points"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2.0) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2)
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def initial_bearing_deg(lat1, lon1, lat2, lon2):
+    """Vectorized initial bearing in degrees (0-360) from point 1 towards point 2"""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    dlon = lon2 - lon1
+    x = np.sin(dlon) * np.cos(lat2)
+    y = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlon)
+    return (np.degrees(np.arctan2(x, y)) + 360.0) % 360.0
+
+
+class AirportIndex:
+    """
+    Flat unit-sphere grids over airport positions for batched nearest-neighbour queries
+
+    Points live on the unit sphere, so straight-line (chord) distance grows
+    with great-circle distance. Airports are sorted by grid cell at several
+    levels, from about one airport per cell up to cells as wide as the
+    sphere, each level doubling the cell edge. Every airport within one
+    cell edge of a point lies in the 27 cells around it, so a query whose
+    nearest candidate there is within the edge is settled; the others move
+    on to the next level. Aircraft over land settle at the finest level,
+    aircraft over oceans a few levels up.
+    """
+
+    def __init__(self, latitudes, longitudes, cell_size=None):
+        """
+        Build the index
+
+        Args:
+            latitudes (array-like): Airport latitudes in degrees
+            longitudes (array-like): Airport longitudes in degrees
+            cell_size (float): Cell edge of the finest grid on the unit
+                sphere. Defaults to roughly the mean spacing between airports.
+        """
+        self.latitudes = np.asarray(latitudes, dtype=np.float64)
+        self.longitudes = np.asarray(longitudes, dtype=np.float64)
+        self.size = len(self.latitudes)
+
+        if cell_size is None:
+            # Surface of the unit sphere is 4*pi, so this is ~one airport per cell
+            cell_size = float(np.clip(np.sqrt(4.0 * np.pi / max(self.size, 1)), 1e-3, 1.0))
+        self.cell_size = cell_size
+
+        # The top level's cells are at least 2 wide (the sphere's diameter),
+        # so its 27 cells around any point hold every airport
+        self.depth = max(int(np.ceil(np.log2(2.0 / cell_size))), 0)
+
+        self.points = to_unit_vectors(self.latitudes, self.longitudes)
+        self.level_order = []
+        self.level_keys = []
+        self.level_start = []
+        self.level_count = []
+        for level in range(self.depth + 1):
+            keys = cell_keys(np.floor(self.points / self._edge(level)))
+            order = np.argsort(keys, kind='stable')
+            level_keys, cell_start, cell_count = np.unique(keys[order], return_index=True, return_counts=True)
+            self.level_order.append(order)
+            self.level_keys.append(level_keys)
+            self.level_start.append(cell_start)
+            self.level_count.append(cell_count)
+
+    # Attributes that fully describe a built index
+    _SCALARS = ('size', 'cell_size', 'depth')
+    _ARRAYS = ('latitudes', 'longitudes', 'points')
+    _LEVEL_ARRAYS = ('level_order', 'level_keys', 'level_start', 'level_count')
+
+    def _edge(self, level):
+        return self.cell_size * (1 << level)
+
+    def to_arrays(self):
+        """
+        Export the index as a flat dict of NumPy arrays
+
+        Returns:
+            dict: Array name -> array, enough for from_arrays() to rebuild
+            the index without recomputing it
+        """
+        arrays = {name: getattr(self, name) for name in self._ARRAYS}
+        arrays.update({name: np.asarray(getattr(self, name)) for name in self._SCALARS})
+        for name in self._LEVEL_ARRAYS:
+            for level, array in enumerate(getattr(self, name)):
+                arrays[f'{name}_{level}'] = array
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """
+        Rebuild an index from to_arrays() output (arrays may be memory-mapped)
+
+        Args:
+            arrays (dict): Array name -> array
+
+        Returns:
+            AirportIndex: Ready-to-query index
+        """
+        index = cls.__new__(cls)
+        for name in cls._ARRAYS:
+            setattr(index, name, arrays[name])
+        index.size = int(arrays['size'])
+        index.cell_size = float(arrays['cell_size'])
+        index.depth = int(arrays['depth'])
+        for name in cls._LEVEL_ARRAYS:
+            setattr(index, name, [arrays[f'{name}_{level}'] for level in range(index.depth + 1)])
+        return index
+
+    def query(self, latitudes, longitudes, max_radius_km=None):
+        """
+        Find the nearest airport for every query point
+
+        Args:
+            latitudes (array-like): Query latitudes in degrees
+            longitudes (array-like): Query longitudes in degrees
+            max_radius_km (float): Optional cutoff. Points with no airport
+                within this distance stop searching early and get no match.
+
+        Returns:
+            tuple: (airport positions as int64 with -1 for no match,
+                    distances in km with NaN for no match)
+        """
+        query_points = to_unit_vectors(latitudes, longitudes)
+        n = len(query_points)
+        best_index = np.full(n, -1, dtype=np.int64)
+        best_chord = np.full(n, np.inf)
+
+        if self.size > 0 and n > 0:
+            max_chord = np.inf if max_radius_km is None else float(km_to_chord(max_radius_km))
+            pending = np.arange(n)
+            for level in range(self.depth + 1):
+                self._scan_level(level, query_points, pending, best_index, best_chord)
+                # Settled: a candidate within one edge, or the whole cutoff circle scanned
+                edge = self._edge(level)
+                if edge >= max_chord:
+                    break
+                pending = pending[best_chord[pending] > edge]
+                if not len(pending):
+                    break
+
+            outside = best_chord > max_chord
+            best_index[outside] = -1
+            best_chord[outside] = np.inf
+
+        distances = chord_to_km(best_chord)
+        distances[best_index < 0] = np.nan
+        return best_index, distances
+
+    def _scan_level(self, level, points, pending, best_index, best_chord):
+        """Improve the matches of the pending queries with the 27 cells around them at one level"""
+        for start in range(0, len(pending), _QUERY_CHUNK):
+            queries = pending[start:start + _QUERY_CHUNK]
+            # The query's own cell first: its best match prunes most neighbours
+            for offsets in (NEIGHBOUR_OFFSETS[13:14], NEIGHBOUR_OFFSETS[_OTHER_NEIGHBOURS]):
+                self._scan_cells(level, offsets, points[queries], queries, best_index, best_chord)
+
+    def _scan_cells(self, level, offsets, p, queries, best_index, best_chord):
+        """Improve the matches of some queries with the airports of the cells at these offsets"""
+        edge = self._edge(level)
+        level_keys = self.level_keys[level]
+        cells = (np.floor(p / edge).astype(np.int64)[:, None, :] + offsets).reshape(-1, 3)
+        keys = cell_keys(cells)
+        slot = np.minimum(np.searchsorted(level_keys, keys), len(level_keys) - 1)
+        pair = np.flatnonzero(level_keys[slot] == keys)
+        pair_query = pair // len(offsets)
+
+        # Skip cells whose box is further away than the best match so far
+        low = cells[pair] * edge
+        q = p[pair_query]
+        near = np.maximum(np.maximum(low - q, 0.0), q - (low + edge))
+        useful = np.einsum('ij,ij->i', near, near) <= best_chord[queries[pair_query]] ** 2
+        pair_query, slot = pair_query[useful], slot[pair[useful]]
+        if not len(slot):
+            return
+
+        # Expand each cell into its airports
+        counts = self.level_count[level][slot]
+        total = int(counts.sum())
+        candidate_query = np.repeat(pair_query, counts)
+        run_starts = np.repeat(self.level_start[level][slot] - (np.cumsum(counts) - counts), counts)
+        candidate_airport = self.level_order[level][run_starts + np.arange(total)]
+        diff = self.points[candidate_airport] - p[candidate_query]
+        chords = np.sqrt(np.einsum('ij,ij->i', diff, diff))
+
+        # Closest candidate per query (candidates are grouped by query)
+        bounds = np.flatnonzero(np.r_[True, candidate_query[1:] != candidate_query[:-1]])
+        group_best = np.minimum.reduceat(chords, bounds)
+        winners = np.flatnonzero(chords == np.repeat(group_best, np.diff(np.r_[bounds, total])))
+        winners = winners[np.r_[True, candidate_query[winners[1:]] != candidate_query[winners[:-1]]]]
+
+        target = queries[candidate_query[winners]]
+        better = chords[winners] < best_chord[target]
+        best_chord[target[better]] = chords[winners][better]
+        best_index[target[better]] = candidate_airport[winners][better]
+
+
+_INDEX_CACHE = {}
+
+
+def _airport_fingerprint(airports_df):
+    """Content hash of the columns the index depends on"""
+    subset = airports_df[['latitude', 'longitude']]
+    return int(pd.util.hash_pandas_object(subset, index=False).sum()), len(subset)
+
+
+def register_airport_index(airports_df, index):
+    """
+    Make get_airport_index() return an index that was built elsewhere
+
+    Used by the reference-data cache to reuse an index loaded from disk.
+
+    Args:
+        airports_df (pandas.DataFrame): Airports the index was built from
+        index (AirportIndex): Index over those airports, in the same row order
+    """
+    _INDEX_CACHE.clear()
+    _INDEX_CACHE[_airport_fingerprint(airports_df)] = index
+
+
+def get_airport_index(airports_df):
+    """
+    Return the spatial index for a set of airports, building it only once
+
+    Args:
+        airports_df (pandas.DataFrame): Cleaned airports with latitude/longitude
+
+    Returns:
+        AirportIndex: Index whose positions refer to rows of airports_df
+    """
+    key = _airport_fingerprint(airports_df)
+    index = _INDEX_CACHE.get(key)
+    if index is None:
+        index = AirportIndex(airports_df['latitude'].to_numpy(dtype=np.float64),
+                             airports_df['longitude'].to_numpy(dtype=np.float64))
+        _INDEX_CACHE.clear()
+        _INDEX_CACHE[key] = index
+    return index
+
+
+def locate_airports(index, latitudes, longitudes, max_radius_km=None):
+    """
+    Nearest-airport positions, distances and bearings as plain arrays
+
+    Needs only the index, not the airports frame, so it can run in a worker
+    process holding a shared copy of the index.
+
+    Args:
+        index (AirportIndex): Index to query
+        latitudes (array-like): Aircraft latitudes in degrees
+        longitudes (array-like): Aircraft longitudes in degrees
+        max_radius_km (float): Optional search cutoff in km
+
+    Returns:
+        tuple: (positions with -1 for no match, distances in km, bearings in
+        degrees), NaN distance and bearing for no match
+    """
+    latitudes = np.asarray(latitudes, dtype=np.float64)
+    longitudes = np.asarray(longitudes, dtype=np.float64)
+    positions, distances = index.query(latitudes, longitudes, max_radius_km=max_radius_km)
+
+    found = positions >= 0
+    bearings = np.full(len(positions), np.nan)
+    if found.any():
+        bearings[found] = initial_bearing_deg(
+            latitudes[found], longitudes[found],
+            index.latitudes[positions[found]], index.longitudes[positions[found]]
+        )
+    return positions, distances, bearings
+
+
+def airport_match_columns(airports_df, positions, distances, bearings):
+    """
+    Build the nearest-airport columns from locate_airports() output
+
+    Args:
+        airports_df (pandas.DataFrame): Airports the positions refer to
+        positions, distances, bearings (numpy.ndarray): locate_airports() output
+
+    Returns:
+        pandas.DataFrame: nearest_airport_iata, nearest_airport_distance_km and
+        nearest_airport_bearing_deg, one row per query point
+    """
+    found = positions >= 0
+    iata = np.full(len(positions), None, dtype=object)
+    if found.any():
+        iata[found] = airports_df['iata_code'].to_numpy(dtype=object)[positions[found]]
+
+    return pd.DataFrame({
+        'nearest_airport_iata': iata,
+        'nearest_airport_distance_km': distances,
+        'nearest_airport_bearing_deg': bearings,
+    })
+
+
+def nearest_airports(airports_df, latitudes, longitudes, max_radius_km=None):
+    """
+    Batched nearest-airport lookup
+
+    Args:
+        airports_df (pandas.DataFrame): Cleaned airports with latitude, longitude, iata_code
+        latitudes (array-like): Aircraft latitudes in degrees
+        longitudes (array-like): Aircraft longitudes in degrees
+        max_radius_km (float): Optional search cutoff in km
+
+    Returns:
+        pandas.DataFrame: nearest_airport_iata, nearest_airport_distance_km and
+        nearest_airport_bearing_deg, one row per query point
+    """
+    index = get_airport_index(airports_df)
+    positions, distances, bearings = locate_airports(index, latitudes, longitudes,
+                                                     max_radius_km=max_radius_km)
+    return airport_match_columns(airports_df, positions, distances, bearings)
+
+
+if __name__ == "__main__":
+    """Compare the index against a brute-force search on random points"""
+    print("Testing spatial index...\n")
+
+    rng = np.random.default_rng(0)
+    airport_lats = np.degrees(np.arcsin(rng.uniform(-1, 1, 5000)))
+    airport_lons = rng.uniform(-180, 180, 5000)
+    flight_lats = np.degrees(np.arcsin(rng.uniform(-1, 1, 2000)))
+    flight_lons = rng.uniform(-180, 180, 2000)
+
+    index = AirportIndex(airport_lats, airport_lons)
+    positions, distances = index.query(flight_lats, flight_lons)
+
+    brute = haversine_km(flight_lats[:, None], flight_lons[:, None],
+                         airport_lats[None, :], airport_lons[None, :])
+    expected = brute.argmin(axis=1)
+    print(f"Matches brute force: {np.array_equal(positions, expected)}")
+    print(f"Max distance error (km): {np.abs(distances - brute.min(axis=1)).max():.6f}")
@@ -0,0 +1,515 @@
+"""
+Spool Module
+
+This module decouples the daemon from database latency and outages:
+- Transformed snapshots are appended to local segment files as compact
+  binary records (columnar, zlib-compressed, CRC-checked)
+- A drainer thread bulk-loads them into PostgreSQL, several snapshots per
+  transaction, and only then moves a checkpoint forward; failed batches are
+  retried with a growing delay, so nothing is lost while the database is down
+- Fully loaded segments are deleted; the spool survives restarts and resumes
+  from the checkpoint
+- The total size is capped: when full, 'backpressure' makes writers wait for
+  the drainer, 'evict' drops the oldest segments instead
+"""
+
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+# Record header: magic, payload length, snapshot time (microseconds), rows, CRC32 of the payload
+_RECORD = struct.Struct('<4sIqII')
+_MAGIC = b'ALS1'
+
+SEGMENT_PATTERN = 'segment-{:012d}.spool'
+CHECKPOINT_FILE = 'checkpoint.json'
+
+POLICIES = ('backpressure', 'evict')
+
+
+class SpoolFullError(Exception):
+    """The spool is full and the writer gave up waiting for space"""
+
+
+def encode_frame(df):
+    """
+    Serialize a DataFrame into a compact binary payload
+
+    Numeric columns are stored as raw arrays, nullable ones with a null
+    mask, text (including categoricals) as UTF-8 bytes plus lengths.
+
+    Args:
+        df (pandas.DataFrame): Frame to encode
+
+    Returns:
+        bytes: zlib-compressed payload for decode_frame()
+    """
+    columns, buffers = [], []
+    for name in df.columns:
+        values = df[name]
+        dtype = values.dtype
+        if isinstance(dtype, np.dtype) and dtype.kind in 'biufM':
+            kind, parts = 'numpy', [np.ascontiguousarray(values.to_numpy())]
+            spec = dtype.str
+        elif isinstance(dtype, pd.api.extensions.ExtensionDtype) and dtype.kind in 'biuf':
+            missing = values.isna().to_numpy()
+            data = values.to_numpy(dtype=dtype.numpy_dtype, na_value=dtype.numpy_dtype.type(0))
+            kind, parts, spec = 'masked', [data, missing], str(dtype)
+        else:
+            missing = values.isna().to_numpy()
+            encoded = [str(value).encode() for value in values.to_numpy(dtype=object)[~missing]]
+            lengths = np.fromiter(map(len, encoded), dtype=np.int32, count=len(encoded))
+            kind, spec = 'text', None
+            parts = [missing, lengths, np.frombuffer(b''.join(encoded), dtype=np.uint8)]
+        columns.append({'name': str(name), 'kind': kind, 'dtype': spec,
+                        'sizes': [part.nbytes for part in parts]})
+        buffers.extend(part.tobytes() for part in parts)
+
+    meta = json.dumps({'rows': len(df), 'columns': columns}).encode()
+    return zlib.compress(struct.pack('<I', len(meta)) + meta + b''.join(buffers), 1)
+
+
+def decode_frame(payload):
+    """
+    Rebuild a DataFrame written by encode_frame()
+
+    Text and categorical columns come back as object strings.
+
+    Args:
+        payload (bytes): encode_frame() output
+
+    Returns:
+        pandas.DataFrame: The decoded frame
+    """
+    raw = zlib.decompress(payload)
+    (meta_length,) = struct.unpack_from('<I', raw)
+    meta = json.loads(raw[4:4 + meta_length])
+    rows = meta['rows']
+    offset = 4 + meta_length
+
+    data = {}
+    for column in meta['columns']:
+        parts = []
+        for size in column['sizes']:
+            parts.append(raw[offset:offset + size])
+            offset += size
+
+        if column['kind'] == 'numpy':
+            data[column['name']] = np.frombuffer(parts[0], dtype=np.dtype(column['dtype'])).copy()
+        elif column['kind'] == 'masked':
+            dtype = pd.api.types.pandas_dtype(column['dtype'])
+            values = pd.array(np.frombuffer(parts[0], dtype=dtype.numpy_dtype), dtype=dtype)
+            values[np.frombuffer(parts[1], dtype=bool)] = pd.NA
+            data[column['name']] = values
+        else:
+            missing = np.frombuffer(parts[0], dtype=bool)
+            ends = np.cumsum(np.frombuffer(parts[1], dtype=np.int32))
+            text = parts[2]
+            values = np.full(rows, None, dtype=object)
+            values[~missing] = [text[end - length:end].decode()
+                                for end, length in zip(ends.tolist(), np.frombuffer(parts[1], dtype=np.int32).tolist())]
+            data[column['name']] = values
+
+    return pd.DataFrame(data, columns=[column['name'] for column in meta['columns']])
+
+
+class SnapshotSpool:
+    """
+    Durable, size-capped, append-only queue of transformed snapshots
+
+    Thread-safe: the daemon's load stage appends while a SpoolDrainer reads.
+    """
+
+    def __init__(self, path, max_bytes=1 << 30, segment_bytes=64 << 20, policy='backpressure',
+                 fsync=True):
+        """
+        Open (or create) a spool directory, resuming after the checkpoint
+
+        Args:
+            path (str): Directory holding the segments and the checkpoint
+            max_bytes (int): Cap on the total size of the segments
+            segment_bytes (int): Size after which a new segment is started
+                (kept well under max_bytes so whole segments can be freed)
+            policy (str): 'backpressure' to block writers while full,
+                'evict' to drop the oldest segments
+            fsync (bool): Force every record to disk before returning
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown spool policy {policy!r}, expected one of {POLICIES}")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.segment_bytes = min(segment_bytes, max(max_bytes // 4, 1))
+        self.policy = policy
+        self.fsync = fsync
+        self.closed = False
+
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self.stats = {'appended': 0, 'drained': 0, 'evicted': 0, 'corrupt': 0, 'waits': 0}
+
+        os.makedirs(path, exist_ok=True)
+        self._segments = {}   # sequence number -> size in bytes
+        for name in os.listdir(path):
+            if name.startswith('segment-') and name.endswith('.spool'):
+                self._segments[int(name[8:-6])] = os.path.getsize(os.path.join(path, name))
+        self._checkpoint = self._read_checkpoint()
+
+        # Never append to a segment left by a previous run: its tail may be torn
+        self._active = max(self._segments, default=0) + 1
+        self._segments[self._active] = 0
+        self._file = open(self._segment_path(self._active), 'ab')
+
+    def _segment_path(self, sequence):
+        return os.path.join(self.path, SEGMENT_PATTERN.format(sequence))
+
+    def _read_checkpoint(self):
+        """Position (segment, offset) of the first record not loaded yet"""
+        try:
+            with open(os.path.join(self.path, CHECKPOINT_FILE)) as f:
+                checkpoint = json.load(f)
+            return checkpoint['segment'], checkpoint['offset']
+        except FileNotFoundError:
+            return min(self._segments, default=1), 0
+
+    def _write_checkpoint(self, position):
+        """Atomically replace the checkpoint file"""
+        fd, temp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'segment': position[0], 'offset': position[1]}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, os.path.join(self.path, CHECKPOINT_FILE))
+
+    def size(self):
+        """Bytes currently held in segments"""
+        with self._lock:
+            return sum(self._segments.values())
+
+    def backlog(self):
+        """Bytes written but not loaded yet (approximate within a segment)"""
+        with self._lock:
+            segment, offset = self._checkpoint
+            return sum(size for sequence, size in self._segments.items() if sequence >= segment) - offset
+
+    def append(self, flights_df, snapshot_ts, give_up=None):
+        """
+        Durably store one transformed snapshot
+
+        Args:
+            flights_df (pandas.DataFrame): Transformed flights
+            snapshot_ts (datetime): Time the snapshot was taken
+            give_up (threading.Event): With the backpressure policy, stop
+                waiting for space once this is set
+
+        Returns:
+            int: Bytes written
+
+        Raises:
+            SpoolFullError: The spool stayed full and give_up was set
+        """
+        payload = encode_frame(flights_df)
+        micros = int(snapshot_ts.timestamp() * 1_000_000)
+        record = _RECORD.pack(_MAGIC, len(payload), micros, len(flights_df), zlib.crc32(payload)) + payload
+
+        with self._changed:
+            while sum(self._segments.values()) + len(record) > self.max_bytes:
+                if self.policy == 'evict':
+                    if not self._evict_oldest():
+                        break
+                    continue
+                if self.closed or (give_up is not None and give_up.is_set()):
+                    raise SpoolFullError(f"Spool {self.path} is full ({self.max_bytes} bytes)")
+                self.stats['waits'] += 1
+                self._changed.wait(timeout=0.5)
+
+            if self._segments[self._active] >= self.segment_bytes:
+                self._rotate()
+            self._file.write(record)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self._segments[self._active] += len(record)
+            self.stats['appended'] += 1
+            self._changed.notify_all()
+        return len(record)
+
+    def _rotate(self):
+        """Close the active segment and start the next one (lock held)"""
+        self._file.close()
+        self._active += 1
+        self._segments[self._active] = 0
+        self._file = open(self._segment_path(self._active), 'ab')
+
+    def _evict_oldest(self):
+        """Delete the oldest segment, loaded or not (lock held)"""
+        oldest = min(self._segments)
+        if oldest == self._active:
+            if self._segments[oldest] == 0:
+                return False
+            self._rotate()
+        records = self._count_records(oldest, self._checkpoint[1] if self._checkpoint[0] == oldest else 0)
+        self._delete_segment(oldest)
+        if self._checkpoint[0] <= oldest:
+            self._checkpoint = (min(self._segments), 0)
+            self._write_checkpoint(self._checkpoint)
+        self.stats['evicted'] += records
+        print(f"⚠️  Spool full: evicted {records} unloaded snapshot(s) from the oldest segment")
+        return True
+
+    def _count_records(self, sequence, offset):
+        """Number of readable records in a segment after an offset"""
+        return sum(1 for _ in self._scan(sequence, offset))
+
+    def _delete_segment(self, sequence):
+        os.remove(self._segment_path(sequence))
+        del self._segments[sequence]
+
+    def _scan(self, sequence, offset, limit=None):
+        """
+        Yield (end offset, snapshot_ts, rows, payload) of the records of a
+        segment from an offset, stopping at the first incomplete or corrupt one
+        """
+        with open(self._segment_path(sequence), 'rb') as f:
+            f.seek(offset)
+            count = 0
+            while limit is None or count < limit:
+                header = f.read(_RECORD.size)
+                if len(header) < _RECORD.size:
+                    return
+                magic, length, micros, rows, crc = _RECORD.unpack(header)
+                payload = f.read(length) if magic == _MAGIC else b''
+                if magic != _MAGIC or len(payload) < length or zlib.crc32(payload) != crc:
+                    if sequence != self._active:
+                        self.stats['corrupt'] += 1
+                        print(f"⚠️  Skipping the damaged end of spool segment {sequence}")
+                    return
+                offset += _RECORD.size + length
+                count += 1
+                snapshot_ts = datetime.fromtimestamp(micros / 1_000_000, timezone.utc)
+                yield offset, snapshot_ts, rows, payload
+
+    def read_batch(self, max_records=20):
+        """
+        Read the oldest snapshots not loaded yet, without consuming them
+
+        Args:
+            max_records (int): Maximum number of snapshots
+
+        Returns:
+            tuple: (list of (snapshot_ts, flights DataFrame), position to
+            pass to commit() once they are loaded)
+        """
+        with self._lock:
+            segment, offset = self._checkpoint
+            records = []
+            for sequence in sorted(s for s in self._segments if s >= segment):
+                start = offset if sequence == segment else 0
+                for end, snapshot_ts, _, payload in self._scan(sequence, start, max_records - len(records)):
+                    records.append((snapshot_ts, payload))
+                    segment, offset = sequence, end
+                if len(records) >= max_records:
+                    break
+                if sequence != self._active:
+                    # Nothing more to read here: continue with the next segment
+                    segment, offset = sequence + 1, 0
+            position = (segment, offset)
+
+        return [(snapshot_ts, decode_frame(payload)) for snapshot_ts, payload in records], position
+
+    def commit(self, position, records):
+        """
+        Mark everything before a read_batch() position as loaded
+
+        Args:
+            position (tuple): Position returned by read_batch()
+            records (int): Number of snapshots it covered
+        """
+        with self._changed:
+            self._checkpoint = position
+            self._write_checkpoint(position)
+            segment, offset = position
+            for sequence in [s for s in self._segments if s < segment]:
+                self._delete_segment(sequence)
+            # Caught up with the writer: start afresh so the segment can go
+            if segment == self._active and offset == self._segments[self._active] and offset > 0:
+                self._rotate()
+                self._delete_segment(segment)
+                self._checkpoint = (self._active, 0)
+                self._write_checkpoint(self._checkpoint)
+            self.stats['drained'] += records
+            self._changed.notify_all()
+
+    def wait_for_data(self, timeout):
+        """Block until something is appended (or the timeout expires)"""
+        with self._changed:
+            self._changed.wait(timeout)
+
+    def close(self):
+        """Close the active segment and wake up waiting writers"""
+        with self._changed:
+            self.closed = True
+            self._file.close()
+            self._changed.notify_all()
+
+
+class SpoolDrainer:
+    """
+    Background thread loading spooled snapshots into the database
+    """
+
+    def __init__(self, spool, load_batch, batch_size=20, retry_delay=1.0, max_retry_delay=60.0):
+        """
+        Create the drainer (call start() to run it)
+
+        Args:
+            spool (SnapshotSpool): Spool to drain
+            load_batch (callable): Takes a list of (snapshot_ts, flights)
+                and loads them in one transaction, raising on failure
+            batch_size (int): Snapshots per transaction
+            retry_delay (float): First delay after a failed batch; doubles
+                up to max_retry_delay while failures continue
+        """
+        self.spool = spool
+        self.load_batch = load_batch
+        self.batch_size = batch_size
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.stop_event = threading.Event()
+        self._deadline = None
+        self._thread = threading.Thread(target=self._run, name='spool-drainer', daemon=True)
+        self.stats = {'batches': 0, 'snapshots': 0, 'failures': 0}
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self, drain_timeout=30.0):
+        """
+        Stop after loading what is left, or when drain_timeout expires
+
+        Snapshots still spooled then are loaded on the next start.
+        """
+        self._deadline = time.monotonic() + drain_timeout
+        self.stop_event.set()
+        self._thread.join()
+
+    def _stopping(self):
+        """True once stopped and either drained or out of time"""
+        return self.stop_event.is_set() and (time.monotonic() >= self._deadline)
+
+    def _backoff(self, delay):
+        """Wait before a retry; once stopping, not past the drain deadline"""
+        end = time.monotonic() + delay
+        if self.stop_event.wait(delay):
+            time.sleep(max(0.0, min(end, self._deadline) - time.monotonic()))
+
+    def _run(self):
+        delay = self.retry_delay
+        while not self._stopping():
+            snapshots, position = self.spool.read_batch(self.batch_size)
+            if not snapshots:
+                if self.stop_event.is_set():
+                    return
+                self.spool.wait_for_data(timeout=1.0)
+                continue
+            try:
+                self.load_batch(snapshots)
+            except Exception as e:
+                self.stats['failures'] += 1
+                print(f"❌ Spool drain failed ({len(snapshots)} snapshot(s) kept, retrying in {delay:g}s): {e}")
+                self._backoff(delay)
+                delay = min(delay * 2, self.max_retry_delay)
+                continue
+            self.spool.commit(position, len(snapshots))
+            self.stats['batches'] += 1
+            self.stats['snapshots'] += len(snapshots)
+            delay = self.retry_delay
+
+    def report(self):
+        """Print what was drained and what is left"""
+        print(f"📦 Spool: {self.stats['snapshots']} snapshot(s) loaded in {self.stats['batches']} batch(es), "
+              f"{self.stats['failures']} failed attempt(s), {self.spool.stats['evicted']} evicted, "
+              f"{self.spool.backlog()} bytes waiting")
+
+
+if __name__ == "__main__":
+    """Spool snapshots through a simulated database outage"""
+    import shutil
+
+    print("Testing snapshot spool...\n")
+
+    rng = np.random.default_rng(0)
+
+    def snapshot(i, n=2000):
+        return pd.DataFrame({
+            'icao24': np.arange(n, dtype=np.uint32) + i,
+            'callsign': [f"AFR{x}" for x in range(n)],
+            'origin_country': pd.Categorical(['France', 'Spain'] * (n // 2)),
+            'last_contact': pd.array(np.full(n, 1_700_000_000 + i), dtype='Int64'),
+            'latitude': rng.uniform(40, 55, n),
+            'altitude': rng.uniform(0, 40_000, n).astype(np.float32),
+            'on_ground': rng.random(n) < 0.1,
+        })
+
+    first = snapshot(0)
+    first.loc[3, 'callsign'] = None
+    first.loc[4, 'last_contact'] = pd.NA
+    back = decode_frame(encode_frame(first))
+    pd.testing.assert_frame_equal(back, first.assign(origin_country=first['origin_country'].astype(object)),
+                                  check_dtype=False)
+    print(f"Round trip OK: {len(encode_frame(first))} bytes for {len(first)} rows "
+          f"({first.memory_usage(deep=True).sum()} bytes in memory)")
+
+    directory = tempfile.mkdtemp()
+    try:
+        loaded = []
+        database_up = threading.Event()
+
+        def load_batch(snapshots):
+            if not database_up.is_set():
+                raise ConnectionError("database unavailable")
+            loaded.extend(int(df['last_contact'].max()) - 1_700_000_000 for _, df in snapshots)
+
+        spool = SnapshotSpool(directory, max_bytes=2_000_000, segment_bytes=200_000)
+        drainer = SpoolDrainer(spool, load_batch, retry_delay=0.1, max_retry_delay=0.2).start()
+
+        # Outage: writes keep going at full speed while nothing can be loaded
+        started = time.perf_counter()
+        for i in range(30):
+            spool.append(snapshot(i), datetime.now(timezone.utc))
+        print(f"30 snapshots spooled during the outage in {time.perf_counter() - started:.2f}s, "
+              f"{spool.backlog()} bytes waiting")
+
+        # Restart the process: the backlog is still there
+        drainer.stop(drain_timeout=0)
+        spool.close()
+        spool = SnapshotSpool(directory, max_bytes=2_000_000, segment_bytes=200_000)
+        database_up.set()
+        drainer = SpoolDrainer(spool, load_batch, batch_size=8).start()
+        for i in range(30, 40):
+            spool.append(snapshot(i), datetime.now(timezone.utc))
+        drainer.stop()
+        drainer.report()
+        print(f"Loaded in order, none lost: {loaded == list(range(40))}")
+        spool.close()
+
+        # Eviction: a small spool keeps only the newest snapshots
+        evicting = SnapshotSpool(os.path.join(directory, 'evict'), max_bytes=300_000,
+                                 segment_bytes=60_000, policy='evict', fsync=False)
+        for i in range(40):
+            evicting.append(snapshot(i), datetime.now(timezone.utc))
+        kept, _ = evicting.read_batch(100)
+        print(f"Evict policy: {evicting.stats['evicted']} evicted, kept snapshots "
+              f"{[int(df['last_contact'].max()) - 1_700_000_000 for _, df in kept]}, "
+              f"size {evicting.size()} <= {evicting.max_bytes}")
+        evicting.close()
+    finally:
+        shutil.rmtree(directory)
@@ -0,0 +1,392 @@
+"""
+Trajectories Module
+
+This module stitches successive snapshots into per-aircraft tracks:
+- Points of the same aircraft are chained into one segment until
+  last_contact jumps by more than a gap, on_ground flips (take-off or
+  landing), or the segment gets too long
+- Closed segments are encoded compactly: times, positions and altitudes are
+  quantized to integers, delta-encoded and zlib-compressed into one blob
+- decode_track turns a blob back into arrays in O(track length)
+"""
+
+import struct
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from src.compact_schema import expand_flights
+
+TRACK_FORMAT_VERSION = 2
+_HEADER = struct.Struct('<BI')     # version, number of points
+_START = struct.Struct('<q')       # version 2: first time, int64 Unix seconds
+
+# Quantization steps: 1 s, 1e-5 degree (about 1 m), 1 ft
+COORDINATE_SCALE = 100_000
+MISSING = np.iinfo(np.int32).min   # quantized value standing for NaN
+
+TRACK_COLUMNS = ['icao24', 'callsign', 'start_time', 'end_time', 'points', 'on_ground',
+                 'min_latitude', 'max_latitude', 'min_longitude', 'max_longitude', 'track']
+
+
+def encode_track(times, latitudes, longitudes, altitudes):
+    """
+    Encode one track segment into a compact blob
+
+    Args:
+        times (array-like): Unix seconds, in increasing order
+        latitudes, longitudes (array-like): Degrees
+        altitudes (array-like): Feet, NaN where unknown
+
+    Returns:
+        bytes: Header followed by the compressed delta-encoded columns
+    """
+    altitudes = np.asarray(altitudes, dtype=np.float64)
+    times = np.asarray(times, dtype=np.int64)
+    start = int(times[0]) if len(times) else 0
+    if len(times) and times[-1] - start > np.iinfo(np.int32).max:
+        raise ValueError("Track segment spans more time than fits in 32-bit offsets")
+    quantized = np.vstack([
+        times - start,
+        np.round(np.asarray(latitudes, dtype=np.float64) * COORDINATE_SCALE),
+        np.round(np.asarray(longitudes, dtype=np.float64) * COORDINATE_SCALE),
+        np.where(np.isnan(altitudes), MISSING, np.round(np.nan_to_num(altitudes))),
+    ]).astype(np.int64)
+
+    # Times are stored as offsets from the int64 start in the header, so
+    # every row fits 32 bits whatever the epoch. First value as is, then
+    # differences; small numbers compress well. Differences are computed in
+    # int64 and wrapped to int32, cumsum in int32 wraps back identically
+    deltas = np.diff(quantized, axis=1, prepend=0).astype(np.int32)
+    header = _HEADER.pack(TRACK_FORMAT_VERSION, quantized.shape[1]) + _START.pack(start)
+    return header + zlib.compress(deltas.tobytes(), 6)
+
+
+def decode_track(blob):
+    """
+    Decode a blob written by encode_track
+
+    Version 1 blobs stored absolute times in the int32 columns; they still
+    decode, and are correct for times before 2038.
+
+    Args:
+        blob (bytes): Encoded track (bytes or memoryview)
+
+    Returns:
+        pandas.DataFrame: time, latitude, longitude and altitude per point
+    """
+    version, count = _HEADER.unpack_from(blob)
+    if version == TRACK_FORMAT_VERSION:
+        start, = _START.unpack_from(blob, _HEADER.size)
+        offset = _HEADER.size + _START.size
+    elif version == 1:
+        start, offset = 0, _HEADER.size
+    else:
+        raise ValueError(f"Unknown track format version {version}")
+
+    deltas = np.frombuffer(zlib.decompress(bytes(blob[offset:])), dtype=np.int32).reshape(4, count)
+    values = np.cumsum(deltas, axis=1, dtype=np.int32)
+
+    altitude = values[3].astype(np.float64)
+    altitude[values[3] == MISSING] = np.nan
+    return pd.DataFrame({
+        'time': start + values[0].astype(np.int64),
+        'latitude': values[1] / COORDINATE_SCALE,
+        'longitude': values[2] / COORDINATE_SCALE,
+        'altitude': altitude,
+    })
+
+
+class TrackBuilder:
+    """
+    Accumulates snapshots and hands out finished track segments
+
+    Per-aircraft state (current segment, last time, on_ground) lives in
+    arrays indexed by icao24, so each snapshot is assigned to segments in
+    one vectorized pass. Snapshots must arrive in time order; points not
+    newer than an aircraft's last one are ignored.
+    """
+
+    def __init__(self, gap_seconds=600, max_duration=3600, emit_every=60):
+        """
+        Create an empty builder
+
+        Args:
+            gap_seconds (float): A longer silence between two points of an
+                aircraft starts a new segment, and closes a segment whose
+                aircraft has not been seen for that long
+            max_duration (float): Segments are cut after this many seconds
+                so open segments never hold more than that much history
+            emit_every (float): Closed segments are collected at most this
+                often (in snapshot time), since collecting them means one
+                pass over every buffered point
+        """
+        self.gap_seconds = gap_seconds
+        self.max_duration = max_duration
+        self.emit_every = emit_every
+        self._last_emit = None
+
+        # Open segment of each aircraft
+        self._icao24 = pd.Index([], dtype=object)
+        self._segment = np.empty(0, dtype=np.int64)
+        self._start_time = np.empty(0, dtype=np.int64)
+        self._last_time = np.empty(0, dtype=np.int64)
+        self._on_ground = np.empty(0, dtype=bool)
+        self._callsign = np.empty(0, dtype=object)
+
+        self._segments = {}    # segment id -> [icao24, callsign, on_ground]
+        self._next_segment = 0
+        self._chunks = []      # point arrays of the segments not handed out yet
+        self._closed = []      # ids of segments that can no longer grow
+        self._unsaved = []     # encoded segments handed back by requeue()
+
+        self.stats = {'points': 0, 'tracks': 0}
+
+    def __len__(self):
+        """Number of points waiting in open segments"""
+        return sum(len(chunk['segment']) for chunk in self._chunks)
+
+    def ingest(self, flights_df):
+        """
+        Add the points of one cleaned snapshot
+
+        Args:
+            flights_df (pandas.DataFrame): Cleaned flights with icao24,
+                callsign, last_contact, latitude, longitude, altitude and
+                on_ground (the compact schema is accepted as well)
+        """
+        flights_df = expand_flights(flights_df)
+        usable = (flights_df['last_contact'].notna() & flights_df['latitude'].notna()
+                  & flights_df['longitude'].notna())
+        flights_df = flights_df[usable]
+        if flights_df['icao24'].duplicated().any():
+            flights_df = flights_df.drop_duplicates('icao24', keep='last')
+        if flights_df.empty:
+            return
+
+        icao24 = flights_df['icao24'].to_numpy(dtype=object)
+        times = flights_df['last_contact'].to_numpy(dtype=np.int64)
+        on_ground = flights_df['on_ground'].to_numpy(dtype=bool, na_value=False)
+
+        position = self._icao24.get_indexer(icao24)
+        known = position >= 0
+        lookup = np.where(known, position, 0)
+
+        if len(self._icao24):
+            newer = ~known | (times > self._last_time[lookup])
+            split = known & newer & (
+                (times - self._last_time[lookup] > self.gap_seconds)
+                | (on_ground != self._on_ground[lookup])
+                | (times - self._start_time[lookup] >= self.max_duration)
+            )
+            self._close_segments(position[split])
+        else:
+            newer = np.ones(len(icao24), dtype=bool)
+            split = np.zeros(len(icao24), dtype=bool)
+
+        # Start a segment for new aircraft and after every split
+        starts = (~known | split)[newer]
+        icao24, times, on_ground = icao24[newer], times[newer], on_ground[newer]
+        position, known = position[newer], known[newer]
+        callsigns = flights_df['callsign'].to_numpy(dtype=object)[newer]
+
+        segment = np.empty(len(icao24), dtype=np.int64)
+        segment[~starts] = self._segment[position[~starts]]
+        segment[starts] = self._next_segment + np.arange(starts.sum())
+        self._next_segment += int(starts.sum())
+        for i in np.flatnonzero(starts):
+            self._segments[segment[i]] = [icao24[i], None, bool(on_ground[i])]
+        # Latest non-empty callsign; stored on the segment when it closes
+        named = pd.notna(callsigns) & (callsigns != '')
+
+        # Update the state of known aircraft, then add the new ones
+        restarted = known & starts
+        self._start_time[position[restarted]] = times[restarted]
+        self._segment[position[known]] = segment[known]
+        self._last_time[position[known]] = times[known]
+        self._on_ground[position[known]] = on_ground[known]
+        self._callsign[position[known & named]] = callsigns[known & named]
+
+        new = ~known
+        if new.any():
+            self._icao24 = self._icao24.append(pd.Index(icao24[new]))
+            self._segment = np.concatenate([self._segment, segment[new]])
+            self._start_time = np.concatenate([self._start_time, times[new]])
+            self._last_time = np.concatenate([self._last_time, times[new]])
+            self._on_ground = np.concatenate([self._on_ground, on_ground[new]])
+            self._callsign = np.concatenate([self._callsign, np.where(named, callsigns, None)[new]])
+
+        self._chunks.append({
+            'segment': segment,
+            'time': times,
+            'latitude': flights_df['latitude'].to_numpy(dtype=np.float64)[newer],
+            'longitude': flights_df['longitude'].to_numpy(dtype=np.float64)[newer],
+            'altitude': flights_df['altitude'].to_numpy(dtype=np.float64, na_value=np.nan)[newer],
+        })
+        self.stats['points'] += len(segment)
+
+    def pop_closed(self, now=None, force=False):
+        """
+        Return the segments that can no longer grow and forget them
+
+        Segments handed back with requeue() are returned again first.
+
+        Args:
+            now (int): Current unix time; aircraft not seen for gap_seconds
+                before it have their segment closed. Defaults to the newest
+                point received.
+            force (bool): Collect even if emit_every has not elapsed
+
+        Returns:
+            pandas.DataFrame: One row per segment with TRACK_COLUMNS
+        """
+        if len(self._icao24):
+            now = self._last_time.max() if now is None else now
+            if not force and self._last_emit is not None and now - self._last_emit < self.emit_every:
+                return self._take_unsaved(pd.DataFrame(columns=TRACK_COLUMNS))
+            self._last_emit = now
+            self._forget_aircraft(self._last_time < now - self.gap_seconds)
+
+        if not self._closed or not self._chunks:
+            return self._take_unsaved(pd.DataFrame(columns=TRACK_COLUMNS))
+
+        points = {name: np.concatenate([chunk[name] for chunk in self._chunks])
+                  for name in self._chunks[0]}
+        closed = np.isin(points['segment'], self._closed)
+        self._chunks = [{name: values[~closed] for name, values in points.items()}]
+
+        order = np.lexsort((points['time'][closed], points['segment'][closed]))
+        closed_points = {name: values[closed][order] for name, values in points.items()}
+        tracks = self._encode(closed_points)
+
+        for segment in self._closed:
+            self._segments.pop(segment, None)
+        self._closed = []
+        self.stats['tracks'] += len(tracks)
+        return self._take_unsaved(tracks)
+
+    def requeue(self, tracks_df):
+        """
+        Hand back segments from pop_closed() that could not be written
+
+        They are returned again by the next pop_closed() or flush().
+
+        Args:
+            tracks_df (pandas.DataFrame): Segments whose write failed
+        """
+        if tracks_df.empty:
+            return
+        self._unsaved.append(tracks_df)
+        self.stats['tracks'] -= len(tracks_df)
+
+    def _take_unsaved(self, tracks):
+        """Put the requeued segments in front of the ones collected now"""
+        if not self._unsaved:
+            return tracks
+        unsaved = [frame for frame in self._unsaved + [tracks] if not frame.empty]
+        self.stats['tracks'] += sum(len(frame) for frame in self._unsaved)
+        self._unsaved = []
+        return pd.concat(unsaved, ignore_index=True)
+
+    def flush(self):
+        """Close and return every open segment (e.g. at shutdown)"""
+        self._forget_aircraft(np.ones(len(self._icao24), dtype=bool))
+        return self.pop_closed(force=True)
+
+    def _forget_aircraft(self, mask):
+        """Close the segments of the masked aircraft and drop their state"""
+        if not mask.any():
+            return
+        self._close_segments(np.flatnonzero(mask))
+        keep = ~mask
+        self._icao24 = self._icao24[keep]
+        self._segment = self._segment[keep]
+        self._start_time = self._start_time[keep]
+        self._last_time = self._last_time[keep]
+        self._on_ground = self._on_ground[keep]
+        self._callsign = self._callsign[keep]
+
+    def _close_segments(self, positions):
+        """Mark the open segments of aircraft at these positions as closed"""
+        for position in positions:
+            segment = self._segment[position]
+            self._segments[segment][1] = self._callsign[position]
+            self._closed.append(segment)
+
+    def _encode(self, points):
+        """One encoded row per segment, points sorted by segment then time"""
+        segment = points['segment']
+        if not len(segment):
+            return pd.DataFrame(columns=TRACK_COLUMNS)
+
+        bounds = np.flatnonzero(np.r_[True, segment[1:] != segment[:-1], True])
+        rows = []
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            part = slice(start, end)
+            icao24, callsign, on_ground = self._segments[segment[start]]
+            latitudes, longitudes = points['latitude'][part], points['longitude'][part]
+            rows.append((
+                icao24, callsign, int(points['time'][start]), int(points['time'][end - 1]),
+                end - start, on_ground,
+                latitudes.min(), latitudes.max(), longitudes.min(), longitudes.max(),
+                encode_track(points['time'][part], latitudes, longitudes, points['altitude'][part]),
+            ))
+        return pd.DataFrame(rows, columns=TRACK_COLUMNS)
+
+
+if __name__ == "__main__":
+    """Build tracks from simulated snapshots and check the round trip"""
+    print("Testing trajectory builder...\n")
+
+    rng = np.random.default_rng(0)
+    n = 2_000
+    icao24 = np.array([f"{x:06x}" for x in rng.choice(2 ** 24, n, replace=False)], dtype=object)
+    latitude = rng.uniform(40, 55, n)
+    longitude = rng.uniform(-5, 20, n)
+    altitude = rng.uniform(0, 38_000, n).round(2)
+    lands_at = rng.integers(100, 400, n)
+
+    import time
+
+    builder = TrackBuilder(gap_seconds=60)
+    tracks = []
+    started = time.perf_counter()
+    for step in range(360):
+        t = 1_700_000_000 + step * 10
+        visible = rng.random(n) < 0.95   # some snapshots miss an aircraft
+        latitude += 0.02
+        builder.ingest(pd.DataFrame({
+            'icao24': icao24[visible],
+            'callsign': [f"TST{i:04d}" for i in np.flatnonzero(visible)],
+            'last_contact': np.full(visible.sum(), t),
+            'latitude': latitude[visible],
+            'longitude': longitude[visible],
+            'altitude': np.where(step > lands_at, 0.0, altitude)[visible],
+            'on_ground': (step > lands_at)[visible],
+        }))
+        closed = builder.pop_closed()
+        if step == 200 and not closed.empty:
+            builder.requeue(closed)   # the write failed: handed out again next time
+            continue
+        tracks.append(closed)
+
+    tracks = pd.concat(tracks + [builder.flush()], ignore_index=True)
+    print(f"{(time.perf_counter() - started) / 360 * 1000:.1f} ms per snapshot of {n} aircraft")
+    raw_bytes = builder.stats['points'] * (8 + 8 + 8 + 8)
+    encoded_bytes = tracks['track'].map(len).sum()
+    print(f"{builder.stats['points']} points -> {len(tracks)} track segments")
+    print(f"Encoded: {encoded_bytes / 1e3:.0f} kB for {raw_bytes / 1e3:.0f} kB of raw "
+          f"time/lat/lon/alt ({raw_bytes / encoded_bytes:.1f}x smaller)")
+
+    longest = tracks.loc[tracks['points'].idxmax()]
+    decoded = decode_track(longest['track'])
+    print(f"\nLongest segment: {longest['icao24']} {longest['callsign']}, {longest['points']} points")
+    print(decoded.head().to_string(index=False))
+    expected = decoded['latitude'].iloc[0] + 0.02 * (decoded['time'] - decoded['time'].iloc[0]) / 10
+    print(f"Max position error after round trip: {np.abs(decoded['latitude'] - expected).max():.6f} deg")
+
+    # Times past 2038 must survive the round trip (int32 epoch overflow)
+    late = decode_track(encode_track([2_200_000_000, 2_200_000_010], [50.0, 50.1], [8.0, 8.1], [35_000.0, np.nan]))
+    print(f"Post-2038 times: {late['time'].tolist()}, altitudes: {late['altitude'].tolist()}")
+    assert late['time'].tolist() == [2_200_000_000, 2_200_000_010]
@@ -10,10 +10,92 @@ This module handles cleaning and transforming the extracted data:
 import pandas as pd
 import numpy as np
 
+from src.spatial_index import nearest_airports
+from src.compact_schema import compact_flights
+
+# Meters to feet, for altitudes
+FEET_PER_METER = 3.28084
+
+# The OpenSky API returns data as a list of lists without column names,
+# these are the names we use for the columns we keep
+FLIGHT_COLUMNS = [
+    'icao24',           # Unique aircraft identifier
+    'callsign',         # Flight callsign
+    'origin_country',   # Country of aircraft registration
+    'time_position',    # Unix timestamp of position
+    'last_contact',     # Unix timestamp of last contact
+    'longitude',        # Aircraft longitude
+    'latitude',         # Aircraft latitude
+    'altitude',         # Aircraft altitude in meters (feet after cleaning)
+    'on_ground',        # Boolean: is aircraft on ground
+    'velocity',         # Ground speed in m/s
+    'true_track',       # Aircraft heading in degrees
+    'vertical_rate'     # Vertical speed in m/s
+]
+
+def coordinate_rules(df):
+    """
+    Validity rules shared by airports and flights
+    
+    Args:
+        df (pandas.DataFrame): Data with latitude and longitude columns
+        
+    Returns:
+        list: (rule name, boolean NumPy mask of failing rows) in the order
+        rejections are attributed
+    """
+    lat = df['latitude'].to_numpy(dtype=np.float64, na_value=np.nan)
+    lon = df['longitude'].to_numpy(dtype=np.float64, na_value=np.nan)
+    missing = np.isnan(lat) | np.isnan(lon)
+    
+    # NaN fails every comparison, so missing rows are not counted twice
+    return [
+        ('missing_coordinates', missing),
+        ('invalid_latitude', ~missing & ~((lat >= -90) & (lat <= 90))),
+        ('invalid_longitude', ~missing & ~((lon >= -180) & (lon <= 180))),
+    ]
+
+def apply_rules(df, rules):
+    """
+    Drop every row failing any rule in a single selection
+    
+    Each row is counted against the first rule it fails, so the counts add
+    up to the number of rejected rows. The rules only combine boolean
+    arrays; the frame itself is filtered once, and not copied at all when
+    nothing is rejected.
+    
+    Args:
+        df (pandas.DataFrame): Data to filter
+        rules (list): (rule name, boolean mask of failing rows) pairs
+        
+    Returns:
+        tuple: (filtered DataFrame, dict of rule name -> rejected rows)
+    """
+    rejected = np.zeros(len(df), dtype=bool)
+    rejections = {}
+    for name, failing in rules:
+        newly_rejected = failing & ~rejected
+        rejections[name] = int(np.count_nonzero(newly_rejected))
+        rejected |= newly_rejected
+    
+    if rejected.any():
+        df = df[~rejected]
+    return df, rejections
+
+def report_rejections(rejections):
+    """Print the per-rule rejection counts"""
+    for name, count in rejections.items():
+        if count:
+            print(f"   Rejected {count} rows: {name}")
+
 def clean_airports(airports_df):
     """
     Clean and validate airport data
     
+    Invalid rows are dropped in one pass, then the remaining airports get
+    their IATA codes and altitudes normalised. Per-rule rejection counts
+    are stored in df.attrs['rejections'].
+    
     Args:
         airports_df (pandas.DataFrame): Raw airport data from CSV
         
@@ -27,135 +109,129 @@ def clean_airports(airports_df):
     print(f"🧹 Cleaning airport data...")
     print(f"Starting with {len(airports_df)} airports")
     
-    # Make a copy to avoid modifying the original
-    df = airports_df.copy()
-    
-    # TODO: Remove rows with missing latitude or longitud
-    # Hint: Use .dropna(subset=['latitude', 'longitude'])
-    df = df.dropna(subset=['latitude', 'longitude'])
-    
-    # TODO: Remove airports with invalid coordinates
-    # Latitude should be between -90 and 90
-    # Longitude should be between -180 and 180
-    # Hint: df = df[(df['latitude'] >= -90) & (df['latitude'] <= 90)]
-    # Hint: df = df[(df['longitude'] >= -180) & (df['longitude'] <= 180)]
-    df = df[(df['latitude'] >= -90) & (df['latitude'] <= 90)]
-    df = df[(df['longitude'] >= -180) & (df['longitude'] <= 180)]
+    # Remove airports with missing or invalid coordinates
+    # Latitude should be between -90 and 90, longitude between -180 and 180
+    df, rejections = apply_rules(airports_df, coordinate_rules(airports_df))
     
-    # TODO: Handle missing IATA codes (replace empty strings or 'N' with None)
-    # Hint: df['iata_code'] = df['iata_code'].replace(['', 'N', '\\N'], None)
-    df['iata_code'] = df['iata_code'].replace(['', 'N', '\\N'], None)
-
-    # TODO: Convert altitude to numeric (handle non-numeric values)
-    # Hint: df['altitude'] = pd.to_numeric(df['altitude'], errors='coerce')
-    df['altitude'] = pd.to_numeric(df['altitude'], errors='coerce')
+    # Handle missing IATA codes and non-numeric altitudes on the rows we keep
+    df = df.assign(
+        iata_code=df['iata_code'].replace(['', 'N', '\\N'], None),
+        altitude=pd.to_numeric(df['altitude'], errors='coerce')
+    )
+    df.attrs['rejections'] = rejections
 
+    report_rejections(rejections)
     print(f"After cleaning: {len(df)} airports remain")
     
-    # print("⚠️  Airport cleaning not yet implemented")
     return df
 
-def clean_flights(flights_df):
+def clean_flights(flights_df, verbose=True):
     """
     Clean and standardize flight data from API
     
+    Invalid rows are dropped in one pass, then finish_flights converts the
+    altitude to feet and trims callsigns on the remaining rows only. Per-rule
+    rejection counts are stored in df.attrs['rejections'].
+    
     Args:
         flights_df (pandas.DataFrame): Raw flight data from API
+        verbose (bool): Print progress and rejection counts
         
     Returns:
         pandas.DataFrame: Cleaned flight data with proper column names
     """
     if flights_df.empty:
-        print("⚠️  No flight data to clean")
+        if verbose:
+            print("⚠️  No flight data to clean")
         return flights_df
     
-    print(f"🧹 Cleaning flight data...")
-    print(f"Starting with {len(flights_df)} flights")
-    
-    # The OpenSky API returns data as a list of lists without column names
-    # We need to assign proper column names
-    expected_columns = [
-        'icao24',           # Unique aircraft identifier
-        'callsign',         # Flight callsign
-        'origin_country',   # Country of aircraft registration
-        'time_position',    # Unix timestamp of position
-        'last_contact',     # Unix timestamp of last contact
-        'longitude',        # Aircraft longitude
-        'latitude',         # Aircraft latitude
-        'altitude',         # Aircraft altitude in meters
-        'on_ground',        # Boolean: is aircraft on ground
-        'velocity',         # Ground speed in m/s
-        'true_track',       # Aircraft heading in degrees
-        'vertical_rate'     # Vertical speed in m/s
-    ]
-    
-    # Make a copy to avoid modifying the original
-    df = flights_df.copy()
-    
-    # TODO: Assign column names to the DataFrame
-    df.columns = expected_columns
+    if verbose:
+        print(f"🧹 Cleaning flight data...")
+        print(f"Starting with {len(flights_df)} flights")
     
-    # TODO: Remove flights with missing coordinates
-    df = df.dropna(subset=['longitude', 'latitude'])
+    # Assign our column names (no data is copied)
+    df = flights_df.set_axis(FLIGHT_COLUMNS, axis=1)
     
-    # TODO: Convert altitude from meters to feet (multiply by 3.28084)
-    # This makes it easier to understand for aviation
-    df['altitude'] = df['altitude'] * 3.28084
+    # Remove flights with missing or invalid coordinates
+    df, rejections = apply_rules(df, coordinate_rules(df))
     
-    # TODO: Remove flights with invalid coordinates
-    # Same coordinate bounds as airports
-    df = df[(df['latitude'] >= -90) & (df['latitude'] <= 90)]
-    df = df[(df['longitude'] >= -180) & (df['longitude'] <= 180)]
-    
-    # TODO: Clean callsign (remove extra whitespace)
-    df['callsign'] = df['callsign'].str.strip()
+    return finish_flights(df, rejections, verbose)
 
+def finish_flights(df, rejections, verbose=True):
+    """
+    Cleaning steps run on the flights kept by the coordinate rules
     
-    # TODO: Remove flights with missing coordinates
-    
-    # TODO: Convert altitude from meters to feet (multiply by 3.28084)
-    # This makes it easier to understand for aviation
-    
-    # TODO: Remove flights with invalid coordinates
-    # Same coordinate bounds as airports
+    Converts the altitude from meters to feet and trims callsigns (blank
+    ones become missing, as in the compact schema, which cannot tell them
+    apart), then records and reports the rejections. Shared by
+    clean_flights and the parallel transform, which applies the rules in
+    worker processes.
     
-    # TODO: Clean callsign (remove extra whitespace)
+    Args:
+        df (pandas.DataFrame): Flights with FLIGHT_COLUMNS that passed the rules
+        rejections (dict): Rule name -> rejected rows
+        verbose (bool): Print rejection counts and the remaining rows
+        
+    Returns:
+        pandas.DataFrame: Cleaned flight data
+    """
+    callsign = df['callsign'].str.strip()
+    df = df.assign(
+        altitude=df['altitude'].to_numpy() * FEET_PER_METER,
+        callsign=callsign.mask(callsign == '')
+    )
+    df.attrs['rejections'] = rejections
     
-    # TODO: Print how many flights remain after cleaning
-    print(f"After cleaning: {len(df)} flights remain")
+    if verbose:
+        report_rejections(rejections)
+        print(f"After cleaning: {len(df)} flights remain")
     
-    # print("⚠️  Flight cleaning not yet implemented")
     return df
 
-def combine_data(airports_df, flights_df):
+def combine_data(airports_df, flights_df, max_radius_km=None, compact=False):
     """
     Combine airport and flight data for loading
     
-    For this simple exercise, we'll just return both DataFrames separately.
-    In a more advanced pipeline, you might:
-    - Join flights with nearby airports
-    - Calculate distances between aircraft and airports
-    - Add airport information to flight records
+    Each flight is matched with its nearest airport using a spatial index
+    built once per set of airports (see src/spatial_index.py). The lookup
+    runs for the whole snapshot in batched NumPy queries.
     
     Args:
         airports_df (pandas.DataFrame): Cleaned airport data
         flights_df (pandas.DataFrame): Cleaned flight data
+        max_radius_km (float): Optional search radius. Flights with no airport
+            this close get no match instead of a full search.
+        compact (bool): Return the flights in the compact schema (see
+            src/compact_schema.py), airport columns included, to keep
+            memory low when holding many snapshots
         
     Returns:
-        tuple: (airports_df, flights_df) ready for database loading
+        tuple: (airports_df, flights_df) ready for database loading, with
+        nearest_airport_iata, nearest_airport_distance_km and
+        nearest_airport_bearing_deg added to the flights
     """
     print("🔗 Preparing data for loading...")
     
+    if not airports_df.empty and not flights_df.empty:
+        print("📍 Matching flights with their nearest airport...")
+        nearest = nearest_airports(
+            airports_df,
+            flights_df['latitude'].to_numpy(dtype=np.float64),
+            flights_df['longitude'].to_numpy(dtype=np.float64),
+            max_radius_km=max_radius_km
+        )
+        flights_df = flights_df.assign(**{
+            column: nearest[column].to_numpy() for column in nearest.columns
+        })
+        matched = nearest['nearest_airport_distance_km'].notna().sum()
+        print(f"Matched {matched} of {len(flights_df)} flights with an airport")
+    
     # Basic data validation
     print(f"Final airport records: {len(airports_df)}")
     print(f"Final flight records: {len(flights_df)}")
     
-    # TODO (Optional): If you want to try something more advanced,
-    # you could find the nearest airport for each flight:
-    # 
-    def find_nearest_airport(flight_lat, flight_lon, airports_df):
-
-        pass
+    if compact:
+        flights_df = compact_flights(flights_df)
     
     return airports_df, flights_df
 
@@ -214,4 +290,27 @@ if __name__ == "__main__":
     cleaned_airports = clean_airports(sample_airports)
     validate_data_quality(cleaned_airports, 'airports')
     
+    # Test nearest-airport matching
+    sample_flights = pd.DataFrame({
+        'icao24': ['abc123', 'def456'],
+        'callsign': ['AFR123', 'BAW456'],
+        'latitude': [49.0, 51.5],
+        'longitude': [2.5, -0.5]
+    })
+    _, matched_flights = combine_data(cleaned_airports, sample_flights)
+    print(matched_flights.to_string(index=False))
+    
+    # Blank and missing callsigns come out the same in both schemas
+    from src.compact_schema import expand_flights
+    raw_flights = pd.DataFrame([
+        ['abc123', 'AFR123  ', 'France', 1_700_000_000, 1_700_000_000, 2.5, 49.0, 1000.0, False, 200.0, 90.0, 0.0],
+        ['def456', '        ', 'France', 1_700_000_000, 1_700_000_000, 2.6, 49.1, 1000.0, False, 200.0, 90.0, 0.0],
+        ['0a0b0c', None, 'France', 1_700_000_000, 1_700_000_000, 2.7, 49.2, 1000.0, False, 200.0, 90.0, 0.0],
+    ], columns=FLIGHT_COLUMNS)
+    regular = clean_flights(raw_flights, verbose=False)['callsign']
+    _, compact_flights_df = combine_data(cleaned_airports, clean_flights(raw_flights, verbose=False), compact=True)
+    compact = expand_flights(compact_flights_df)['callsign']
+    same = regular.astype(object).equals(compact.astype(object))
+    print(f"Callsigns: {regular.tolist()}, same in both schemas: {'✅' if same else '❌'}")
+    
     print("\nTransformation testing complete!")